@@ -0,0 +1,31 @@
+"""Unique date index names
+
+Revision ID: d4a6c81f0e27
+Revises: b71e04c5a9d3
+Create Date: 2026-10-19 11:41:05.662183
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a6c81f0e27'
+down_revision = 'b71e04c5a9d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # index names are global in SQLite, both tables had an Idx_date
+    op.drop_index('Idx_date', table_name='tsales')
+    op.create_index('Idx_tsales_date', 'tsales', ['date'], unique=False)
+    op.drop_index('Idx_date', table_name='tpurchase')
+    op.create_index('Idx_tpurchase_date', 'tpurchase', ['date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('Idx_tpurchase_date', table_name='tpurchase')
+    op.create_index('Idx_date', 'tpurchase', ['date'], unique=False)
+    op.drop_index('Idx_tsales_date', table_name='tsales')
+    op.create_index('Idx_date', 'tsales', ['date'], unique=False)
@@ -0,0 +1,31 @@
+"""Never reuse item journal ids on SQLite
+
+Revision ID: f3d8a2c6b915
+Revises: e5b2c7d9a140
+Create Date: 2026-10-19 21:04:12.518330
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3d8a2c6b915'
+down_revision = 'e5b2c7d9a140'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # MySQL AUTO_INCREMENT ids are not reused, SQLite needs AUTOINCREMENT, which
+    # only a rebuilt table can get
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('titemjournal', recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+        pass
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('titemjournal', recreate='always', table_kwargs={'sqlite_autoincrement': False}):
+        pass
@@ -0,0 +1,281 @@
+"""Demand forecasts, reorder points and ABC classes computed for all items at once.
+
+Daily sold quantities are read from the sales details with one grouped query into
+an (items x days) NumPy matrix, every statistic is then an operation over whole
+columns of that matrix. Reports are cached until the change sequence moves, that
+is until a sales, purchase or item change is committed.
+"""
+from typing import Dict, NamedTuple, Optional, Tuple
+import datetime
+import threading
+from statistics import NormalDist
+import numpy as np
+from sqlalchemy import select, and_, func
+from sqlalchemy.orm import Session
+
+from .db.changes import current_change_seq
+from .db.schema import Item, ItemStock, Sales, SalesD
+from .model.report import AbcModel, AbcReportModel, ReorderModel, ReorderReportModel
+
+
+CACHE_SIZE = 32
+
+
+class DailySales(NamedTuple):
+    item_ids: np.ndarray
+    # items x days, sold quantity per day
+    quantities: np.ndarray
+
+
+class Forecast(NamedTuple):
+    average: np.ndarray
+    smoothed: np.ndarray
+    safety_stock: np.ndarray
+    reorder_point: np.ndarray
+
+
+def load_daily_sales(session: Session, date_from: datetime.date, date_to: datetime.date) -> DailySales:
+    days = (date_to - date_from).days + 1
+    # from the sales, as the abc report, the journal of a closed period is archived
+    rows = session.execute(
+        select(
+            SalesD.itemId, Sales.date, func.sum(SalesD.quantity),
+        ).join(
+            Sales, SalesD.salesId == Sales.id
+        ).where(
+            Sales.date.between(date_from, date_to)
+        ).group_by(
+            SalesD.itemId, Sales.date,
+        )
+    ).all()
+    if not rows:
+        return DailySales(np.empty(0, dtype=np.int64), np.zeros((0, days)))
+
+    item_column, date_column, quantity_column = zip(*rows)
+    item_ids, item_index = np.unique(np.array(item_column, dtype=np.int64), return_inverse=True)
+    day_index = (np.array(date_column, dtype='datetime64[D]') - np.datetime64(date_from, 'D')).astype(np.int64)
+
+    quantities = np.zeros((len(item_ids), days))
+    np.add.at(quantities, (item_index, day_index), np.array(quantity_column, dtype=np.float64))
+    return DailySales(item_ids, quantities)
+
+
+def forecast(
+    quantities: np.ndarray,
+    alpha: float = 0.3,
+    lead_time: int = 7,
+    service_level: float = 0.95,
+) -> Forecast:
+    """Per item (row) daily demand, simple exponential smoothing and reorder point.
+
+    Safety stock covers the daily demand deviation over the lead time at the
+    given service level, assuming normally distributed demand.
+    """
+    average = quantities.mean(axis=1)
+    smoothed = average.copy()
+    # the loop runs over days, each step updates every item
+    for day in range(quantities.shape[1]):
+        smoothed += alpha * (quantities[:, day] - smoothed)
+
+    if quantities.shape[1] > 1:
+        deviation = quantities.std(axis=1, ddof=1)
+    else:
+        deviation = np.zeros(len(quantities))
+    safety_stock = NormalDist().inv_cdf(service_level) * deviation * np.sqrt(lead_time)
+    reorder_point = smoothed * lead_time + safety_stock
+    return Forecast(average, smoothed, safety_stock, reorder_point)
+
+
+def reorder_report(
+    session: Session,
+    as_of: datetime.date,
+    days: int = 90,
+    alpha: float = 0.3,
+    lead_time: int = 7,
+    review_days: int = 14,
+    service_level: float = 0.95,
+    include_all: bool = False,
+    limit: int = 100,
+) -> ReorderReportModel:
+    """Items at or below their reorder point, most short first.
+
+    The suggested quantity brings the stock up to the reorder point plus the
+    forecast demand of one review period.
+    """
+    date_from = as_of - datetime.timedelta(days=days - 1)
+    report = ReorderReportModel(dateFrom=date_from, dateTo=as_of, seq=current_change_seq(session))
+
+    sales = load_daily_sales(session, date_from, as_of)
+    if not len(sales.item_ids):
+        return report
+    result = forecast(sales.quantities, alpha, lead_time, service_level)
+
+    items = session.execute(
+        select(
+            Item.id, Item.code, Item.name, func.coalesce(ItemStock.quantity, 0),
+        ).outerjoin(
+            ItemStock, ItemStock.itemId == Item.id
+        ).where(
+            Item.isActive.is_(True)
+        ).order_by(
+            Item.id
+        )
+    ).all()
+    if not items:
+        return report
+    item_ids = np.array([row[0] for row in items], dtype=np.int64)
+    stock_by_item = np.array([row[3] for row in items], dtype=np.float64)
+
+    # position of each sold item in the (sorted) active item list
+    position = np.minimum(np.searchsorted(item_ids, sales.item_ids), len(item_ids) - 1)
+    active = item_ids[position] == sales.item_ids
+    stock = np.where(active, stock_by_item[position], 0)
+
+    order_up_to = result.reorder_point + result.smoothed * review_days
+    below = active & (stock <= result.reorder_point)
+    suggested = np.where(below, np.ceil(np.maximum(order_up_to - stock, 0)), 0)
+
+    shortage = stock - result.reorder_point
+    selected = np.flatnonzero(active if include_all else below)
+    selected = selected[np.argsort(shortage[selected], kind='stable')][:limit]
+
+    for index in selected:
+        code, name, quantity = items[position[index]][1:]
+        report.items.append(ReorderModel(
+            itemId=int(sales.item_ids[index]),
+            code=code,
+            name=name,
+            stock=quantity,
+            averageDemand=round(float(result.average[index]), 4),
+            forecastDemand=round(float(result.smoothed[index]), 4),
+            safetyStock=round(float(result.safety_stock[index]), 4),
+            reorderPoint=round(float(result.reorder_point[index]), 4),
+            suggestedQuantity=int(suggested[index]),
+        ))
+    return report
+
+
+def classify(values: np.ndarray, a_share: float = 0.8, b_share: float = 0.95) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Order (largest first), cumulative share and A/B/C class of ``values``.
+
+    An item is in A while the items ranked before it make up less than ``a_share``
+    of the total, so the largest item is always A.
+    """
+    order = np.argsort(-values, kind='stable')
+    total = values.sum()
+    shares = values[order] / total if total > 0 else np.zeros(len(values))
+    cumulative = np.cumsum(shares)
+    before = cumulative - shares
+    classes = np.where(before < a_share, 'A', np.where(before < b_share, 'B', 'C'))
+    return order, cumulative, classes
+
+
+def abc_report(
+    session: Session,
+    date_from: datetime.date,
+    date_to: datetime.date,
+    market_place_id: Optional[int] = None,
+    a_share: float = 0.8,
+    b_share: float = 0.95,
+) -> AbcReportModel:
+    """Items sold in a date window ranked by revenue, with revenue and velocity classes."""
+    report = AbcReportModel(dateFrom=date_from, dateTo=date_to, seq=current_change_seq(session))
+
+    conditions = [Sales.date.between(date_from, date_to)]
+    if market_place_id is not None:
+        conditions.append(Sales.marketPlaceId == market_place_id)
+    rows = session.execute(
+        select(
+            Item.id,
+            Item.code,
+            Item.name,
+            func.sum(SalesD.quantity),
+            func.sum(SalesD.quantity * func.coalesce(SalesD.unitPrice, 0)),
+            func.count(func.distinct(Sales.id)),
+        ).join(
+            Sales, SalesD.salesId == Sales.id
+        ).join(
+            Item, SalesD.itemId == Item.id
+        ).where(
+            and_(*conditions)
+        ).group_by(
+            Item.id, Item.code, Item.name,
+        )
+    ).all()
+    if not rows:
+        return report
+
+    quantity = np.array([row[3] for row in rows], dtype=np.float64)
+    revenue = np.array([row[4] for row in rows], dtype=np.float64)
+    days = (date_to - date_from).days + 1
+
+    order, cumulative, revenue_classes = classify(revenue, a_share, b_share)
+    velocity_order, _, velocity_ranked = classify(quantity, a_share, b_share)
+    # back from velocity rank to row position
+    velocity_classes = np.empty(len(rows), dtype=velocity_ranked.dtype)
+    velocity_classes[velocity_order] = velocity_ranked
+
+    total = revenue.sum()
+    report.totalRevenue = sum(row[4] or 0 for row in rows)
+    for rank, index in enumerate(order):
+        item_id, code, name, item_quantity, item_revenue, orders = rows[index]
+        report.items.append(AbcModel(
+            itemId=item_id,
+            code=code,
+            name=name,
+            quantity=item_quantity,
+            revenue=item_revenue or 0,
+            orders=orders,
+            velocity=round(quantity[index] / days, 4),
+            revenueShare=round(float(revenue[index] / total), 6) if total > 0 else 0,
+            cumulativeShare=round(float(cumulative[rank]), 6),
+            revenueClass=str(revenue_classes[rank]),
+            velocityClass=str(velocity_classes[index]),
+        ))
+    return report
+
+
+class ReportCache:
+    """Reports by parameters, valid while the change sequence they were computed at is current.
+
+    Callers get a copy, changing it does not change the cached report.
+    """
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries: Dict[Tuple, Tuple[int, object]] = {}
+
+    def get(self, session: Session, key: Tuple, compute):
+        seq = current_change_seq(session)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and entry[0] == seq:
+            return entry[1].copy(deep=True)
+
+        value = compute()
+        with self.lock:
+            self.entries.pop(key, None)
+            if len(self.entries) >= self.size:
+                # oldest first, dicts keep insertion order
+                self.entries.pop(next(iter(self.entries)))
+            self.entries[key] = (seq, value)
+        return value.copy(deep=True)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+report_cache = ReportCache()
+
+
+def cached_reorder_report(session: Session, as_of: Optional[datetime.date] = None, **params) -> ReorderReportModel:
+    as_of = as_of or datetime.date.today()
+    key = ('reorder', as_of, *sorted(params.items()))
+    return report_cache.get(session, key, lambda: reorder_report(session, as_of, **params))
+
+
+def cached_abc_report(session: Session, date_from: datetime.date, date_to: datetime.date, **params) -> AbcReportModel:
+    key = ('abc', date_from, date_to, *sorted(params.items()))
+    return report_cache.get(session, key, lambda: abc_report(session, date_from, date_to, **params))
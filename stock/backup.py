@@ -0,0 +1,242 @@
+"""Online backups of the database and item images.
+
+``python -m stock.backup create <root>`` writes ``<root>/<timestamp>/`` while the
+app keeps running:
+
+* sqlite: the online backup API copies ``pages`` pages per step and sleeps
+  between steps, so writers are only held up for one short step at a time
+* mysql: ``mysqldump --single-transaction`` reads a consistent snapshot
+  without locking InnoDB tables
+
+Image files are named by their content hash and shared by all backups under
+``<root>/images``, so each backup copies only images added since the last one.
+Thumbnails are not backed up, they are recreated from the images.
+"""
+from typing import List, Optional, Tuple
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import time
+from pathlib import Path
+
+from .settings import get_settings
+from . import images
+
+
+PAGES_PER_STEP = 256
+STEP_SLEEP = 0.05
+MANIFEST = 'manifest.json'
+SQLITE_FILE = 'database.sqlite'
+MYSQL_FILE = 'database.sql.gz'
+DUMP_COMPLETED = b'-- Dump completed'
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(images.CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def backup_sqlite(source_path: str, target_path: Path, pages: int = PAGES_PER_STEP, sleep: float = STEP_SLEEP) -> None:
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(str(target_path))
+    try:
+        # sleep is the pause between steps, during which writers get the database
+        source.backup(target, pages=pages, sleep=sleep)
+    finally:
+        target.close()
+        source.close()
+
+
+def dump_mysql(target_path: Path) -> None:
+    settings = get_settings()
+    command = [
+        'mysqldump',
+        '--single-transaction',
+        '--quick',
+        '--routines',
+        '--no-tablespaces',
+        '--host', settings.db_host,
+        '--port', str(settings.db_port),
+        '--user', settings.db_user,
+        settings.db_database,
+    ]
+    # the password is passed in the environment, not visible in the process list
+    env = dict(os.environ, MYSQL_PWD=settings.get_password())
+    with subprocess.Popen(command, stdout=subprocess.PIPE, env=env) as process, \
+            gzip.open(target_path, 'wb') as out:
+        shutil.copyfileobj(process.stdout, out, images.CHUNK_SIZE)
+    if process.returncode != 0:
+        target_path.unlink()
+        raise Exception('mysqldump failed with exit code {}'.format(process.returncode))
+
+
+def copy_images(source_dir: Path, target_dir: Path) -> Tuple[int, int]:
+    """Copy image files missing in ``target_dir``, returns (copied, total)."""
+    copied = total = 0
+    for path in source_dir.glob('??/*'):
+        if path.name.endswith(('.thumb.jpg', '.tmp', '.upload')):
+            continue
+        total += 1
+        target = target_dir / path.parent.name / path.name
+        if target.exists():
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp_name = target.with_name(target.name + '.tmp')
+        shutil.copyfile(path, temp_name)
+        os.replace(temp_name, target)
+        copied += 1
+    return copied, total
+
+
+def create_backup(root: Path, pages: int = PAGES_PER_STEP, sleep: float = STEP_SLEEP) -> Path:
+    settings = get_settings()
+    started = time.monotonic()
+    target = root / datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    target.mkdir(parents=True)
+
+    if settings.db_driver == 'sqlite':
+        database = target / SQLITE_FILE
+        backup_sqlite(settings.get_db_url().database, database, pages, sleep)
+    elif settings.db_driver == 'mysql':
+        database = target / MYSQL_FILE
+        dump_mysql(database)
+    else:
+        raise Exception('Unknown db driver {}'.format(settings.db_driver))
+
+    copied, total = copy_images(settings.get_image_dir(), root / 'images')
+    manifest = {
+        'createdAt': datetime.datetime.now().isoformat(timespec='seconds'),
+        'driver': settings.db_driver,
+        'database': database.name,
+        'sha256': file_sha256(database),
+        'imagesCopied': copied,
+        'images': total,
+        'seconds': round(time.monotonic() - started, 3),
+    }
+    (target / MANIFEST).write_text(json.dumps(manifest, indent=2))
+    return target
+
+
+def referenced_images(database: Path) -> List[str]:
+    connection = sqlite3.connect('file:{}?mode=ro'.format(database), uri=True)
+    try:
+        return [
+            row[0] for row in connection.execute('SELECT DISTINCT contentHash FROM mitemimg WHERE contentHash IS NOT NULL')
+        ]
+    finally:
+        connection.close()
+
+
+def verify_backup(path: Path, deep: bool = False) -> List[str]:
+    """Problems found in a backup, empty when it is usable.
+
+    ``deep`` also rehashes every referenced image (sqlite backups only, a mysql
+    dump can only be checked for completeness without loading it).
+    """
+    manifest_path = path / MANIFEST
+    if not manifest_path.exists():
+        return ['{} is missing'.format(MANIFEST)]
+    manifest = json.loads(manifest_path.read_text())
+    database = path / manifest['database']
+    if not database.exists():
+        return ['{} is missing'.format(database.name)]
+
+    errors = []
+    if file_sha256(database) != manifest['sha256']:
+        errors.append('{} checksum does not match the manifest'.format(database.name))
+
+    if manifest['driver'] == 'sqlite':
+        connection = sqlite3.connect('file:{}?mode=ro'.format(database), uri=True)
+        try:
+            result = connection.execute('PRAGMA integrity_check').fetchone()[0]
+        finally:
+            connection.close()
+        if result != 'ok':
+            errors.append('integrity check failed: {}'.format(result))
+            return errors
+
+        image_dir = path.parent / 'images'
+        for content_hash in referenced_images(database):
+            image = image_dir / content_hash[:2] / content_hash
+            if not image.exists():
+                errors.append('image {} is missing'.format(content_hash))
+            elif deep and file_sha256(image) != content_hash:
+                errors.append('image {} is corrupt'.format(content_hash))
+    else:
+        # mysqldump writes its completion comment last
+        tail = b''
+        with gzip.open(database, 'rb') as dump:
+            for chunk in iter(lambda: dump.read(images.CHUNK_SIZE), b''):
+                tail = (tail + chunk)[-256:]
+        if DUMP_COMPLETED not in tail:
+            errors.append('{} is incomplete'.format(database.name))
+    return errors
+
+
+def restore_backup(path: Path, pages: Optional[int] = None) -> None:
+    """Restore the database and missing images of a verified backup, stop the app first."""
+    errors = verify_backup(path)
+    if errors:
+        raise Exception('Backup is not valid: {}'.format('; '.join(errors)))
+
+    settings = get_settings()
+    manifest = json.loads((path / MANIFEST).read_text())
+    if manifest['driver'] != settings.db_driver:
+        raise Exception('Backup is for {}, configured driver is {}'.format(manifest['driver'], settings.db_driver))
+
+    database = path / manifest['database']
+    if settings.db_driver == 'sqlite':
+        backup_sqlite(str(database), Path(settings.get_db_url().database), pages or -1, 0)
+    else:
+        command = [
+            'mysql',
+            '--host', settings.db_host,
+            '--port', str(settings.db_port),
+            '--user', settings.db_user,
+            settings.db_database,
+        ]
+        env = dict(os.environ, MYSQL_PWD=settings.get_password())
+        with subprocess.Popen(command, stdin=subprocess.PIPE, env=env) as process, gzip.open(database, 'rb') as dump:
+            shutil.copyfileobj(dump, process.stdin, images.CHUNK_SIZE)
+            process.stdin.close()
+        if process.returncode != 0:
+            raise Exception('mysql failed with exit code {}'.format(process.returncode))
+
+    copy_images(path.parent / 'images', settings.get_image_dir())
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Back up, verify and restore the database and item images')
+    commands = parser.add_subparsers(dest='command', required=True)
+    create_parser = commands.add_parser('create')
+    create_parser.add_argument('root', type=Path)
+    create_parser.add_argument('--pages', type=int, default=PAGES_PER_STEP, help='sqlite pages copied per step')
+    create_parser.add_argument('--sleep', type=float, default=STEP_SLEEP, help='seconds between sqlite steps')
+    verify_parser = commands.add_parser('verify')
+    verify_parser.add_argument('path', type=Path)
+    verify_parser.add_argument('--deep', action='store_true', help='also rehash every image')
+    restore_parser = commands.add_parser('restore')
+    restore_parser.add_argument('path', type=Path)
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        print('Backup written to', create_backup(args.root, args.pages, args.sleep))
+    elif args.command == 'verify':
+        problems = verify_backup(args.path, args.deep)
+        for problem in problems:
+            print(problem)
+        print('Backup is valid' if not problems else 'Backup is NOT valid')
+        raise SystemExit(1 if problems else 0)
+    else:
+        restore_backup(args.path)
+        print('Restored from', args.path)
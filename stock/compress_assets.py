@@ -0,0 +1,51 @@
+"""Write .gz (and .br when brotli is installed) siblings of the built assets,
+served by PrecompressedStaticFiles. Run after ``yarn build``.
+"""
+import gzip
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE = {'.html', '.js', '.css', '.json', '.map', '.svg', '.txt', '.ico'}
+MINIMUM_SIZE = 1024
+
+
+def compress_assets(directory: Path) -> int:
+    count = 0
+    for path in directory.rglob('*'):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE:
+            continue
+        stat = path.stat()
+        if stat.st_size < MINIMUM_SIZE:
+            continue
+
+        content = None
+        outputs = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            outputs.append(('.br', lambda data: brotli.compress(data, quality=11)))
+
+        for suffix, compress in outputs:
+            target = path.with_name(path.name + suffix)
+            if target.exists() and target.stat().st_mtime >= stat.st_mtime:
+                continue
+            if content is None:
+                content = path.read_bytes()
+            compressed = compress(content)
+            if len(compressed) >= stat.st_size:
+                continue
+            target.write_bytes(compressed)
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Precompress built static assets')
+    parser.add_argument('directory', nargs='?', type=Path, default=Path(__file__).parent / 'assets')
+    args = parser.parse_args()
+    print('Files compressed:', compress_assets(args.directory))
@@ -0,0 +1,36 @@
+from typing import List
+from sqlalchemy import select, insert, func
+from sqlalchemy.orm import Session
+
+from .schema import ChangeSeq, DeletedRow
+
+
+def current_change_seq(session: Session) -> int:
+    return session.execute(
+        select(ChangeSeq.seq).where(ChangeSeq.id == 1)
+    ).scalar_one()
+
+
+def table_change_seq(session: Session, model) -> int:
+    """Latest change sequence of a tracked table's rows and tombstones, moves with
+    every committed insert, update or delete of the table only.
+    """
+    updated = session.execute(select(func.max(model.changeSeq))).scalar()
+    deleted = session.execute(
+        select(DeletedRow.changeSeq).where(
+            DeletedRow.tableName == model.__tablename__
+        ).order_by(
+            DeletedRow.changeSeq.desc()
+        ).limit(1)
+    ).scalar()
+    return max(updated or 0, deleted or 0)
+
+
+def record_deleted(session: Session, model, ids: List[int]) -> None:
+    """Leave tombstones for rows deleted from a change tracked table, so sync clients drop them."""
+    if not ids:
+        return
+    session.execute(
+        insert(DeletedRow),
+        [{'tableName': model.__tablename__, 'rowId': id} for id in ids],
+    )
@@ -0,0 +1,72 @@
+from typing import Any, Dict, Optional
+import logging
+import threading
+from sqlalchemy import update, select, and_
+from sqlalchemy.orm import Session
+
+
+logger = logging.getLogger(__name__)
+
+
+class ConflictError(Exception):
+    pass
+
+
+class UnversionedUpdates:
+    """Updates saved without the version check, per model, until all clients send it."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def record(self, name: str) -> None:
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(sorted(self.counts.items()))
+
+
+unversioned_updates = UnversionedUpdates()
+
+
+def versioned_update(
+    session: Session,
+    model,
+    id: int,
+    version: Optional[int],
+    values: Dict[str, Any],
+) -> int:
+    """Update a row with a version_id_col guard, return the new version.
+
+    ``version`` is the version the client read, None skips the check (old clients)
+    but still bumps the version so other writers see the change. Such updates
+    are logged and counted in ``unversioned_updates``.
+    """
+    conditions = [model.id == id]
+    if version is not None:
+        conditions.append(model.version == version)
+    else:
+        logger.warning('%s %s updated without a version, the conflict check is skipped', model.__name__, id)
+        unversioned_updates.record(model.__name__)
+
+    result = session.execute(
+        update(model).where(
+            and_(*conditions)
+        ).values(
+            version=model.version + 1,
+            **values
+        ).execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        exists = session.execute(
+            select(model.id).where(model.id == id)
+        ).scalar_one_or_none()
+        if exists is None:
+            raise Exception('Error {} not found'.format(model.__name__))
+        raise ConflictError('{} {} was modified by another user, reload and try again'.format(model.__name__, id))
+
+    return session.execute(
+        select(model.version).where(model.id == id)
+    ).scalar_one()
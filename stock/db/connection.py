@@ -1,4 +1,5 @@
-from typing import Generator
+from typing import Generator, Optional
+from contextvars import ContextVar
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 from ..settings import get_settings
@@ -12,6 +13,14 @@ engine = create_engine(
 )
 
 
+# set by POST /batch, so its sub-requests run on the batch's session
+shared_session: ContextVar[Optional[Session]] = ContextVar('shared_session', default=None)
+
+
 def get_session() -> Generator[Session, None, None]:
+    session = shared_session.get()
+    if session is not None:
+        yield session
+        return
     with Session(engine) as session:
         yield session
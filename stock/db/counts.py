@@ -0,0 +1,106 @@
+"""Total row counts for paginated lists.
+
+Filtered counts are exact and cached by table and normalized filter until a
+change to that table is committed. Unfiltered counts of large tables use the row estimate
+kept by the database (``information_schema.TABLES`` on MySQL, ``sqlite_stat1``
+on SQLite after ``ANALYZE``) and are flagged as approximate.
+"""
+from typing import Dict, Optional, Tuple
+import threading
+from fastapi import Response
+from sqlalchemy import select, func, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from .changes import table_change_seq
+from .utils import begin_explicitly
+
+
+CACHE_SIZE = 1024
+# unfiltered tables estimated above this many rows are not counted exactly
+ESTIMATE_THRESHOLD = 100_000
+
+
+def normalize_query(q: str) -> str:
+    # keywords are and-ed case insensitive matches, their order does not matter
+    return ' '.join(sorted({keyword.lower() for keyword in q.split(' ') if keyword}))
+
+
+def estimate_rows(session: Session, table_name: str) -> Optional[int]:
+    dialect = session.get_bind().dialect.name
+    if dialect not in ('mysql', 'sqlite'):
+        return None
+    # in a savepoint, a failed lookup must not roll back the caller's transaction
+    begin_explicitly(session.connection())
+    savepoint = session.begin_nested()
+    try:
+        if dialect == 'mysql':
+            estimate = session.execute(
+                text(
+                    'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                    'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name'
+                ),
+                {'table_name': table_name},
+            ).scalar()
+        else:
+            stat = session.execute(
+                text('SELECT stat FROM sqlite_stat1 WHERE tbl = :table_name LIMIT 1'),
+                {'table_name': table_name},
+            ).scalar()
+            estimate = int(stat.split(' ')[0]) if stat else None
+    except DBAPIError:
+        # no statistics yet
+        savepoint.rollback()
+        return None
+    savepoint.commit()
+    return estimate
+
+
+class CountCache:
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries: Dict[Tuple, Tuple[int, int]] = {}
+
+    def get(self, key: Tuple, seq: int) -> Optional[int]:
+        with self.lock:
+            entry = self.entries.get(key)
+        return entry[1] if entry is not None and entry[0] == seq else None
+
+    def put(self, key: Tuple, seq: int, count: int) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+            if len(self.entries) >= self.size:
+                self.entries.pop(next(iter(self.entries)))
+            self.entries[key] = (seq, count)
+
+
+count_cache = CountCache()
+
+
+def count_total(session: Session, model, statement, filters: Tuple = ()) -> Tuple[int, bool]:
+    """(total rows of ``statement`` without limit/offset, whether it is approximate).
+
+    ``filters`` are the normalized request filters, empty when the list is unfiltered.
+    """
+    if not any(filters):
+        estimate = estimate_rows(session, model.__tablename__)
+        if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+            return estimate, True
+
+    # any committed change of the table moves its sequence, so a cached count is never stale
+    seq = table_change_seq(session, model)
+    key = (model.__tablename__, *filters)
+    count = count_cache.get(key, seq)
+    if count is None:
+        count = session.execute(
+            select(func.count()).select_from(statement.limit(None).offset(None).order_by(None).subquery())
+        ).scalar_one()
+        count_cache.put(key, seq, count)
+    return count, False
+
+
+def set_total_headers(response: Response, total: int, approximate: bool) -> None:
+    response.headers['X-Total-Count'] = str(total)
+    if approximate:
+        response.headers['X-Total-Approximate'] = 'true'
@@ -0,0 +1,153 @@
+"""Group commit of small write transactions (opt-in with ``Settings.group_commit``).
+
+Writes submitted by concurrent requests within ``delay`` seconds are applied in
+one transaction, each in its own savepoint: a failing write is rolled back alone
+and its caller gets the exception, the others are committed together with one
+commit (on SQLite one fsync and one write lock instead of one per request).
+When the shared commit itself fails, every write of the batch is retried in its
+own transaction so each caller still gets its own result.
+"""
+from typing import Any, Callable, List, Optional, Tuple
+import asyncio
+import threading
+import time
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..settings import get_settings
+from .connection import engine
+from .utils import begin_explicitly
+
+
+Write = Callable[[Session], Any]
+
+
+class WriteMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+        self.max_batch_size = 0
+        self.commit_seconds = 0.0
+        self.max_commit_seconds = 0.0
+        self.fallbacks = 0
+
+    def record(self, size: int, failed: int, commit_seconds: float) -> None:
+        with self.lock:
+            self.batches += 1
+            self.writes += size
+            self.failed += failed
+            self.max_batch_size = max(self.max_batch_size, size)
+            self.commit_seconds += commit_seconds
+            self.max_commit_seconds = max(self.max_commit_seconds, commit_seconds)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'batches': self.batches,
+                'writes': self.writes,
+                'failed': self.failed,
+                'fallbacks': self.fallbacks,
+                'averageBatchSize': round(self.writes / self.batches, 3) if self.batches else 0,
+                'maxBatchSize': self.max_batch_size,
+                'averageCommitMs': round(self.commit_seconds / self.batches * 1000, 3) if self.batches else 0,
+                'maxCommitMs': round(self.max_commit_seconds * 1000, 3),
+            }
+
+
+class WriteQueue:
+    def __init__(self, bind=None, delay: float = 0.005, max_batch: int = 50):
+        self.bind = bind
+        self.delay = delay
+        self.max_batch = max_batch
+        self.metrics = WriteMetrics()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+
+    def _start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop or self.worker is None or self.worker.done():
+            self.loop = loop
+            self.queue = asyncio.Queue()
+            self.worker = loop.create_task(self._run())
+
+    async def submit(self, write: Write) -> Any:
+        """Run ``write(session)`` in the next batch, returns its result or raises its exception.
+
+        ``write`` must not commit; what it returns should not need the session
+        after commit (ids, pydantic models, plain values).
+        """
+        self._start()
+        future = self.loop.create_future()
+        await self.queue.put((write, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[Write, asyncio.Future]]:
+        batch = [await self.queue.get()]
+        deadline = self.loop.time() + self.delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            try:
+                results = await run_in_threadpool(self.apply, [write for write, _ in batch])
+            except Exception as ex:
+                results = [(None, ex)] * len(batch)
+            for (_, future), (result, error) in zip(batch, results):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    def apply(self, writes: List[Write]) -> List[Tuple[Any, Optional[Exception]]]:
+        results: List[Tuple[Any, Optional[Exception]]] = []
+        with Session(self.bind or engine, expire_on_commit=False) as session:
+            # otherwise on SQLite every savepoint release below is a commit of its own
+            begin_explicitly(session.connection())
+            for write in writes:
+                try:
+                    with session.begin_nested():
+                        results.append((write(session), None))
+                except Exception as ex:
+                    results.append((None, ex))
+            started = time.perf_counter()
+            try:
+                session.commit()
+            except Exception:
+                session.rollback()
+                with self.metrics.lock:
+                    self.metrics.fallbacks += 1
+                return [self.apply_one(write) for write in writes]
+            commit_seconds = time.perf_counter() - started
+
+        self.metrics.record(len(writes), sum(1 for _, error in results if error is not None), commit_seconds)
+        return results
+
+    def apply_one(self, write: Write) -> Tuple[Any, Optional[Exception]]:
+        with Session(self.bind or engine, expire_on_commit=False) as session:
+            try:
+                result = write(session)
+                session.commit()
+                return result, None
+            except Exception as ex:
+                session.rollback()
+                return None, ex
+
+
+write_queue = WriteQueue(
+    delay=get_settings().group_commit_delay,
+    max_batch=get_settings().group_commit_max_batch,
+)
@@ -0,0 +1,238 @@
+"""Chunked online data migrations.
+
+A data migration walks a table in primary key order and processes at most
+``chunk_size`` keys per transaction, saving the last processed key in
+``smigration`` in the same transaction. Locks are held for one chunk at a time
+and the runner sleeps between chunks, so the app keeps serving requests while it
+runs, and an interrupted migration resumes after its last committed chunk.
+Side effects outside the database (files) are repeated for a chunk that did not
+commit, keep them idempotent.
+
+Migrations are registered with ``@data_migration(...)`` and run from an Alembic
+revision with ``run_in_alembic(name)`` (``alembic -x data_migrations=defer
+upgrade head`` skips them) or while the app runs with
+``python -m stock.db.migration run <name>``.
+"""
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+import datetime
+import io
+import time
+from sqlalchemy import Column, Table, select, insert, update, delete, and_, func
+from sqlalchemy.engine import Connection, Engine, Row
+
+from .schema import ItemImg, MigrationCheckpoint
+from .. import images
+
+
+CHUNK_SIZE = 1000
+CHUNK_SLEEP = 0.1
+REPORT_INTERVAL = 5.0
+
+checkpoint_table: Table = MigrationCheckpoint.__table__
+
+
+class DataMigration(NamedTuple):
+    name: str
+    table: Table
+    # selected for process, the primary key is always selected first
+    columns: Sequence[Column]
+    process: Callable[[Connection, List[Row]], None]
+    where: Optional[object] = None
+
+
+class Progress(NamedTuple):
+    name: str
+    rows: int
+    lastId: int
+    maxId: int
+    fraction: float
+    elapsed: float
+    eta: Optional[float]
+    finished: bool
+
+    def __str__(self) -> str:
+        return '{}: {} rows, id {}/{} ({:.1f}%), {:.0f}s elapsed, {}'.format(
+            self.name, self.rows, self.lastId, self.maxId, self.fraction * 100, self.elapsed,
+            'finished' if self.finished else 'ETA {}'.format(
+                '?' if self.eta is None else datetime.timedelta(seconds=round(self.eta))
+            ),
+        )
+
+
+MIGRATIONS: Dict[str, DataMigration] = {}
+
+
+def data_migration(name: str, table: Table, columns: Sequence[Column], where=None):
+    def register(process: Callable[[Connection, List[Row]], None]):
+        MIGRATIONS[name] = DataMigration(name, table, columns, process, where)
+        return process
+    return register
+
+
+def print_progress(progress: Progress) -> None:
+    print(progress, flush=True)
+
+
+def run(
+    engine: Engine,
+    name: str,
+    chunk_size: int = CHUNK_SIZE,
+    sleep: float = CHUNK_SLEEP,
+    report: Callable[[Progress], None] = print_progress,
+    report_interval: float = REPORT_INTERVAL,
+) -> Progress:
+    """Run a registered migration to the end, resuming from its checkpoint."""
+    migration = MIGRATIONS[name]
+    pk = list(migration.table.primary_key.columns)[0]
+    columns = [pk] + [column for column in migration.columns if column is not pk]
+
+    with engine.begin() as connection:
+        state = connection.execute(
+            select(checkpoint_table).where(checkpoint_table.c.name == name)
+        ).first()
+        if state is None:
+            connection.execute(
+                insert(checkpoint_table).values(name=name, lastId=0, rows=0, startedAt=datetime.datetime.now())
+            )
+            last_id, rows, finished = 0, 0, False
+        else:
+            last_id, rows, finished = state.lastId, state.rows, state.finishedAt is not None
+        max_id = connection.execute(select(func.max(pk))).scalar() or 0
+
+    first_id = last_id
+    started = time.monotonic()
+    reported = started
+
+    def progress() -> Progress:
+        elapsed = time.monotonic() - started
+        if finished or max_id <= first_id:
+            fraction = 1.0
+        else:
+            fraction = min(1.0, (last_id - first_id) / (max_id - first_id))
+        eta = elapsed / fraction * (1 - fraction) if fraction > 0 else None
+        return Progress(name, rows, last_id, max_id, fraction, elapsed, eta, finished)
+
+    current = progress()
+    while not finished:
+        with engine.begin() as connection:
+            # the chunk is bounded by keys, not by matching rows, so a sparse
+            # where clause does not turn one chunk into a scan of the table
+            upper = connection.execute(
+                select(pk).where(pk > last_id).order_by(pk).offset(chunk_size - 1).limit(1)
+            ).scalar()
+            conditions = [pk > last_id]
+            if upper is not None:
+                conditions.append(pk <= upper)
+            if migration.where is not None:
+                conditions.append(migration.where)
+            chunk = connection.execute(
+                select(*columns).where(and_(*conditions)).order_by(pk)
+            ).all()
+            if chunk:
+                migration.process(connection, chunk)
+
+            rows += len(chunk)
+            if upper is not None:
+                last_id = upper
+            else:
+                last_id = max([last_id] + [row[0] for row in chunk])
+                finished = True
+            connection.execute(
+                update(checkpoint_table).where(checkpoint_table.c.name == name).values(
+                    lastId=last_id,
+                    rows=rows,
+                    finishedAt=datetime.datetime.now() if finished else None,
+                )
+            )
+
+        current = progress()
+        if finished or time.monotonic() - reported >= report_interval:
+            reported = time.monotonic()
+            report(current)
+        if not finished and sleep:
+            time.sleep(sleep)
+
+    return current
+
+
+def run_in_alembic(name: str, **kwargs) -> None:
+    """Run a migration from an Alembic revision, committing per chunk.
+
+    The revision's own changes are committed first, so the tables are not
+    locked for the whole migration.
+    """
+    from alembic import context as environment, op
+
+    context = op.get_context()
+    if context.as_sql:
+        print('-- data migration {} is not run in offline mode, run: python -m stock.db.migration run {}'.format(name, name))
+        return
+    if environment.get_x_argument(as_dictionary=True).get('data_migrations') == 'defer':
+        print('Data migration {} deferred, run: python -m stock.db.migration run {}'.format(name, name))
+        return
+    with context.autocommit_block():
+        run(op.get_bind().engine, name, **kwargs)
+
+
+def status(engine: Engine) -> List[Row]:
+    with engine.connect() as connection:
+        return connection.execute(select(checkpoint_table).order_by(checkpoint_table.c.name)).all()
+
+
+def reset(engine: Engine, name: str) -> None:
+    with engine.begin() as connection:
+        connection.execute(delete(checkpoint_table).where(checkpoint_table.c.name == name))
+
+
+item_img_table: Table = ItemImg.__table__
+
+
+@data_migration(
+    'item-image-files',
+    item_img_table,
+    [item_img_table.c.content],
+    where=and_(item_img_table.c.content.isnot(None), item_img_table.c.contentHash.is_(None)),
+)
+def move_item_images(connection: Connection, rows: List[Row]) -> None:
+    """Move legacy in-row image content to files named by their hash."""
+    for row in rows:
+        try:
+            stored = images.store_image(io.BytesIO(row.content), max_size=len(row.content))
+        except images.UnsupportedImage:
+            # not a known image type, left in the row where it is still served from
+            continue
+        images.make_thumbnail(stored.contentHash)
+        connection.execute(
+            update(item_img_table).where(item_img_table.c.id == row.id).values(
+                content=None,
+                contentHash=stored.contentHash,
+                contentType=stored.contentType,
+                fileSize=stored.fileSize,
+            )
+        )
+
+
+if __name__ == '__main__':
+    import argparse
+    from .connection import engine
+
+    parser = argparse.ArgumentParser(description='Run chunked data migrations while the app is running')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status')
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('name', choices=sorted(MIGRATIONS))
+    run_parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    run_parser.add_argument('--sleep', type=float, default=CHUNK_SLEEP, help='seconds between chunks')
+    run_parser.add_argument('--restart', action='store_true', help='forget the checkpoint and start over')
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        for state in status(engine):
+            print('{}: {} rows, last id {}, started {}, {}'.format(
+                state.name, state.rows, state.lastId, state.startedAt,
+                'finished {}'.format(state.finishedAt) if state.finishedAt else 'not finished',
+            ))
+    else:
+        if args.restart:
+            reset(engine, args.name)
+        run(engine, args.name, args.chunk_size, args.sleep)
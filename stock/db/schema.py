@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, LargeBinary, String, Numeric, Date, Enum, Boolean, Text, ForeignKey, UniqueConstraint, Index, MetaData
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy import Column, Integer, BigInteger, LargeBinary, String, Numeric, Date, DateTime, Enum, Boolean, Text, ForeignKey, UniqueConstraint, Index, MetaData, DDL, event, func, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import declarative_base, relationship, backref, deferred
 
 
 convention = {
@@ -12,7 +13,54 @@ metadata = MetaData(naming_convention=convention)
 Base = declarative_base(metadata=metadata)
 
 
-class ItemCategory(Base):
+class ChangeSeq(Base):
+    __tablename__ = 'schangeseq'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    seq = Column(BigInteger, nullable=False)
+
+
+event.listen(
+    ChangeSeq.__table__,
+    'after_create',
+    DDL('INSERT INTO schangeseq (id, seq) VALUES (1, 0)'),
+)
+
+
+def next_change_seq(context) -> int:
+    # the counter row stays locked until commit, so sequence order is commit order
+    # and a client reading "changed since N" never misses a late committing row.
+    # The price is that writers of tracked tables commit one at a time, so the
+    # number is allocated once per transaction: all rows written by a
+    # transaction share it and only its first tracked write pays the two statements.
+    connection = context.connection
+    transaction = connection.get_transaction()
+    allocated = connection.info.get('change_seq')
+    if transaction is not None and allocated is not None and allocated[0] is transaction:
+        return allocated[1]
+    connection.execute(
+        update(ChangeSeq.__table__).where(ChangeSeq.__table__.c.id == 1).values(seq=ChangeSeq.__table__.c.seq + 1)
+    )
+    seq = connection.execute(
+        select(ChangeSeq.__table__.c.seq).where(ChangeSeq.__table__.c.id == 1)
+    ).scalar_one()
+    if transaction is not None:
+        connection.info['change_seq'] = (transaction, seq)
+    return seq
+
+
+@event.listens_for(Engine, 'rollback_savepoint')
+def forget_change_seq(connection, name, context) -> None:
+    # the counter update may be rolled back with the savepoint, the number must
+    # be allocated again or a later transaction commits it a second time
+    connection.info.pop('change_seq', None)
+
+
+class ChangeTracking:
+    changeSeq = Column(BigInteger, nullable=False, default=next_change_seq, onupdate=next_change_seq, server_default='0', index=True)
+    updatedAt = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class ItemCategory(ChangeTracking, Base):
     __tablename__ = 'mitemcategory'
     id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False)
@@ -20,7 +68,7 @@ class ItemCategory(Base):
     isActive = Column(Boolean, nullable=False, default=True, server_default='1')
 
 
-class Item(Base):
+class Item(ChangeTracking, Base):
     __tablename__ = 'mitem'
     id = Column(Integer, primary_key=True)
     code = Column(String(50), nullable=False)
@@ -29,24 +77,30 @@ class Item(Base):
     description = Column(Text)
     sellingPrice = Column(Numeric(20, 0))
     isActive = Column(Boolean, nullable=False, default=True, server_default='1')
+    version = Column(Integer, nullable=False, server_default='1')
 
     category = relationship('ItemCategory', backref='item_collection')
 
     UniqueConstraint(code)
 
+    __mapper_args__ = {'version_id_col': version}
+
 
 class ItemImg(Base):
     __tablename__ = 'mitemimg'
     id = Column(Integer, primary_key=True)
     itemId = Column(Integer, ForeignKey(Item.id, ondelete='CASCADE', onupdate='CASCADE'), nullable=False)
     contentType = Column(String(50))
-    content = Column(LargeBinary(10_000_000))
+    # legacy in-row content, new images are stored as files named by contentHash
+    content = deferred(Column(LargeBinary(10_000_000)))
     originalFileName = Column(String(255))
+    contentHash = Column(String(64), index=True)
+    fileSize = Column(Integer)
 
     item = relationship('Item', backref='item_images')
 
 
-class MarketPlace(Base):
+class MarketPlace(ChangeTracking, Base):
     __tablename__ = 'mmarketplace'
     id = Column(Integer, primary_key=True)
     name = Column(String(50), nullable=False)
@@ -54,21 +108,25 @@ class MarketPlace(Base):
     isActive = Column(Boolean, nullable=False, default=True, server_default='1')
 
 
-class Sales(Base):
+class Sales(ChangeTracking, Base):
     __tablename__ = 'tsales'
     id = Column(Integer, primary_key=True)
     code = Column(String(50), nullable=False)
     date = Column(Date)
     marketPlaceId = Column(Integer, ForeignKey(MarketPlace.id))
+    version = Column(Integer, nullable=False, server_default='1')
 
     marketPlace = relationship('MarketPlace', backref='sales_collection')
     details = relationship('SalesD', back_populates='sales')
 
     UniqueConstraint(code)
-    Index('Idx_date', date)
+    Index('Idx_tsales_date', date)
+    Index('Idx_tsales_marketPlaceId_date', marketPlaceId, date)
 
+    __mapper_args__ = {'version_id_col': version}
 
-class SalesD(Base):
+
+class SalesD(ChangeTracking, Base):
     __tablename__ = 'tsalesd'
     id = Column(Integer, primary_key=True)
     salesId = Column(Integer, ForeignKey(Sales.id, ondelete='CASCADE', onupdate='CASCADE'), nullable=False)
@@ -80,21 +138,25 @@ class SalesD(Base):
     item = relationship('Item')
 
 
-class Purchase(Base):
+class Purchase(ChangeTracking, Base):
     __tablename__ = 'tpurchase'
     id = Column(Integer, primary_key=True)
     code = Column(String(50), nullable=False)
     date = Column(Date)
     marketPlaceId = Column(Integer, ForeignKey(MarketPlace.id))
+    version = Column(Integer, nullable=False, server_default='1')
 
     marketPlace = relationship('MarketPlace', backref='purchase_collection')
     details = relationship('PurchaseD', back_populates='purchase')
 
     UniqueConstraint(code)
-    Index('Idx_date', date)
+    Index('Idx_tpurchase_date', date)
+    Index('Idx_tpurchase_marketPlaceId_date', marketPlaceId, date)
+
+    __mapper_args__ = {'version_id_col': version}
 
 
-class PurchaseD(Base):
+class PurchaseD(ChangeTracking, Base):
     __tablename__ = 'tpurchased'
     id = Column(Integer, primary_key=True)
     purchaseId = Column(Integer, ForeignKey(Purchase.id, ondelete='CASCADE', onupdate='CASCADE'), nullable=False)
@@ -106,6 +168,17 @@ class PurchaseD(Base):
     item = relationship('Item')
 
 
+class ItemStock(Base):
+    __tablename__ = 'mitemstock'
+    itemId = Column(Integer, ForeignKey(Item.id, ondelete='CASCADE', onupdate='CASCADE'), primary_key=True, autoincrement=False)
+    quantity = Column(Numeric(20, 2), nullable=False, default=0, server_default='0')
+    version = Column(Integer, nullable=False, server_default='1')
+
+    item = relationship('Item', backref=backref('stock', uselist=False))
+
+    __mapper_args__ = {'version_id_col': version}
+
+
 class ItemJournal(Base):
     __tablename__ = 'titemjournal'
     id = Column(Integer, primary_key=True)
@@ -123,3 +196,63 @@ class ItemJournal(Base):
     purchased = relationship('PurchaseD', backref='itemjournal')
 
     Index('Idx_itemId_date', itemId, date)
+
+    # ids are never reused (SQLite reuses the largest rowid after a delete), rows
+    # moved to titemjournalarchive keep theirs and snapshots page by id
+    __table_args__ = {'sqlite_autoincrement': True}
+
+
+class ItemMapping(Base):
+    __tablename__ = 'mitemmapping'
+    id = Column(Integer, primary_key=True)
+    marketPlaceId = Column(Integer, ForeignKey(MarketPlace.id, ondelete='CASCADE', onupdate='CASCADE'), nullable=False)
+    # normalized 'sku:<sku>' or 'name:<product name>' from the marketplace export
+    externalKey = Column(String(255), nullable=False)
+    itemId = Column(Integer, ForeignKey(Item.id, ondelete='CASCADE', onupdate='CASCADE'), nullable=False)
+
+    marketPlace = relationship('MarketPlace')
+    item = relationship('Item')
+
+    UniqueConstraint(marketPlaceId, externalKey)
+
+
+class ItemJournalArchive(Base):
+    __tablename__ = 'titemjournalarchive'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    itemId = Column(Integer, nullable=False)
+    date = Column(Date, nullable=False)
+    quantity = Column(Numeric(20, 2), nullable=False)
+    value = Column(Numeric(20, 2))
+    journalType = Column(Enum('Initial Stock', 'Buy', 'Sell', 'Correction', 'Ending Balance'), nullable=False)
+    refCode = Column(String(100))
+    salesDId = Column(Integer)
+    purchaseDId = Column(Integer)
+
+    Index('Idx_titemjournalarchive_itemId_date', itemId, date)
+
+
+class PeriodClose(Base):
+    __tablename__ = 'tperiodclose'
+    id = Column(Integer, primary_key=True)
+    date = Column(Date, nullable=False)
+    closedAt = Column(DateTime, nullable=False)
+
+    UniqueConstraint(date)
+
+
+class DeletedRow(Base):
+    __tablename__ = 'tdeletedrow'
+    id = Column(Integer, primary_key=True)
+    tableName = Column(String(50), nullable=False)
+    rowId = Column(Integer, nullable=False)
+    changeSeq = Column(BigInteger, nullable=False, default=next_change_seq, index=True)
+
+
+class MigrationCheckpoint(Base):
+    __tablename__ = 'smigration'
+    name = Column(String(100), primary_key=True)
+    # primary key of the last processed row
+    lastId = Column(BigInteger, nullable=False, default=0, server_default='0')
+    rows = Column(BigInteger, nullable=False, default=0, server_default='0')
+    startedAt = Column(DateTime)
+    finishedAt = Column(DateTime)
@@ -0,0 +1,22 @@
+from typing import Iterator, List, Sequence, TypeVar
+
+
+T = TypeVar('T')
+
+# stays below the SQLite default of 999 bound parameters per statement
+IN_CHUNK_SIZE = 500
+
+
+def chunked(values: Sequence[T], size: int = IN_CHUNK_SIZE) -> Iterator[List[T]]:
+    for start in range(0, len(values), size):
+        yield list(values[start:start + size])
+
+
+def begin_explicitly(connection) -> None:
+    """Open the database transaction now, call before the first ``SAVEPOINT``.
+
+    pysqlite only begins a transaction before DML, a ``SAVEPOINT`` sent first
+    opens a transaction of its own that its ``RELEASE`` commits.
+    """
+    if connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN')
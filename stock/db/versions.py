@@ -0,0 +1,58 @@
+"""Per table write versions of this process.
+
+Every commit that wrote to a table bumps the table's version, whether it went
+through the ORM unit of work or a Core insert/update/delete on the session.
+Caches and in-flight reads keyed by these versions never hand out a result
+that was read before a commit of this process.
+"""
+from typing import Dict, Iterable, Tuple
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+WRITTEN_TABLES = 'written_tables'
+
+
+class TableVersions:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.versions: Dict[str, int] = {}
+
+    def get(self, tables: Iterable[str]) -> Tuple[int, ...]:
+        with self.lock:
+            return tuple(self.versions.get(table, 0) for table in tables)
+
+    def bump(self, tables: Iterable[str]) -> None:
+        with self.lock:
+            for table in tables:
+                self.versions[table] = self.versions.get(table, 0) + 1
+
+
+table_versions = TableVersions()
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _record_statement(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None:
+            orm_execute_state.session.info.setdefault(WRITTEN_TABLES, set()).add(table.name)
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_flush(session: Session, flush_context) -> None:
+    written = session.info.setdefault(WRITTEN_TABLES, set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(instance, '__table__', None)
+        if table is not None:
+            written.add(table.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_versions(session: Session) -> None:
+    # tables written in a rolled back transaction stay recorded, the next commit
+    # bumps them needlessly, which is harmless
+    written = session.info.pop(WRITTEN_TABLES, None)
+    if written:
+        table_versions.bump(written)
@@ -0,0 +1,129 @@
+"""Change events for ``GET /events`` (server-sent events).
+
+Save paths and imports publish compact events after commit, the broker of the
+worker process fans them out to one bounded queue per connected client. A
+client that does not keep up is not waited for: its queue is dropped and
+replaced by a single ``resync`` event, after which it should reload what it
+shows. With several worker processes a client receives the changes saved
+through its own worker.
+"""
+from typing import Dict, Iterable, List, Optional, Set
+import asyncio
+import collections
+import itertools
+import threading
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .db.schema import ItemStock
+from .db.utils import chunked
+
+
+QUEUE_SIZE = 256
+HISTORY_SIZE = 1024
+
+RESYNC = {'event': 'resync'}
+
+
+class Subscriber:
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # id of the last change event pushed, an event replayed from the
+        # history on subscribe is not pushed again when it is dispatched
+        self.last_id = 0
+
+    def push(self, event: dict) -> None:
+        if 'id' in event:
+            if event['id'] <= self.last_id:
+                return
+            self.last_id = event['id']
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # too slow, whatever is queued is stale anyway
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class EventBroker:
+    def __init__(self, queue_size: int = QUEUE_SIZE, history_size: int = HISTORY_SIZE):
+        self.queue_size = queue_size
+        self.subscribers: Set[Subscriber] = set()
+        # recent events for clients reconnecting with Last-Event-ID
+        self.history = collections.deque(maxlen=history_size)
+        self.ids = itertools.count(1)
+        # ids and history are written by the publishing threads
+        self.lock = threading.Lock()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.dropped = 0
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscriber:
+        self.loop = asyncio.get_running_loop()
+        subscriber = Subscriber(self.queue_size)
+        if last_event_id is not None:
+            with self.lock:
+                history = list(self.history)
+            missed = [event for event in history if event['id'] > last_event_id]
+            if history and history[0]['id'] > last_event_id + 1:
+                # older than the history, the gap cannot be replayed
+                subscriber.push(RESYNC)
+            else:
+                for event in missed:
+                    subscriber.push(event)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    def _dispatch(self, events: List[dict]) -> None:
+        for event in events:
+            for subscriber in self.subscribers:
+                subscriber.push(event)
+
+    def publish_many(self, events: List[dict]) -> None:
+        """Queue events for all subscribers, safe to call from any thread.
+
+        Events get their id and go to the history even while no client is
+        connected, so a client reconnecting with Last-Event-ID gets them.
+        """
+        if not events:
+            return
+        with self.lock:
+            for event in events:
+                event['id'] = next(self.ids)
+                self.history.append(event)
+        if not self.subscribers or self.loop is None or self.loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._dispatch(events)
+        else:
+            self.loop.call_soon_threadsafe(self._dispatch, events)
+
+    def publish(self, entity: str, id: int, **data) -> None:
+        self.publish_many([dict(data, entity=entity, rowId=id)])
+
+    def publish_stock(self, session: Session, item_ids: Iterable[int]) -> None:
+        """Publish the current stock balance of items, call after commit."""
+        item_ids = list(item_ids)
+        if not item_ids:
+            return
+        balances: Dict[int, float] = {}
+        for chunk in chunked(item_ids):
+            balances.update(
+                session.execute(
+                    select(ItemStock.itemId, ItemStock.quantity).where(ItemStock.itemId.in_(chunk))
+                ).all()
+            )
+        self.publish_many([
+            {'entity': 'stock', 'rowId': item_id, 'stock': str(balances.get(item_id, 0))}
+            for item_id in item_ids
+        ])
+
+
+broker = EventBroker()
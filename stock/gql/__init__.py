@@ -0,0 +1,110 @@
+"""Read only GraphQL API, mounted at ``/graphql``."""
+from typing import List, Optional
+import strawberry
+from fastapi import Depends
+from sqlalchemy import select, and_, or_
+from sqlalchemy.orm import Session
+from strawberry.extensions import MaxAliasesLimiter, MaxTokensLimiter, QueryDepthLimiter
+from strawberry.fastapi import BaseContext, GraphQLRouter
+from strawberry.types import Info
+
+from ..db import schema
+from ..db.connection import get_session
+from ..settings import get_settings
+from .loaders import Loaders
+from .types import Item, ItemCategory, MarketPlace, Purchase, Sales
+
+
+MAX_LIMIT = 100
+
+
+class Context(BaseContext):
+    def __init__(self, session: Session):
+        super().__init__()
+        self.session = session
+        self.loaders = Loaders(session)
+
+
+def get_context(session: Session = Depends(get_session)) -> Context:
+    return Context(session)
+
+
+def page(limit: int, offset: int):
+    # list sizes are capped so a query cannot ask for unbounded fan out
+    return min(max(limit, 0), MAX_LIMIT), max(offset, 0)
+
+
+@strawberry.type
+class Query:
+    @strawberry.field
+    async def item(self, info: Info, id: int) -> Optional[Item]:
+        return await info.context.loaders.item.load(id)
+
+    @strawberry.field
+    def items(self, info: Info, q: str = '', limit: int = 20, offset: int = 0) -> List[Item]:
+        limit, offset = page(limit, offset)
+        conditions = [
+            or_(
+                schema.Item.code.contains(keyword),
+                schema.Item.name.contains(keyword),
+            )
+            for keyword in q.split(' ') if len(keyword) > 0
+        ]
+        return info.context.session.execute(
+            select(
+                schema.Item
+            ).where(
+                and_(*conditions)
+            ).order_by(
+                schema.Item.id
+            ).limit(limit).offset(offset)
+        ).scalars().all()
+
+    @strawberry.field
+    def itemCategories(self, info: Info, limit: int = 100, offset: int = 0) -> List[ItemCategory]:
+        limit, offset = page(limit, offset)
+        return info.context.session.execute(
+            select(schema.ItemCategory).order_by(schema.ItemCategory.id).limit(limit).offset(offset)
+        ).scalars().all()
+
+    @strawberry.field
+    def marketPlaces(self, info: Info, limit: int = 100, offset: int = 0) -> List[MarketPlace]:
+        limit, offset = page(limit, offset)
+        return info.context.session.execute(
+            select(schema.MarketPlace).order_by(schema.MarketPlace.id).limit(limit).offset(offset)
+        ).scalars().all()
+
+    @strawberry.field
+    async def purchase(self, info: Info, id: int) -> Optional[Purchase]:
+        return await info.context.loaders.purchase.load(id)
+
+    @strawberry.field
+    def purchases(self, info: Info, limit: int = 20, offset: int = 0) -> List[Purchase]:
+        limit, offset = page(limit, offset)
+        return info.context.session.execute(
+            select(schema.Purchase).order_by(schema.Purchase.date.desc(), schema.Purchase.id).limit(limit).offset(offset)
+        ).scalars().all()
+
+    @strawberry.field
+    async def sales(self, info: Info, id: int) -> Optional[Sales]:
+        return await info.context.loaders.sales.load(id)
+
+    @strawberry.field
+    def salesList(self, info: Info, limit: int = 20, offset: int = 0) -> List[Sales]:
+        limit, offset = page(limit, offset)
+        return info.context.session.execute(
+            select(schema.Sales).order_by(schema.Sales.date.desc(), schema.Sales.id).limit(limit).offset(offset)
+        ).scalars().all()
+
+
+graphql_schema = strawberry.Schema(
+    query=Query,
+    # factories, each request gets its own extension instances
+    extensions=[
+        lambda: QueryDepthLimiter(max_depth=get_settings().graphql_max_depth),
+        lambda: MaxTokensLimiter(max_token_count=get_settings().graphql_max_tokens),
+        lambda: MaxAliasesLimiter(max_alias_count=get_settings().graphql_max_aliases),
+    ],
+)
+
+router = GraphQLRouter(graphql_schema, context_getter=get_context, path='/graphql')
@@ -0,0 +1,52 @@
+"""Per request DataLoaders, every relationship of a GraphQL query resolves through one.
+
+A loader collects the keys requested by all resolvers of one query level and
+loads them with a single ``IN`` query (split in ``IN_CHUNK_SIZE`` chunks), so a
+query costs one statement per relationship level instead of one per row.
+"""
+from typing import Dict, List, Optional
+from collections import defaultdict
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from strawberry.dataloader import DataLoader
+
+from ..db.schema import Item, ItemCategory, ItemStock, MarketPlace, Purchase, PurchaseD, Sales, SalesD
+from ..db.utils import chunked
+
+
+def by_id(session: Session, model, key=None) -> DataLoader:
+    key = key if key is not None else model.id
+
+    async def load(ids: List[int]) -> List[Optional[object]]:
+        rows = {}
+        for chunk in chunked(list(ids)):
+            for row in session.execute(select(model).where(key.in_(chunk))).scalars():
+                rows[getattr(row, key.key)] = row
+        return [rows.get(id) for id in ids]
+
+    return DataLoader(load_fn=load)
+
+
+def by_parent(session: Session, model, parent_key) -> DataLoader:
+    async def load(ids: List[int]) -> List[List[object]]:
+        rows: Dict[int, List[object]] = defaultdict(list)
+        for chunk in chunked(list(ids)):
+            for row in session.execute(
+                select(model).where(parent_key.in_(chunk)).order_by(model.id)
+            ).scalars():
+                rows[getattr(row, parent_key.key)].append(row)
+        return [rows.get(id, []) for id in ids]
+
+    return DataLoader(load_fn=load)
+
+
+class Loaders:
+    def __init__(self, session: Session):
+        self.item = by_id(session, Item)
+        self.item_category = by_id(session, ItemCategory)
+        self.item_stock = by_id(session, ItemStock, ItemStock.itemId)
+        self.market_place = by_id(session, MarketPlace)
+        self.purchase = by_id(session, Purchase)
+        self.purchase_details = by_parent(session, PurchaseD, PurchaseD.purchaseId)
+        self.sales = by_id(session, Sales)
+        self.sales_details = by_parent(session, SalesD, SalesD.salesId)
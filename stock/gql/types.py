@@ -0,0 +1,117 @@
+"""GraphQL types over the ORM entities, resolvers receive the ORM row as ``self``."""
+from typing import List, Optional
+import datetime
+from decimal import Decimal
+import strawberry
+from strawberry.types import Info
+
+
+@strawberry.type
+class ItemCategory:
+    id: int
+    name: str
+    description: Optional[str]
+    isActive: bool
+
+
+@strawberry.type
+class Item:
+    id: int
+    code: str
+    categoryId: Optional[int]
+    name: Optional[str]
+    description: Optional[str]
+    sellingPrice: Optional[Decimal]
+    isActive: bool
+    version: int
+
+    @strawberry.field
+    async def category(self, info: Info) -> Optional[ItemCategory]:
+        if self.categoryId is None:
+            return None
+        return await info.context.loaders.item_category.load(self.categoryId)
+
+    @strawberry.field
+    async def stock(self, info: Info) -> Decimal:
+        item_stock = await info.context.loaders.item_stock.load(self.id)
+        return item_stock.quantity if item_stock is not None else Decimal(0)
+
+
+@strawberry.type
+class MarketPlace:
+    id: int
+    name: str
+    description: Optional[str]
+    isActive: bool
+
+
+@strawberry.type
+class PurchaseD:
+    id: int
+    purchaseId: int
+    itemId: int
+    quantity: Decimal
+    unitPrice: Optional[Decimal]
+
+    @strawberry.field
+    async def item(self, info: Info) -> Item:
+        return await info.context.loaders.item.load(self.itemId)
+
+    @strawberry.field
+    async def purchase(self, info: Info) -> 'Purchase':
+        return await info.context.loaders.purchase.load(self.purchaseId)
+
+
+@strawberry.type
+class Purchase:
+    id: int
+    code: str
+    date: Optional[datetime.date]
+    marketPlaceId: Optional[int]
+    version: int
+
+    @strawberry.field
+    async def marketPlace(self, info: Info) -> Optional[MarketPlace]:
+        if self.marketPlaceId is None:
+            return None
+        return await info.context.loaders.market_place.load(self.marketPlaceId)
+
+    @strawberry.field
+    async def details(self, info: Info) -> List[PurchaseD]:
+        return await info.context.loaders.purchase_details.load(self.id)
+
+
+@strawberry.type
+class SalesD:
+    id: int
+    salesId: int
+    itemId: int
+    quantity: Decimal
+    unitPrice: Optional[Decimal]
+
+    @strawberry.field
+    async def item(self, info: Info) -> Item:
+        return await info.context.loaders.item.load(self.itemId)
+
+    @strawberry.field
+    async def sales(self, info: Info) -> 'Sales':
+        return await info.context.loaders.sales.load(self.salesId)
+
+
+@strawberry.type
+class Sales:
+    id: int
+    code: str
+    date: Optional[datetime.date]
+    marketPlaceId: Optional[int]
+    version: int
+
+    @strawberry.field
+    async def marketPlace(self, info: Info) -> Optional[MarketPlace]:
+        if self.marketPlaceId is None:
+            return None
+        return await info.context.loaders.market_place.load(self.marketPlaceId)
+
+    @strawberry.field
+    async def details(self, info: Info) -> List[SalesD]:
+        return await info.context.loaders.sales_details.load(self.id)
@@ -0,0 +1,156 @@
+"""Bulk item image import from a ZIP archive whose entries are named by item code."""
+from typing import Dict, List, Optional, Tuple
+import os
+import time
+import uuid
+import zipfile
+from pathlib import PurePosixPath
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .db.connection import engine
+from .db.schema import Item, ItemImg
+from .db.utils import chunked
+from .model.item import ImageImportJobModel
+from . import images
+
+
+BATCH_SIZE = 100
+# seconds a finished job can still be polled
+JOB_TTL = 3600
+
+# job id -> progress, kept per worker process
+jobs: Dict[str, ImageImportJobModel] = {}
+# job id -> time.monotonic() when it finished
+finished: Dict[str, float] = {}
+
+
+def evict_finished_jobs(now: Optional[float] = None) -> None:
+    expired = (now or time.monotonic()) - JOB_TTL
+    for job_id, finished_at in list(finished.items()):
+        if finished_at < expired:
+            del finished[job_id]
+            jobs.pop(job_id, None)
+
+
+def create_job() -> ImageImportJobModel:
+    evict_finished_jobs()
+    job = ImageImportJobModel(id=uuid.uuid4().hex)
+    jobs[job.id] = job
+    return job
+
+
+def list_entries(zip_path: str) -> Dict[str, str]:
+    """Item code -> entry name, directories and hidden files are skipped."""
+    entries = {}
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            path = PurePosixPath(info.filename)
+            if info.is_dir() or path.name.startswith('.') or '__MACOSX' in path.parts:
+                continue
+            entries[path.stem] = info.filename
+    return entries
+
+
+def _store_entry(zip_path: str, entry_name: str) -> Tuple[Optional[images.StoredImage], Optional[str]]:
+    # runs in a pool process, the entry is streamed from the archive into storage
+    try:
+        with zipfile.ZipFile(zip_path) as archive, archive.open(entry_name) as source:
+            stored = images.store_image(source)
+        images.make_thumbnail(stored.contentHash)
+        return stored, None
+    except Exception as ex:
+        return None, '{}: {}'.format(entry_name, ex)
+
+
+def _update_images(session: Session, batch: List[Tuple[int, str, images.StoredImage]]) -> List[str]:
+    """Point the item images of a batch at the stored files, returns the replaced hashes."""
+    item_ids = [item_id for item_id, _, _ in batch]
+    existing = {
+        row.itemId: row
+        for row in session.execute(
+            select(ItemImg).where(ItemImg.itemId.in_(item_ids))
+        ).scalars()
+    }
+
+    released = []
+    for item_id, entry_name, stored in batch:
+        item_image = existing.get(item_id)
+        if item_image is None:
+            item_image = ItemImg(itemId=item_id)
+            session.add(item_image)
+            existing[item_id] = item_image
+        elif item_image.contentHash != stored.contentHash:
+            released.append(item_image.contentHash)
+            item_image.content = None
+        item_image.contentHash = stored.contentHash
+        item_image.contentType = stored.contentType
+        item_image.fileSize = stored.fileSize
+        item_image.originalFileName = PurePosixPath(entry_name).name
+    return released
+
+
+def _write_batch(session: Session, batch: List[Tuple[int, str, images.StoredImage]]) -> None:
+    # the stored files are pinned until the batch is committed
+    try:
+        released = _update_images(session, batch)
+        session.commit()
+    finally:
+        for _, _, stored in batch:
+            images.unpin_image(stored.contentHash)
+    for content_hash in released:
+        images.release_image(session, content_hash)
+
+
+def run_import(job: ImageImportJobModel, zip_path: str, workers: Optional[int] = None, bind=None) -> None:
+    """Import the images of a spooled ZIP file, updating ``job`` as entries are done."""
+    try:
+        job.status = 'running'
+        entries = list_entries(zip_path)
+        job.total = len(entries)
+
+        item_ids: Dict[str, int] = {}
+        with Session(bind or engine) as session:
+            for codes in chunked(sorted(entries)):
+                item_ids.update(
+                    session.execute(
+                        select(Item.code, Item.id).where(Item.code.in_(codes))
+                    ).all()
+                )
+
+            job.unmatched = sorted(code for code in entries if code not in item_ids)
+            job.processed = len(job.unmatched)
+
+            batch = []
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(_store_entry, zip_path, entries[code]): code
+                    for code in entries if code in item_ids
+                }
+                for future in as_completed(futures):
+                    code = futures[future]
+                    stored, error = future.result()
+                    job.processed += 1
+                    if error is None and not images.pin_image(stored.contentHash):
+                        error = '{}: released by another upload, import it again'.format(entries[code])
+                    if error is not None:
+                        job.errors.append(error)
+                        continue
+                    batch.append((item_ids[code], entries[code], stored))
+                    if len(batch) >= BATCH_SIZE:
+                        _write_batch(session, batch)
+                        job.imported += len(batch)
+                        batch = []
+
+            if batch:
+                _write_batch(session, batch)
+                job.imported += len(batch)
+
+        job.status = 'done'
+    except Exception as ex:
+        job.status = 'failed'
+        job.errors.append(str(ex))
+    finally:
+        finished[job.id] = time.monotonic()
+        os.unlink(zip_path)
@@ -0,0 +1,206 @@
+"""Item image file storage.
+
+Images are stored once per content under ``Settings.get_image_dir()``, named by
+their sha256, and referenced from ``ItemImg.contentHash``. Uploads are copied in
+fixed size chunks so memory use does not grow with the file size.
+
+A stored file is deleted when its last reference is released. An upload of the
+same content that is not committed yet pins the file, so the release does not
+delete it from under the upload. Pins are kept per process.
+"""
+from typing import BinaryIO, Counter, NamedTuple, Optional
+import collections
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from .db.schema import ItemImg
+from .settings import get_settings
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+CHUNK_SIZE = 64 * 1024
+THUMBNAIL_SIZE = (256, 256)
+
+# magic number -> content type
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+
+# content hash -> stored uploads not committed yet
+pins: Counter[str] = collections.Counter()
+pin_lock = threading.Lock()
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+class UnsupportedImage(Exception):
+    pass
+
+
+class StoredImage(NamedTuple):
+    contentHash: str
+    contentType: str
+    fileSize: int
+
+
+def detect_content_type(head: bytes) -> Optional[str]:
+    for signature, content_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def image_path(content_hash: str) -> Path:
+    return get_settings().get_image_dir() / content_hash[:2] / content_hash
+
+
+def thumbnail_path(content_hash: str) -> Path:
+    return image_path(content_hash).with_name(content_hash + '.thumb.jpg')
+
+
+def make_thumbnail(content_hash: str) -> bool:
+    """Write the jpeg thumbnail of a stored image, False when Pillow is not installed
+    or cannot decode the image (the original is still served).
+    """
+    if Image is None:
+        return False
+    target = thumbnail_path(content_hash)
+    if target.exists():
+        return True
+    temp_name = str(target) + '.tmp'
+    try:
+        with Image.open(image_path(content_hash)) as image:
+            image.thumbnail(THUMBNAIL_SIZE)
+            image.convert('RGB').save(temp_name, 'JPEG', quality=85)
+    except OSError:
+        if os.path.exists(temp_name):
+            os.unlink(temp_name)
+        return False
+    os.replace(temp_name, target)
+    return True
+
+
+def spool_upload(source: BinaryIO, max_size: int, suffix: str = '.upload') -> str:
+    """Copy an upload to a temp file in chunks, blocking, returns the temp file name."""
+    size = 0
+    fd, temp_name = tempfile.mkstemp(dir=get_settings().get_image_dir(), suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise ImageTooLarge('Upload is larger than {} bytes'.format(max_size))
+                out.write(chunk)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+    return temp_name
+
+
+def store_image(source: BinaryIO, max_size: Optional[int] = None, pin: bool = False) -> StoredImage:
+    """Copy an image stream into storage, blocking, run it in a thread pool.
+
+    The size limit is checked while copying, so an oversized upload is rejected
+    after reading at most ``max_size`` + one chunk. With ``pin`` the file is
+    pinned, call ``unpin_image`` once the reference is committed.
+    """
+    max_size = max_size or get_settings().image_max_size
+    image_dir = get_settings().get_image_dir()
+    digest = hashlib.sha256()
+    size = 0
+    content_type = None
+
+    # temp file in the storage dir so the final rename stays on one filesystem
+    fd, temp_name = tempfile.mkstemp(dir=image_dir, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if content_type is None:
+                    content_type = detect_content_type(chunk)
+                    if content_type is None:
+                        raise UnsupportedImage('Unsupported image type, use jpeg, png, gif or webp')
+                size += len(chunk)
+                if size > max_size:
+                    raise ImageTooLarge('Image is larger than {} bytes'.format(max_size))
+                digest.update(chunk)
+                out.write(chunk)
+
+        if size == 0:
+            raise UnsupportedImage('Image is empty')
+
+        content_hash = digest.hexdigest()
+        target = image_path(content_hash)
+        with pin_lock:
+            if target.exists():
+                # same content already stored
+                os.unlink(temp_name)
+            else:
+                target.parent.mkdir(exist_ok=True)
+                os.replace(temp_name, target)
+            if pin:
+                pins[content_hash] += 1
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.unlink(temp_name)
+        raise
+
+    return StoredImage(content_hash, content_type, size)
+
+
+def pin_image(content_hash: str) -> bool:
+    """Pin a file stored by another process, False when it was released meanwhile."""
+    with pin_lock:
+        if not image_path(content_hash).exists():
+            return False
+        pins[content_hash] += 1
+        return True
+
+
+def unpin_image(content_hash: str) -> None:
+    with pin_lock:
+        pins[content_hash] -= 1
+        if pins[content_hash] <= 0:
+            del pins[content_hash]
+
+
+def release_image(session: Session, content_hash: Optional[str]) -> None:
+    """Delete a stored file once no item image references it anymore, call after commit."""
+    if not content_hash:
+        return
+    # the references are counted under the lock, a pinning upload either
+    # committed before or stores the file again after the delete
+    with pin_lock:
+        if pins[content_hash]:
+            return
+        references = session.execute(
+            select(func.count(ItemImg.id)).where(ItemImg.contentHash == content_hash)
+        ).scalar_one()
+        if references == 0:
+            for path in (image_path(content_hash), thumbnail_path(content_hash)):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,141 @@
+"""Posting of purchase and sales documents to the item journal and stock balances.
+
+Documents are reposted as a whole: ``unpost_document`` removes the journal rows
+of a document before its details change, ``post_document`` writes them back and
+applies the net quantity change to ``mitemstock`` with atomic increments.
+"""
+from typing import Dict, List, Tuple
+import datetime
+from decimal import Decimal
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .db.schema import ItemJournal, ItemStock, Purchase, PurchaseD, Sales, SalesD
+from .db.utils import chunked
+from .period_close import check_period_open
+from . import valuation
+
+
+# header -> (detail, detail header fk, journal detail fk, journal type, quantity sign)
+DOCUMENTS = {
+    Purchase: (PurchaseD, PurchaseD.purchaseId, ItemJournal.purchaseDId, 'Buy', 1),
+    Sales: (SalesD, SalesD.salesId, ItemJournal.salesDId, 'Sell', -1),
+}
+
+Posted = Dict[int, Tuple[Decimal, datetime.date]]
+
+
+def adjust_stock(session: Session, deltas: Dict[int, Decimal]) -> None:
+    """Add ``deltas`` ({item id: quantity}) to the stock balances.
+
+    Balances are only changed with ``quantity = quantity + :delta`` so concurrent
+    writers never lose each other's updates and a retried transaction stays correct.
+    """
+    table = ItemStock.__table__
+    # a fixed lock order keeps concurrent writers from deadlocking each other
+    for item_id in sorted(deltas):
+        delta = deltas[item_id]
+        if not delta:
+            continue
+        increment = update(table).where(
+            table.c.itemId == item_id
+        ).values(
+            quantity=table.c.quantity + delta,
+            version=table.c.version + 1,
+        )
+        if session.execute(increment).rowcount == 1:
+            continue
+        try:
+            with session.begin_nested():
+                session.execute(
+                    insert(table).values(itemId=item_id, quantity=delta)
+                )
+        except IntegrityError:
+            # created by another writer in the meantime
+            session.execute(increment)
+
+
+def unpost_document(session: Session, header, header_id: int) -> Posted:
+    """Delete the journal rows of a document, returns {item id: (quantity, earliest date)} removed."""
+    detail, detail_fk, journal_fk, _, _ = DOCUMENTS[header]
+    detail_ids = select(detail.id).where(detail_fk == header_id)
+
+    rows = session.execute(
+        select(
+            ItemJournal.itemId, ItemJournal.quantity, ItemJournal.date,
+        ).where(
+            journal_fk.in_(detail_ids)
+        )
+    ).all()
+
+    if rows:
+        check_period_open(session, min(date for _, _, date in rows))
+
+    posted: Posted = {}
+    for item_id, quantity, date in rows:
+        previous_quantity, previous_date = posted.get(item_id, (Decimal(0), date))
+        posted[item_id] = (previous_quantity + Decimal(quantity), min(previous_date, date))
+
+    if rows:
+        session.execute(
+            delete(ItemJournal).where(
+                journal_fk.in_(detail_ids)
+            ).execution_options(synchronize_session=False)
+        )
+    return posted
+
+
+def post_document(session: Session, header, header_id: int, unposted: Posted = None) -> Dict[int, Decimal]:
+    """Write the journal rows of a document and update stock balances and valuation.
+
+    ``unposted`` is the result of ``unpost_document`` when reposting, returns the
+    stock change per item.
+    """
+    return post_documents(session, header, [header_id], unposted)
+
+
+def post_documents(session: Session, header, header_ids: List[int], unposted: Posted = None) -> Dict[int, Decimal]:
+    """Bulk version of ``post_document`` for imports, one statement per step for all documents."""
+    detail, detail_fk, journal_fk, journal_type, sign = DOCUMENTS[header]
+    unposted = unposted or {}
+
+    rows = []
+    for chunk in chunked(header_ids):
+        rows.extend(
+            session.execute(
+                select(
+                    detail.id, detail.itemId, detail.quantity, detail.unitPrice, header.date, header.code,
+                ).join(
+                    header, detail_fk == header.id
+                ).where(
+                    header.id.in_(chunk)
+                )
+            ).all()
+        )
+
+    if rows:
+        check_period_open(session, min(row.date for row in rows))
+
+    deltas = {item_id: -quantity for item_id, (quantity, _) in unposted.items()}
+    since = {item_id: date for item_id, (_, date) in unposted.items()}
+    journal = []
+    for detail_id, item_id, quantity, unit_price, date, code in rows:
+        quantity = sign * Decimal(quantity)
+        journal.append({
+            'itemId': item_id,
+            'date': date,
+            'quantity': quantity,
+            'value': quantity * Decimal(unit_price or 0) if sign > 0 else None,
+            'journalType': journal_type,
+            'refCode': code,
+            journal_fk.key: detail_id,
+        })
+        deltas[item_id] = deltas.get(item_id, Decimal(0)) + quantity
+        since[item_id] = min(since.get(item_id, date), date)
+
+    if journal:
+        session.execute(insert(ItemJournal), journal)
+    adjust_stock(session, deltas)
+    valuation.revalue(session, since)
+    return {item_id: delta for item_id, delta in deltas.items() if delta}
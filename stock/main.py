@@ -1,30 +1,122 @@
+import asyncio
+import logging
+import os
 from pathlib import Path
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
-from .routers import item, market_place, purchase
-# from .settings import get_settings
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm.exc import StaleDataError
+from starlette.concurrency import run_in_threadpool
+from .db.concurrency import ConflictError
+from .middleware.admission import AdmissionMiddleware
+from .middleware.body_size import BodySizeLimitMiddleware
+from .middleware.compression import JSONGZipMiddleware
+from .middleware.profiling import ProfilingMiddleware
+from .middleware.single_flight import SingleFlightMiddleware
+from .period_close import PeriodClosedError
+from .routers import admin, batch, events, item, market_place, profiling, purchase, report, sales, snapshot, sync
+from .settings import get_settings
+from .static import PrecompressedStaticFiles
+from . import gql, search
+
+
+logger = logging.getLogger(__name__)
 
 
 app = FastAPI()
 
+if get_settings().single_flight:
+    # innermost, coalesced requests still pass admission and get their own compression
+    app.add_middleware(SingleFlightMiddleware)
+app.add_middleware(JSONGZipMiddleware, minimum_size=get_settings().gzip_minimum_size)
+app.add_middleware(
+    ProfilingMiddleware,
+    allowed_clients=get_settings().get_profile_allowed_clients(),
+    sample_rate=get_settings().profile_sample_rate,
+    interval=get_settings().profile_interval,
+)
+# rejected requests cost no other work
+app.add_middleware(
+    AdmissionMiddleware,
+    limits={
+        'default': (get_settings().admission_limit, get_settings().admission_queue),
+        'heavy': (get_settings().admission_heavy_limit, get_settings().admission_heavy_queue),
+    },
+    queue_timeout=get_settings().admission_queue_timeout,
+    retry_after=get_settings().admission_retry_after,
+)
+# added last so it runs first, an oversized upload does not wait for admission
+app.add_middleware(BodySizeLimitMiddleware)
+
+app.include_router(admin.router)
+app.include_router(batch.router)
+app.include_router(events.router)
 app.include_router(item.router)
 app.include_router(market_place.router)
+app.include_router(profiling.router)
 app.include_router(purchase.router)
+app.include_router(report.router)
+app.include_router(sales.router)
+app.include_router(snapshot.router)
+app.include_router(sync.router)
+app.include_router(gql.router)
+
+
+@app.exception_handler(ConflictError)
+@app.exception_handler(StaleDataError)
+async def conflict_exception_handler(request: Request, ex: Exception):
+    return JSONResponse(status_code=409, content={'detail': str(ex)})
+
+
+@app.exception_handler(PeriodClosedError)
+async def period_closed_exception_handler(request: Request, ex: PeriodClosedError):
+    return JSONResponse(status_code=422, content={'detail': str(ex)})
+
+
+async def refresh_search_index():
+    while True:
+        await asyncio.sleep(get_settings().search_refresh_interval)
+        try:
+            await run_in_threadpool(search.refresh_item_index)
+        except Exception:
+            logger.exception('Item search index refresh failed')
+
+
+@app.on_event('startup')
+async def load_search_index():
+    try:
+        await run_in_threadpool(search.load_item_index)
+    except Exception:
+        logger.exception('Item search index load failed, suggestions start empty')
+    # kept on the app, the loop only holds a weak reference to a task
+    app.state.search_refresh = asyncio.create_task(refresh_search_index())
+
+
+@app.on_event('shutdown')
+async def stop_search_refresh():
+    task = getattr(app.state, 'search_refresh', None)
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
 
 static_files_dir = Path(__file__).parent / 'assets'
 if not static_files_dir.exists():
     static_files_dir = Path(__file__).parent.parent / 'public'
 
-app.mount('/assets', StaticFiles(directory=static_files_dir), name='assets')
+static_files = PrecompressedStaticFiles(directory=static_files_dir)
+app.mount('/assets', static_files, name='assets')
 
 
 @app.get('/')
-def get_index():
+def get_index(request: Request):
     index_html = static_files_dir / 'index.html'
     if not index_html.exists():
         return "Welcome to Stock"
-    return FileResponse(index_html)
+    return static_files.file_response(index_html, os.stat(index_html), request.scope)
 
 
 @app.get("/hello")
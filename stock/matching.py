@@ -0,0 +1,102 @@
+"""Resolve marketplace export rows (SKU, product name) to items.
+
+An ``ItemMatcher`` is loaded once per import with three queries and then
+resolves every row in memory: saved manual mappings first, then the SKU against
+``Item.code``, then the product name by token overlap with item names.
+"""
+from typing import Dict, List, Optional, Set, Tuple
+from collections import Counter, defaultdict
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .db.schema import Item, ItemMapping
+from .search import tokenize
+
+
+# share of the product name tokens an item name must contain to match
+MIN_NAME_SCORE = 0.6
+
+
+def normalize_code(code: str) -> str:
+    return (code or '').strip().upper()
+
+
+def normalize_name(name: str) -> str:
+    return ' '.join(sorted(tokenize(name)))
+
+
+def sku_key(sku: str) -> str:
+    return 'sku:{}'.format(normalize_code(sku))
+
+
+def name_key(name: str) -> str:
+    return 'name:{}'.format(normalize_name(name))[:255]
+
+
+class ItemMatcher:
+    def __init__(
+        self,
+        codes: Dict[str, int],
+        names: Dict[int, str],
+        mappings: Dict[str, int],
+    ):
+        self.codes = codes
+        self.mappings = mappings
+        self.names = names
+        self.name_tokens: Dict[int, Set[str]] = {}
+        # token -> item ids having it in their name
+        self.tokens: Dict[str, List[int]] = defaultdict(list)
+        for item_id, name in names.items():
+            tokens = tokenize(name)
+            self.name_tokens[item_id] = tokens
+            for token in tokens:
+                self.tokens[token].append(item_id)
+
+    @classmethod
+    def load(cls, session: Session, market_place_id: int) -> 'ItemMatcher':
+        items = session.execute(
+            select(Item.id, Item.code, Item.name).where(Item.isActive.is_(True))
+        ).all()
+        mappings = session.execute(
+            select(
+                ItemMapping.externalKey, ItemMapping.itemId,
+            ).where(
+                ItemMapping.marketPlaceId == market_place_id
+            )
+        ).all()
+        return cls(
+            codes={normalize_code(code): item_id for item_id, code, _ in items},
+            names={item_id: name for item_id, _, name in items if name},
+            mappings=dict(mappings),
+        )
+
+    def candidates(self, name: str, limit: int = 5) -> List[Tuple[int, float]]:
+        """Items sharing tokens with ``name``, as (item id, score) best first."""
+        tokens = tokenize(name)
+        if not tokens:
+            return []
+        overlap = Counter()
+        for token in tokens:
+            overlap.update(self.tokens.get(token, ()))
+        # dice coefficient of the two token sets
+        scored = [
+            (item_id, 2 * count / (len(tokens) + len(self.name_tokens[item_id])))
+            for item_id, count in overlap.items()
+        ]
+        scored.sort(key=lambda row: row[1], reverse=True)
+        return scored[:limit]
+
+    def match(self, sku: Optional[str], name: Optional[str]) -> Optional[int]:
+        if sku:
+            item_id = self.mappings.get(sku_key(sku)) or self.codes.get(normalize_code(sku))
+            if item_id is not None:
+                return item_id
+        if name:
+            item_id = self.mappings.get(name_key(name))
+            if item_id is not None:
+                return item_id
+            best = self.candidates(name, limit=2)
+            # a clear winner only, ties are left for a manual mapping
+            if best and best[0][1] >= MIN_NAME_SCORE and (len(best) == 1 or best[1][1] < best[0][1]):
+                return best[0][0]
+        return None
@@ -0,0 +1,127 @@
+import asyncio
+import json
+from typing import Dict, List, Optional, Tuple
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+# (method, path prefix, route class), first match wins, None class is not limited
+DEFAULT_RULES: List[Tuple[str, str, Optional[str]]] = [
+    ('GET', '/item/suggest', None),
+    ('GET', '/item/image/', None),
+    ('GET', '/item/images/import/', None),
+    ('GET', '/assets/', None),
+    # long lived streams, they wait without using the database
+    ('GET', '/events', None),
+    ('POST', '/sales/import-tokopedia', 'heavy'),
+    ('POST', '/item/images/import', 'heavy'),
+    ('GET', '/report/', 'heavy'),
+    ('POST', '/snapshot/export', 'heavy'),
+    ('GET', '/snapshot/', 'heavy'),
+]
+
+
+class Limiter:
+    """At most ``limit`` requests running, ``queue_size`` more waiting up to ``timeout`` seconds."""
+
+    def __init__(self, limit: int, queue_size: int, timeout: float) -> None:
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # created on first use so it belongs to the server's event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    async def acquire(self) -> bool:
+        if self.semaphore.locked():
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self.semaphore.acquire()
+        self.running += 1
+        return True
+
+    def release(self) -> None:
+        self.running -= 1
+        self.semaphore.release()
+
+
+class AdmissionMiddleware:
+    """Limit concurrent requests per route class and shed load beyond a bounded queue.
+
+    Requests over the limit of their class wait in a short queue, when the queue
+    is full or the wait times out they fail fast with 503 and ``Retry-After``
+    instead of piling up in front of the database pool. Cheap reads matched by a
+    rule with no class are never limited.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limits: Dict[str, Tuple[int, int]],
+        rules: List[Tuple[str, str, Optional[str]]] = None,
+        default_class: str = 'default',
+        queue_timeout: float = 10.0,
+        retry_after: int = 5,
+    ) -> None:
+        self.app = app
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.default_class = default_class
+        self.retry_after = retry_after
+        self.limiters = {
+            name: Limiter(limit, queue_size, queue_timeout)
+            for name, (limit, queue_size) in limits.items()
+        }
+
+    def route_class(self, method: str, path: str) -> Optional[str]:
+        for rule_method, prefix, name in self.rules:
+            if method == rule_method and path.startswith(prefix):
+                return name
+        return self.default_class
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiters.get(self.route_class(scope['method'], scope['path']))
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limiter.acquire():
+            await self.reject(send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+    async def reject(self, send: Send) -> None:
+        body = json.dumps({'detail': 'Server is busy, retry later'}).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': 503,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode('latin-1')),
+                (b'retry-after', str(self.retry_after).encode('latin-1')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,94 @@
+import json
+from typing import Callable, List, Optional, Tuple
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..settings import get_settings
+
+
+# room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+# (method, path prefix, max body size), first match wins, read per request
+DEFAULT_RULES: List[Tuple[str, str, Callable[[], int]]] = [
+    ('POST', '/item/save-image/', lambda: get_settings().image_max_size + MULTIPART_OVERHEAD),
+    ('POST', '/item/images/import', lambda: get_settings().image_import_max_size + MULTIPART_OVERHEAD),
+]
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class BodySizeLimitMiddleware:
+    """Reject upload requests whose body is larger than the limit of their route with 413.
+
+    A declared ``Content-Length`` over the limit is rejected before the app runs,
+    so the form parser never spools the body. A body without a length (chunked)
+    is counted while it is received and cut off at the limit.
+    """
+
+    def __init__(self, app: ASGIApp, rules: List[Tuple[str, str, Callable[[], int]]] = None) -> None:
+        self.app = app
+        self.rules = DEFAULT_RULES if rules is None else rules
+
+    def max_size(self, method: str, path: str) -> Optional[int]:
+        for rule_method, prefix, max_size in self.rules:
+            if method == rule_method and path.startswith(prefix):
+                return max_size()
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        max_size = self.max_size(scope['method'], scope['path']) if scope['type'] == 'http' else None
+        if max_size is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get('content-length')
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_size:
+            await self.reject(send, max_size)
+            return
+
+        received = 0
+        too_large = False
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, too_large
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > max_size:
+                    too_large = True
+                    raise BodyTooLarge()
+            return message
+
+        async def checked_send(message: Message) -> None:
+            nonlocal response_started
+            if too_large:
+                # the app answers the cut off body with a parse error, answer 413 instead
+                if not response_started:
+                    response_started = True
+                    await self.reject(send, max_size)
+                return
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, checked_send)
+        except BodyTooLarge:
+            if not response_started:
+                response_started = True
+                await self.reject(send, max_size)
+
+    async def reject(self, send: Send, max_size: int) -> None:
+        body = json.dumps({'detail': 'Request body is larger than {} bytes'.format(max_size)}).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': 413,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode('latin-1')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
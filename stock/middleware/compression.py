@@ -0,0 +1,49 @@
+import gzip
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class JSONGZipMiddleware:
+    """Gzip JSON responses larger than ``minimum_size``.
+
+    Only complete (non streaming) JSON bodies are compressed, static files come
+    precompressed from PrecompressedStaticFiles and images are already compressed.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, compresslevel: int = 6) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or 'gzip' not in Headers(scope=scope).get('accept-encoding', ''):
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Message = {}
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message
+            if message['type'] == 'http.response.start':
+                headers = Headers(raw=message['headers'])
+                if (
+                    headers.get('content-type', '').startswith('application/json')
+                    and 'content-encoding' not in headers
+                ):
+                    # hold back until the body size is known
+                    start_message = message
+                    return
+            elif message['type'] == 'http.response.body' and start_message:
+                body = message.get('body', b'')
+                if len(body) >= self.minimum_size and not message.get('more_body', False):
+                    body = gzip.compress(body, compresslevel=self.compresslevel)
+                    headers = MutableHeaders(raw=start_message['headers'])
+                    headers['content-encoding'] = 'gzip'
+                    headers['content-length'] = str(len(body))
+                    headers.add_vary_header('Accept-Encoding')
+                    message = dict(message, body=body)
+                await send(start_message)
+                start_message = {}
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,59 @@
+import random
+from typing import Iterable
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..profiling import Profile, current_profile, profile_store
+
+
+class ProfilingMiddleware:
+    """Profile requests carrying an ``X-Profile`` header from an allowed client,
+    and a random ``sample_rate`` share of all requests.
+
+    The profile id is returned in the ``X-Profile-Id`` response header. Requests
+    that are not profiled only pay for the header lookup.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        allowed_clients: Iterable[str] = ('127.0.0.1',),
+        sample_rate: float = 0.0,
+        interval: float = 0.005,
+    ) -> None:
+        self.app = app
+        self.allowed_clients = set(allowed_clients)
+        self.sample_rate = sample_rate
+        self.interval = interval
+
+    def should_profile(self, scope: Scope) -> bool:
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        client = scope.get('client')
+        return (
+            client is not None
+            and client[0] in self.allowed_clients
+            and 'x-profile' in Headers(scope=scope)
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope['method'], scope['path'], self.interval)
+
+        async def send_with_id(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                profile.status = message['status']
+                MutableHeaders(scope=message)['x-profile-id'] = profile.id
+            await send(message)
+
+        token = current_profile.set(profile)
+        profile.begin()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.end()
+            current_profile.reset(token)
+            profile_store.add(profile)
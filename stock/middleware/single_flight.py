@@ -0,0 +1,149 @@
+import asyncio
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..db.counts import normalize_query
+from ..db.versions import table_versions
+
+
+# (name, GET path prefix, tables the response is read from), first match wins
+DEFAULT_RULES: List[Tuple[str, str, Tuple[str, ...]]] = [
+    ('item-list', '/item/list', ('mitem', 'mitemcategory')),
+    ('item-image', '/item/image/', ('mitemimg',)),
+]
+
+# largest body kept for followers
+MAX_BODY_SIZE = 1024 * 1024
+
+# responses to these depend on more than the url
+BYPASS_HEADERS = ('range', 'if-none-match', 'if-modified-since', 'x-profile')
+
+
+class SingleFlightMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executed: Dict[str, int] = {}
+        self.coalesced: Dict[str, int] = {}
+
+    def record(self, name: str, coalesced: bool) -> None:
+        with self.lock:
+            counters = self.coalesced if coalesced else self.executed
+            counters[name] = counters.get(name, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                name: {'executed': self.executed.get(name, 0), 'coalesced': self.coalesced.get(name, 0)}
+                for name in sorted(set(self.executed) | set(self.coalesced))
+            }
+
+
+single_flight_metrics = SingleFlightMetrics()
+
+
+class Flight:
+    def __init__(self) -> None:
+        self.done = asyncio.Event()
+        self.followers = 0
+        # still accepting followers, their body is kept for them
+        self.shareable = True
+        self.complete = False
+        self.start: Message = {}
+        self.chunks: List[bytes] = []
+        self.size = 0
+
+
+class SingleFlightMiddleware:
+    """Share one execution between identical concurrent GET requests.
+
+    Requests with the same path, normalized query string and versions of the
+    tables the route reads wait for the request already running and get a copy
+    of its status, headers and body. A save committed in this process bumps the
+    table versions, so requests arriving after it start a new execution instead
+    of joining one that may have read the data before the save.
+
+    The leader streams its response as usual. Its body is only kept while
+    followers wait for it and up to ``max_body_size``; a response that started
+    without followers takes no new ones. Followers of a larger, failed or
+    disconnected response run their own execution.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        rules: List[Tuple[str, str, Tuple[str, ...]]] = None,
+        metrics: SingleFlightMetrics = single_flight_metrics,
+        max_body_size: int = MAX_BODY_SIZE,
+    ) -> None:
+        self.app = app
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.metrics = metrics
+        self.max_body_size = max_body_size
+        self.flights: Dict[tuple, Flight] = {}
+
+    def match(self, scope: Scope) -> Optional[Tuple[str, Tuple[str, ...]]]:
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            return None
+        for name, prefix, tables in self.rules:
+            if scope['path'].startswith(prefix):
+                headers = Headers(scope=scope)
+                if any(header in headers for header in BYPASS_HEADERS):
+                    return None
+                return name, tables
+        return None
+
+    def key(self, scope: Scope, tables: Tuple[str, ...]) -> tuple:
+        params = sorted(
+            (name, normalize_query(value) if name == 'q' else value)
+            for name, value in parse_qsl(scope.get('query_string', b'').decode('latin-1'))
+        )
+        return scope['path'], tuple(params), table_versions.get(tables)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        matched = self.match(scope)
+        if matched is None:
+            await self.app(scope, receive, send)
+            return
+
+        name, tables = matched
+        key = self.key(scope, tables)
+        flight = self.flights.get(key)
+        if flight is not None and flight.shareable:
+            self.metrics.record(name, coalesced=True)
+            flight.followers += 1
+            await flight.done.wait()
+            if flight.complete and flight.shareable:
+                # outer middlewares may change the headers in place
+                await send(dict(flight.start, headers=list(flight.start['headers'])))
+                await send({'type': 'http.response.body', 'body': b''.join(flight.chunks)})
+                return
+            await self.app(scope, receive, send)
+            return
+
+        self.metrics.record(name, coalesced=False)
+        flight = Flight()
+        self.flights[key] = flight
+        try:
+            await self.app(scope, receive, self.recording_send(flight, send))
+            flight.complete = True
+        finally:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+            flight.done.set()
+
+    def recording_send(self, flight: Flight, send: Send) -> Send:
+        async def record(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                flight.start = dict(message, headers=list(message['headers']))
+            elif message['type'] == 'http.response.body' and flight.shareable:
+                flight.size += len(message.get('body', b''))
+                if not flight.followers or flight.size > self.max_body_size:
+                    flight.shareable = False
+                    flight.chunks = []
+                else:
+                    flight.chunks.append(message.get('body', b''))
+            await send(message)
+        return record
@@ -0,0 +1,28 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+class BatchOperationModel(BaseModel):
+    method: str = 'GET'
+    # may include a query string
+    path: str
+    params: Dict[str, Any] = {}
+    body: Any = None
+
+
+class BatchRequestModel(BaseModel):
+    operations: List[BatchOperationModel] = Field(..., max_items=100)
+    transaction: bool = False
+
+
+class BatchResultModel(BaseModel):
+    status: int
+    # decoded JSON or text, None for binary responses
+    body: Any = None
+    contentType: Optional[str] = None
+
+
+class BatchResponseModel(BaseModel):
+    results: List[BatchResultModel]
+    # False when the transaction was rolled back
+    committed: bool = True
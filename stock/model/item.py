@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, List
 from decimal import Decimal
 from pydantic import BaseModel, constr
 
@@ -21,8 +21,25 @@ class ItemModel(BaseModel):
     description: Optional[str]
     sellingPrice: Optional[Decimal] = None
     isActive: bool = True
+    version: Optional[int] = None
 
     category: Optional[ItemCategoryModel] = None
 
     class Config:
         orm_mode = True
+
+
+class ItemSuggestionModel(BaseModel):
+    id: int
+    code: str
+    name: Optional[str]
+
+
+class ImageImportJobModel(BaseModel):
+    id: str
+    status: str = 'queued'
+    total: int = 0
+    processed: int = 0
+    imported: int = 0
+    unmatched: List[str] = []
+    errors: List[str] = []
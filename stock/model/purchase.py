@@ -23,6 +23,7 @@ class PurchaseModel(BaseModel):
     code: constr(max_length=50)
     marketPlaceId: Optional[int] = None
     date: datetime.date
+    version: Optional[int] = None
 
     marketPlace: Optional[MarketPlaceModel] = None
 
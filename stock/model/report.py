@@ -0,0 +1,45 @@
+from typing import List, Optional
+import datetime
+from decimal import Decimal
+from pydantic import BaseModel
+
+
+class ReorderModel(BaseModel):
+    itemId: int
+    code: str
+    name: Optional[str]
+    stock: Decimal
+    averageDemand: float
+    forecastDemand: float
+    safetyStock: float
+    reorderPoint: float
+    suggestedQuantity: int
+
+
+class ReorderReportModel(BaseModel):
+    dateFrom: datetime.date
+    dateTo: datetime.date
+    seq: int
+    items: List[ReorderModel] = []
+
+
+class AbcModel(BaseModel):
+    itemId: int
+    code: str
+    name: Optional[str]
+    quantity: Decimal
+    revenue: Decimal
+    orders: int
+    velocity: float
+    revenueShare: float
+    cumulativeShare: float
+    revenueClass: str
+    velocityClass: str
+
+
+class AbcReportModel(BaseModel):
+    dateFrom: datetime.date
+    dateTo: datetime.date
+    seq: int
+    totalRevenue: Decimal = Decimal(0)
+    items: List[AbcModel] = []
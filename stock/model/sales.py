@@ -1,9 +1,11 @@
 from typing import Optional, List
 import datetime
+from decimal import Decimal
 from pydantic import BaseModel, constr
-from .item import ItemModel
+from .item import ItemModel, ItemSuggestionModel
 from .market_place import MarketPlaceModel
 
+
 class SalesDModel(BaseModel):
     id: Optional[int] = None
     salesId: Optional[int] = None
@@ -21,6 +23,7 @@ class SalesModel(BaseModel):
     id: Optional[int] = None
     code: constr(max_length=50)
     date: datetime.date
+    version: Optional[int] = None
     marketPlaceId: Optional[int] = None
 
     details: List[SalesDModel] = []
@@ -28,3 +31,42 @@ class SalesModel(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class SalesListModel(BaseModel):
+    id: int
+    code: str
+    date: datetime.date
+    version: Optional[int] = None
+    marketPlaceId: Optional[int] = None
+    marketPlace: Optional[MarketPlaceModel] = None
+
+    itemCount: int = 0
+    totalQuantity: Decimal = Decimal(0)
+    totalAmount: Decimal = Decimal(0)
+
+    class Config:
+        orm_mode = True
+
+
+class ItemMappingModel(BaseModel):
+    marketPlaceId: int
+    sku: Optional[str] = None
+    productName: Optional[str] = None
+    itemId: int
+
+
+class UnmatchedRowModel(BaseModel):
+    code: str
+    sku: Optional[str] = None
+    productName: Optional[str] = None
+    candidates: List[ItemSuggestionModel] = []
+
+
+class SalesImportResultModel(BaseModel):
+    marketPlaceId: int
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    unmatched: List[UnmatchedRowModel] = []
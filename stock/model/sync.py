@@ -0,0 +1,27 @@
+from typing import List
+from pydantic import BaseModel
+from .item import ItemModel, ItemCategoryModel
+from .market_place import MarketPlaceModel
+from .purchase import PurchaseModel, PurchaseDModel
+from .sales import SalesModel, SalesDModel
+
+
+class DeletedRowModel(BaseModel):
+    tableName: str
+    rowId: int
+
+    class Config:
+        orm_mode = True
+
+
+class SyncResponse(BaseModel):
+    seq: int
+    more: bool = False
+    itemCategories: List[ItemCategoryModel] = []
+    items: List[ItemModel] = []
+    marketPlaces: List[MarketPlaceModel] = []
+    purchases: List[PurchaseModel] = []
+    purchaseDetails: List[PurchaseDModel] = []
+    sales: List[SalesModel] = []
+    salesDetails: List[SalesDModel] = []
+    deleted: List[DeletedRowModel] = []
@@ -0,0 +1,158 @@
+"""Period close: snapshot per item ending balances and archive the closed journal.
+
+After a close the journal holds one 'Ending Balance' row per item dated at the
+close date followed by the open period rows, so balance and valuation queries
+never scan closed history.
+"""
+from typing import Dict, List, Optional, Tuple
+import datetime
+from decimal import Decimal
+from sqlalchemy import select, insert, delete, func, and_
+from sqlalchemy.orm import Session
+
+from .db.schema import ItemJournal, ItemJournalArchive, PeriodClose
+from . import valuation
+
+
+class PeriodClosedError(Exception):
+    pass
+
+
+def get_closed_date(session: Session) -> Optional[datetime.date]:
+    return session.execute(
+        select(func.max(PeriodClose.date))
+    ).scalar_one()
+
+
+def check_period_open(session: Session, date: datetime.date) -> None:
+    closed_date = get_closed_date(session)
+    if closed_date is not None and date <= closed_date:
+        raise PeriodClosedError('Period up to {} is closed'.format(closed_date))
+
+
+def close_period(session: Session, date: datetime.date, method: Optional[str] = None) -> int:
+    """Close the period up to and including ``date``, returns the number of ending balances written.
+    Caller commits.
+    """
+    check_period_open(session, date)
+
+    # rows not valued yet must be valued before they are folded into a snapshot
+    unvalued = dict(
+        session.execute(
+            select(
+                ItemJournal.itemId, func.min(ItemJournal.date)
+            ).where(
+                and_(
+                    ItemJournal.date <= date,
+                    ItemJournal.value.is_(None),
+                )
+            ).group_by(
+                ItemJournal.itemId
+            )
+        ).all()
+    )
+    if unvalued:
+        valuation.revalue(session, unvalued, method)
+
+    balances = session.execute(
+        select(
+            ItemJournal.itemId,
+            func.sum(ItemJournal.quantity),
+            func.sum(ItemJournal.value),
+        ).where(
+            ItemJournal.date <= date
+        ).group_by(
+            ItemJournal.itemId
+        )
+    ).all()
+
+    columns = [column.name for column in ItemJournalArchive.__table__.columns]
+    session.execute(
+        insert(ItemJournalArchive).from_select(
+            columns,
+            select(
+                *[ItemJournal.__table__.c[name] for name in columns]
+            ).where(
+                ItemJournal.date <= date
+            )
+        )
+    )
+    session.execute(
+        delete(ItemJournal).where(
+            ItemJournal.date <= date
+        ).execution_options(synchronize_session=False)
+    )
+
+    ending_balances = [
+        {
+            'itemId': item_id,
+            'date': date,
+            'quantity': quantity,
+            'value': value or 0,
+            'journalType': valuation.ENDING_BALANCE,
+            'refCode': 'CLOSE {}'.format(date.isoformat()),
+        }
+        for item_id, quantity, value in balances
+        if quantity or value
+    ]
+    if ending_balances:
+        session.execute(insert(ItemJournal), ending_balances)
+
+    session.add(PeriodClose(date=date, closedAt=datetime.datetime.now()))
+    session.flush()
+    return len(ending_balances)
+
+
+def get_stock_balance(
+    session: Session,
+    item_ids: Optional[List[int]] = None,
+    as_of: Optional[datetime.date] = None,
+) -> Dict[int, Tuple[Decimal, Decimal]]:
+    """Quantity and value per item, from the latest snapshot onwards when ``as_of``
+    is in the open period, from the archive otherwise.
+    """
+    closed_date = get_closed_date(session)
+    if as_of is not None and closed_date is not None and as_of < closed_date:
+        # archived snapshots are skipped, the archive holds the full history
+        table = ItemJournalArchive
+        conditions = [
+            ItemJournalArchive.journalType != valuation.ENDING_BALANCE,
+            ItemJournalArchive.date <= as_of,
+        ]
+    else:
+        table = ItemJournal
+        conditions = [] if as_of is None else [ItemJournal.date <= as_of]
+
+    if item_ids is not None:
+        conditions.append(table.itemId.in_(item_ids))
+
+    result = session.execute(
+        select(
+            table.itemId,
+            func.sum(table.quantity),
+            func.coalesce(func.sum(table.value), 0),
+        ).where(
+            *conditions
+        ).group_by(
+            table.itemId
+        )
+    ).all()
+
+    return {
+        item_id: (Decimal(quantity), Decimal(value))
+        for item_id, quantity, value in result
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    from .db.connection import engine
+
+    parser = argparse.ArgumentParser(description='Close stock period')
+    parser.add_argument('date', type=datetime.date.fromisoformat, help='last date of the period, YYYY-MM-DD')
+    parser.add_argument('--method', choices=valuation.METHODS, default=None)
+    args = parser.parse_args()
+    with Session(engine) as session:
+        count = close_period(session, args.date, args.method)
+        session.commit()
+    print('Ending balances written:', count)
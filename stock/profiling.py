@@ -0,0 +1,201 @@
+"""On demand request profiling.
+
+A profiled request gets a sampler thread that records the Python stacks of the
+threads working for it (the event loop thread and the thread pool threads it
+runs SQL on) every ``profile_interval`` seconds, and SQLAlchemy cursor events
+that record every statement as a span. Profiles are kept in memory per worker
+process and exported in speedscope or collapsed stack format.
+
+Nothing is installed while no request is profiled: the engine listeners are
+added with the first active profile and removed with the last one.
+"""
+from typing import Dict, List, Optional, Tuple
+import collections
+import contextvars
+import sys
+import threading
+import time
+import uuid
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+MAX_DEPTH = 128
+# innermost frames of threads that are waiting, not working
+IDLE_FILES = ('selectors.py', 'threading.py', 'queue.py')
+
+Frame = Tuple[str, str, int]
+
+current_profile: contextvars.ContextVar[Optional['Profile']] = contextvars.ContextVar('current_profile', default=None)
+
+
+class Profile:
+    def __init__(self, method: str, path: str, interval: float) -> None:
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.startedAt = time.time()
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.status: Optional[int] = None
+        self.threads = {threading.get_ident()}
+        # root first stack -> number of samples
+        self.samples: Dict[Tuple[Frame, ...], int] = collections.Counter()
+        # (statement, start offset, duration) in seconds
+        self.spans: List[Tuple[str, float, float]] = []
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name='profile-' + self.id[:8], daemon=True)
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self.threads):
+                frame = frames.get(thread_id)
+                if frame is None or frame.f_code.co_filename.endswith(IDLE_FILES):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                self.samples[tuple(reversed(stack))] += 1
+
+    def begin(self) -> None:
+        _activate()
+        self._sampler.start()
+
+    def end(self) -> None:
+        self.duration = time.perf_counter() - self.start
+        self._stop.set()
+        self._sampler.join()
+        _deactivate()
+
+    def summary(self) -> dict:
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'startedAt': self.startedAt,
+            'duration': round(self.duration * 1000, 3),
+            'samples': sum(self.samples.values()),
+            'queries': len(self.spans),
+            'sqlTime': round(sum(duration for _, _, duration in self.spans) * 1000, 3),
+        }
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's folded stacks, one ``frame;frame;frame count`` line per stack."""
+        return ''.join(
+            '{} {}\n'.format(';'.join('{} ({}:{})'.format(*frame) for frame in stack), count)
+            for stack, count in sorted(self.samples.items())
+        )
+
+    def speedscope(self) -> dict:
+        """A sampled profile of the stacks and an evented profile of the SQL spans."""
+        frames: List[dict] = []
+        index: Dict[Frame, int] = {}
+
+        def frame_index(frame: Frame) -> int:
+            if frame not in index:
+                index[frame] = len(frames)
+                name, file, line = frame
+                frames.append({'name': name, 'file': file, 'line': line})
+            return index[frame]
+
+        samples = [[frame_index(frame) for frame in stack] for stack in self.samples]
+        events = []
+        for statement, start, duration in self.spans:
+            sql_frame = frame_index((' '.join(statement.split())[:200], 'SQL', 0))
+            events.append({'type': 'O', 'frame': sql_frame, 'at': start * 1000})
+            events.append({'type': 'C', 'frame': sql_frame, 'at': (start + duration) * 1000})
+
+        end_value = self.duration * 1000
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': '{} {}'.format(self.method, self.path),
+            'exporter': 'stock',
+            'shared': {'frames': frames},
+            'profiles': [
+                {
+                    'type': 'sampled',
+                    'name': 'Python stacks',
+                    'unit': 'milliseconds',
+                    'startValue': 0,
+                    'endValue': end_value,
+                    'samples': samples,
+                    'weights': [count * self.interval * 1000 for count in self.samples.values()],
+                },
+                {
+                    'type': 'evented',
+                    'name': 'SQL',
+                    'unit': 'milliseconds',
+                    'startValue': 0,
+                    'endValue': end_value,
+                    'events': events,
+                },
+            ],
+        }
+
+
+class ProfileStore:
+    """The most recent profiles of this worker process."""
+
+    def __init__(self, size: int = 20) -> None:
+        self.profiles: Dict[str, Profile] = collections.OrderedDict()
+        self.size = size
+        self.lock = threading.Lock()
+
+    def add(self, profile: Profile) -> None:
+        with self.lock:
+            self.profiles[profile.id] = profile
+            while len(self.profiles) > self.size:
+                self.profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self.lock:
+            return self.profiles.get(profile_id)
+
+    def list(self) -> List[Profile]:
+        with self.lock:
+            return list(reversed(self.profiles.values()))
+
+
+profile_store = ProfileStore()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    if profile is not None:
+        # the statement runs on a pool thread, sample it too
+        profile.threads.add(threading.get_ident())
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    if profile is not None and conn.info.get('profile_query_start'):
+        started = conn.info['profile_query_start'].pop()
+        profile.spans.append((statement, started - profile.start, time.perf_counter() - started))
+
+
+_active = 0
+_active_lock = threading.Lock()
+
+
+def _activate() -> None:
+    global _active
+    with _active_lock:
+        _active += 1
+        if _active == 1:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _deactivate() -> None:
+    global _active
+    with _active_lock:
+        _active -= 1
+        if _active == 0:
+            event.remove(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.remove(Engine, 'after_cursor_execute', _after_cursor_execute)
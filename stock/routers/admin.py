@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Request
+
+from ..db.concurrency import unversioned_updates
+from ..db.group_commit import write_queue
+from ..middleware.single_flight import single_flight_metrics
+from .profiling import check_client
+
+
+router = APIRouter(
+    prefix='/admin',
+    tags=['admin'],
+)
+
+
+@router.get('/metrics', response_model=dict)
+async def get_metrics(request: Request):
+    check_client(request)
+    return {
+        'writeQueue': write_queue.metrics.snapshot(),
+        'singleFlight': single_flight_metrics.snapshot(),
+        'unversionedUpdates': unversioned_updates.snapshot(),
+    }
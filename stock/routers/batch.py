@@ -0,0 +1,214 @@
+import asyncio
+import inspect
+import json
+import logging
+from contextlib import AsyncExitStack
+from typing import List, Optional
+from urllib.parse import urlencode, urlsplit
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+from starlette.types import Message
+
+from ..db.connection import get_session, shared_session
+from ..db.utils import begin_explicitly
+from ..db.versions import WRITTEN_TABLES, table_versions
+from ..middleware.admission import DEFAULT_RULES
+from ..model.batch import BatchOperationModel, BatchRequestModel, BatchResponseModel, BatchResultModel
+
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix='/batch',
+    tags=['batch'],
+)
+
+# streams never end and heavy routes must keep going through their admission limit
+NOT_BATCHABLE = ('/batch', '/events')
+
+
+def batchable(method: str, path: str) -> bool:
+    if path.startswith(NOT_BATCHABLE):
+        return False
+    for rule_method, prefix, name in DEFAULT_RULES:
+        if method == rule_method and path.startswith(prefix):
+            return name != 'heavy'
+    return True
+
+
+def decode_body(content_type: Optional[str], body: bytes):
+    if not body or content_type is None:
+        return None
+    if content_type.startswith('application/json'):
+        return json.loads(body)
+    if content_type.startswith('text/'):
+        return body.decode('utf-8', errors='replace')
+    return None
+
+
+async def dispatch(request: Request, operation: BatchOperationModel) -> BatchResultModel:
+    """Run one operation through the app's routes, skipping the middlewares
+    (the batch request already passed them).
+    """
+    method = operation.method.upper()
+    url = urlsplit(operation.path)
+    if not batchable(method, url.path):
+        return BatchResultModel(status=400, body={'detail': '{} {} is not allowed in a batch'.format(method, url.path)})
+
+    query = '&'.join(part for part in (url.query, urlencode(operation.params, doseq=True)) if part)
+    body = json.dumps(operation.body).encode('utf-8') if operation.body is not None else b''
+    scope = dict(
+        request.scope,
+        method=method,
+        path=url.path,
+        raw_path=url.path.encode('utf-8'),
+        query_string=query.encode('utf-8'),
+        headers=[
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('latin-1')),
+        ],
+    )
+    scope.pop('route', None)
+    scope.pop('endpoint', None)
+    scope.pop('path_params', None)
+
+    received = False
+
+    async def receive() -> Message:
+        nonlocal received
+        if received:
+            return {'type': 'http.disconnect'}
+        received = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    start: Message = {}
+    chunks: List[bytes] = []
+
+    async def send(message: Message) -> None:
+        nonlocal start
+        if message['type'] == 'http.response.start':
+            start = message
+        elif message['type'] == 'http.response.body':
+            chunks.append(message.get('body', b''))
+
+    try:
+        async with AsyncExitStack() as stack:
+            # generator dependencies are closed by this stack, normally set up by a middleware
+            scope['fastapi_astack'] = stack
+            await request.app.router(scope, receive, send)
+    except Exception as ex:
+        handler = next(
+            (request.app.exception_handlers[cls] for cls in type(ex).__mro__ if cls in request.app.exception_handlers),
+            None,
+        )
+        if handler is None:
+            logger.exception('Batch operation %s %s failed', method, url.path)
+            return BatchResultModel(status=500, body={'detail': 'Internal Server Error'})
+        response = handler(Request(scope), ex)
+        if inspect.isawaitable(response):
+            response = await response
+        return BatchResultModel(
+            status=response.status_code,
+            body=decode_body(response.media_type, response.body),
+            contentType=response.media_type,
+        )
+
+    content_type = Headers(raw=start.get('headers', [])).get('content-type')
+    return BatchResultModel(
+        status=start.get('status', 500),
+        body=decode_body(content_type, b''.join(chunks)),
+        contentType=content_type,
+    )
+
+
+async def dispatch_shared(request: Request, operation: BatchOperationModel, session: Session) -> BatchResultModel:
+    token = shared_session.set(session)
+    try:
+        return await dispatch(request, operation)
+    finally:
+        shared_session.reset(token)
+
+
+def failed(result: BatchResultModel) -> bool:
+    return result.status >= 400 or (isinstance(result.body, dict) and result.body.get('success') is False)
+
+
+def transaction_session(session: Session) -> Session:
+    """A session whose commits only release savepoints of one outer transaction,
+    the caller commits or rolls back the connection's transaction.
+    """
+    connection = session.get_bind().connect()
+    connection.begin()
+    begin_explicitly(connection)
+    shared = Session(bind=connection)
+    shared.begin_nested()
+
+    @event.listens_for(shared, 'after_transaction_end')
+    def restart_savepoint(session, transaction):
+        if transaction.nested and not transaction._parent.nested:
+            session.expire_all()
+            session.begin_nested()
+
+    return shared
+
+
+@router.post('', response_model=BatchResponseModel)
+async def run_batch(
+    batch: BatchRequestModel,
+    request: Request,
+    session: Session = Depends(get_session),
+):
+    """Run sub-requests to the other routes in one round trip, results in request order.
+
+    Writes run in order on one session. Consecutive GETs run concurrently, each
+    on its own session as a session must not be used concurrently. With
+    ``transaction`` every operation runs in order in one transaction, which is
+    rolled back as a whole at the first failed operation (status >= 400 or
+    ``success`` false), the operations after it are not run (status 424).
+    """
+    results: List[BatchResultModel] = []
+    if not batch.transaction:
+        operations = batch.operations
+        index = 0
+        while index < len(operations):
+            end = index
+            while end < len(operations) and operations[end].method.upper() == 'GET':
+                end += 1
+            if end > index:
+                # dispatch() leaves shared_session unset, each read gets its own session
+                results.extend(await asyncio.gather(*[dispatch(request, operation) for operation in operations[index:end]]))
+                index = end
+            else:
+                results.append(await dispatch_shared(request, operations[index], session))
+                index += 1
+        return BatchResponseModel(results=results)
+
+    shared = transaction_session(session)
+    connection = shared.bind
+    committed = False
+    try:
+        for operation in batch.operations:
+            result = await dispatch_shared(request, operation, shared)
+            results.append(result)
+            if failed(result):
+                break
+        committed = not results or not failed(results[-1])
+        written = shared.info.pop(WRITTEN_TABLES, None)
+        shared.close()
+        if committed:
+            connection.get_transaction().commit()
+            # commits inside the batch only released savepoints
+            table_versions.bump(written or ())
+    finally:
+        shared.close()
+        # closing rolls back the outer transaction unless it was committed
+        connection.close()
+
+    # events of rolled back operations were already published, clients reload on them
+    results.extend(
+        BatchResultModel(status=424, body={'detail': 'Not run, an earlier operation failed'})
+        for _ in batch.operations[len(results):]
+    )
+    return BatchResponseModel(results=results, committed=committed)
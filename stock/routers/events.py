@@ -0,0 +1,54 @@
+import asyncio
+import json
+from typing import Optional
+from fastapi import APIRouter, Header, Request
+from fastapi.responses import StreamingResponse
+
+from ..events import broker
+
+
+HEARTBEAT_INTERVAL = 15
+
+router = APIRouter(
+    prefix='/events',
+    tags=['events'],
+)
+
+
+def format_event(event: dict) -> str:
+    if 'id' not in event:
+        return 'event: {}\ndata: {{}}\n\n'.format(event['event'])
+    data = {key: value for key, value in event.items() if key != 'id'}
+    return 'id: {}\nevent: change\ndata: {}\n\n'.format(event['id'], json.dumps(data, separators=(',', ':')))
+
+
+@router.get('')
+async def get_events(
+    request: Request,
+    last_event_id: Optional[int] = Header(None),
+):
+    """Server-sent change events: ``change`` with entity, rowId and for stock the new
+    balance, ``resync`` when events were lost and the client should reload.
+    """
+    subscriber = broker.subscribe(last_event_id)
+
+    async def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ': ping\n\n'
+                    continue
+                yield format_event(event)
+        finally:
+            broker.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
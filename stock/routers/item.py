@@ -1,14 +1,24 @@
-from typing import Optional, List
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from typing import Optional, List, Dict
+import os
+import zipfile
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, HTTPException, UploadFile, File
 from sqlalchemy import select, and_, or_, update
 from sqlalchemy.orm import Session
 from pydantic import parse_obj_as, BaseModel
-from fastapi.responses import Response
+from fastapi.responses import FileResponse, Response
+from starlette.concurrency import run_in_threadpool
 
 from ..db.connection import get_session
+from ..db.concurrency import ConflictError, versioned_update
+from ..db.counts import count_total, normalize_query, set_total_headers
 from ..db.schema import Item, ItemCategory, ItemImg
-from ..model.item import ItemModel, ItemCategoryModel
+from ..db.utils import chunked
+from ..events import broker
+from ..model.item import ItemModel, ItemCategoryModel, ItemSuggestionModel, ImageImportJobModel
 from ..model.commons import SaveResponse
+from ..settings import get_settings
+from ..search import item_index
+from .. import images, image_import
 
 
 router = APIRouter(
@@ -26,9 +36,11 @@ router = APIRouter(
 
 @router.get('/category/list', response_model=List[ItemCategoryModel])
 async def get_item_category_list(
+    response: Response,
     q: str = '',
     limit: int = 20,
     offset: int = 0,
+    withTotal: bool = False,
     session: Session = Depends(get_session),
 ):
     if q:
@@ -53,6 +65,30 @@ async def get_item_category_list(
         ).limit(limit).offset(offset)
     ).scalars().all()
 
+    if withTotal:
+        statement = select(ItemCategory.id).where(and_(*conditions))
+        set_total_headers(response, *count_total(session, ItemCategory, statement, (normalize_query(q),)))
+    return result
+
+
+@router.post('/category/get-many', response_model=Dict[int, ItemCategoryModel])
+async def get_item_categories_by_ids(
+    ids: List[int] = Body(...),
+    session: Session = Depends(get_session),
+):
+    result = {}
+    for chunk in chunked(sorted(set(ids))):
+        result.update(
+            (row.id, row)
+            for row in session.execute(
+                select(
+                    ItemCategory
+                ).where(
+                    ItemCategory.id.in_(chunk)
+                )
+            ).scalars()
+        )
+
     return result
 
 
@@ -88,9 +124,11 @@ async def save_item_category(
 
 @router.get('/list', response_model=List[ItemModel])
 async def get_item_list(
+    response: Response,
     q: str = '',
     limit: int = 20,
     offset: int = 0,
+    withTotal: bool = False,
     session: Session = Depends(get_session),
 ):
     if q:
@@ -118,9 +156,23 @@ async def get_item_list(
         ).limit(limit).offset(offset)
     ).scalars().all()
 
+    if withTotal:
+        statement = select(Item.id).where(and_(*conditions))
+        set_total_headers(response, *count_total(session, Item, statement, (normalize_query(q),)))
     return parse_obj_as(List[ItemModel], result)
 
 
+@router.get('/suggest', response_model=List[ItemSuggestionModel])
+async def suggest_item(
+    prefix: str = '',
+    limit: int = 10,
+):
+    return [
+        ItemSuggestionModel(id=item_id, code=code, name=name)
+        for item_id, code, name in item_index.suggest(prefix, limit)
+    ]
+
+
 @router.post('/get/{item_id}', response_model=ItemModel)
 async def get_item_by_id(
     item_id: int,
@@ -137,9 +189,33 @@ async def get_item_by_id(
     ).scalars().one()
 
 
+@router.post('/get-many', response_model=Dict[int, ItemModel])
+async def get_items_by_ids(
+    ids: List[int] = Body(...),
+    session: Session = Depends(get_session),
+):
+    result = {}
+    for chunk in chunked(sorted(set(ids))):
+        result.update(
+            (row.id, row)
+            for row in session.execute(
+                select(
+                    Item, ItemCategory
+                ).outerjoin(
+                    Item.category
+                ).where(
+                    Item.id.in_(chunk)
+                )
+            ).scalars()
+        )
+
+    return result
+
+
 @router.get('/image/{item_id}', response_class=Response)
 async def get_item_image_by_id(
     item_id: int,
+    thumbnail: bool = False,
     session: Session = Depends(get_session),
 ):
     item_img: ItemImg = session.execute(
@@ -150,7 +226,26 @@ async def get_item_image_by_id(
         )
     ).scalar_one_or_none()
 
-    if item_img is None or not item_img.content:
+    if item_img is None:
+        raise HTTPException(status_code=404, detail='Image not found')
+
+    if item_img.contentHash is not None:
+        path = images.image_path(item_img.contentHash)
+        if thumbnail and images.thumbnail_path(item_img.contentHash).exists():
+            return FileResponse(
+                images.thumbnail_path(item_img.contentHash),
+                media_type='image/jpeg',
+                headers={'ETag': '"{}.thumb"'.format(item_img.contentHash)},
+            )
+        if not path.exists():
+            raise HTTPException(status_code=404, detail='Image not found')
+        return FileResponse(
+            path,
+            media_type=item_img.contentType,
+            headers={'ETag': '"{}"'.format(item_img.contentHash)},
+        )
+
+    if not item_img.content:
         raise HTTPException(status_code=404, detail='Image not found')
 
     return Response(
@@ -166,30 +261,32 @@ async def save_item(
 ) -> SaveResponse[ItemModel]:
     try:
         if item.id is not None:
-            result = session.execute(
-                update(Item).where(
-                    Item.id == item.id
-                ).values(
-                    **item.dict(exclude={'id', 'category'})
-                )
+            versioned_update(
+                session, Item, item.id, item.version,
+                item.dict(exclude={'id', 'category', 'version'}),
             )
-            assert result.rowcount == 1, 'Error item not found'
             session.commit()
             saved_item = ItemModel.from_orm(
                 session.execute(
-                    select(Item, ItemCategory).join(Item.category).where(
+                    select(Item, ItemCategory).outerjoin(Item.category).where(
                         Item.id == item.id
                     ).limit(1)
                 ).scalar_one_or_none()
             )
         else:
-            new_item = Item(**item.dict(exclude={'id', 'category'}))
+            new_item = Item(**item.dict(exclude={'id', 'category', 'version'}))
             session.add(new_item)
             session.commit()
             saved_item = ItemModel.from_orm(new_item)
 
+        item_index.upsert(saved_item.id, saved_item.code, saved_item.name, saved_item.isActive)
+        broker.publish('item', saved_item.id)
         return SaveResponse[ItemModel](data=saved_item)
 
+    except ConflictError:
+        session.rollback()
+        raise
+
     except Exception as ex:
         session.rollback()
         # raise
@@ -209,26 +306,67 @@ async def save_item_image(
     if item is None:
         raise HTTPException(status_code=404, detail='Item not found')
 
-    item_image: ItemImg = session.execute(
-        select(ItemImg).where(ItemImg.itemId == item_id)
-    ).scalar_one_or_none()
+    try:
+        stored = await run_in_threadpool(images.store_image, image.file, pin=True)
+    except images.ImageTooLarge as ex:
+        raise HTTPException(status_code=413, detail=str(ex))
+    except images.UnsupportedImage as ex:
+        raise HTTPException(status_code=415, detail=str(ex))
 
-    if item_image is None:
-        item_image = ItemImg(
-            item_id=item_id,
-            content=await image.read(),
-            contentType=image.content_type,
-            originalFileName=image.filename,
-        )
+    try:
+        item_image: ItemImg = session.execute(
+            select(ItemImg).where(ItemImg.itemId == item_id)
+        ).scalar_one_or_none()
+
+        previous_hash = None
+        if item_image is None:
+            item_image = ItemImg(itemId=item_id)
+            session.add(item_image)
+        else:
+            previous_hash = item_image.contentHash
+            item_image.content = None
 
-        session.add(item_image)
-    else:
-        item_image.content = await image.read()
-        item_image.contentType = image.content_type
+        item_image.contentHash = stored.contentHash
+        item_image.contentType = stored.contentType
+        item_image.fileSize = stored.fileSize
         item_image.originalFileName = image.filename
 
-    session.commit()
+        session.commit()
+    finally:
+        images.unpin_image(stored.contentHash)
+    if previous_hash != stored.contentHash:
+        images.release_image(session, previous_hash)
+
     return SaveResponse(data={
         'id': item_image.id,
-        'fileSize': len(item_image.content),
+        'fileSize': stored.fileSize,
     })
+
+
+@router.post('/images/import', response_model=ImageImportJobModel)
+async def import_item_images(
+    background_tasks: BackgroundTasks,
+    archive: UploadFile = File(...),
+):
+    try:
+        zip_path = await run_in_threadpool(
+            images.spool_upload, archive.file, get_settings().image_import_max_size, '.zip',
+        )
+    except images.ImageTooLarge as ex:
+        raise HTTPException(status_code=413, detail=str(ex))
+
+    if not zipfile.is_zipfile(zip_path):
+        os.unlink(zip_path)
+        raise HTTPException(status_code=415, detail='Archive must be a zip file')
+
+    job = image_import.create_job()
+    background_tasks.add_task(image_import.run_import, job, zip_path)
+    return job
+
+
+@router.get('/images/import/{job_id}', response_model=ImageImportJobModel)
+async def get_item_image_import(job_id: str):
+    job = image_import.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail='Import job not found')
+    return job
@@ -1,11 +1,13 @@
-from typing import Optional, List
-from fastapi import APIRouter, Depends
+from typing import Optional, List, Dict
+from fastapi import APIRouter, Body, Depends, Response
 from sqlalchemy import select, and_, or_, update
 from sqlalchemy.orm import Session
 from pydantic import parse_obj_as, BaseModel
 
 from ..db.connection import get_session
+from ..db.counts import count_total, normalize_query, set_total_headers
 from ..db.schema import MarketPlace
+from ..db.utils import chunked
 from ..model.sales import MarketPlaceModel
 from ..model.commons import SaveResponse
 
@@ -17,9 +19,11 @@ router = APIRouter(
 
 @router.get('/list', response_model=List[MarketPlaceModel])
 async def get_market_place_list(
+    response: Response,
     q: str = '',
     limit: int = 20,
     offset: int = 0,
+    withTotal: bool = False,
     session: Session = Depends(get_session),
 ):
     if q:
@@ -44,6 +48,9 @@ async def get_market_place_list(
         ).limit(limit).offset(offset)
     ).scalars().all()
 
+    if withTotal:
+        statement = select(MarketPlace.id).where(and_(*conditions))
+        set_total_headers(response, *count_total(session, MarketPlace, statement, (normalize_query(q),)))
     return parse_obj_as(List[MarketPlaceModel], result)
 
 
@@ -61,6 +68,27 @@ async def get_market_place_by_id(
     ).scalars().one()
 
 
+@router.post('/get-many', response_model=Dict[int, MarketPlaceModel])
+async def get_market_places_by_ids(
+    ids: List[int] = Body(...),
+    session: Session = Depends(get_session),
+):
+    result = {}
+    for chunk in chunked(sorted(set(ids))):
+        result.update(
+            (row.id, row)
+            for row in session.execute(
+                select(
+                    MarketPlace
+                ).where(
+                    MarketPlace.id.in_(chunk)
+                )
+            ).scalars()
+        )
+
+    return result
+
+
 @router.post('/save', response_model=SaveResponse[MarketPlaceModel])
 async def save_market_place(
     data: MarketPlaceModel,
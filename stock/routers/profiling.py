@@ -0,0 +1,49 @@
+from typing import List
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from ..profiling import profile_store
+from ..settings import get_settings
+
+
+router = APIRouter(
+    prefix='/admin/profiles',
+    tags=['admin'],
+)
+
+
+def check_client(request: Request) -> None:
+    if request.client is None or request.client.host not in get_settings().get_profile_allowed_clients():
+        raise HTTPException(status_code=403, detail='Profiles are only available to allowed clients')
+
+
+@router.get('', response_model=List[dict])
+async def list_profiles(request: Request):
+    check_client(request)
+    return [profile.summary() for profile in profile_store.list()]
+
+
+@router.get('/{profile_id}')
+async def get_profile(
+    profile_id: str,
+    request: Request,
+    format: str = 'speedscope',
+):
+    """Download a profile, ``format`` is ``speedscope`` (open in speedscope.app) or ``collapsed``."""
+    check_client(request)
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail='Profile not found')
+
+    filename = 'profile-{}'.format(profile.id)
+    if format == 'collapsed':
+        return PlainTextResponse(
+            profile.collapsed(),
+            headers={'Content-Disposition': 'attachment; filename="{}.txt"'.format(filename)},
+        )
+    if format == 'speedscope':
+        return JSONResponse(
+            profile.speedscope(),
+            headers={'Content-Disposition': 'attachment; filename="{}.speedscope.json"'.format(filename)},
+        )
+    raise HTTPException(status_code=400, detail='Unknown format {}, use speedscope or collapsed'.format(format))
@@ -1,5 +1,6 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+import datetime
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy import select, and_, or_, update, insert, delete
 from sqlalchemy.orm import Session
 from pydantic import parse_obj_as
@@ -7,8 +8,13 @@ from pydantic import parse_obj_as
 from stock.model.commons import SaveResponse
 
 from ..db.connection import get_session
+from ..db.concurrency import ConflictError, versioned_update
+from ..db.counts import count_total, normalize_query, set_total_headers
+from ..db.changes import record_deleted
 from ..db.schema import Purchase, PurchaseD, MarketPlace
+from ..events import broker
 from ..model.purchase import PurchaseModel, PurchaseModelWithDetails
+from .. import journal
 
 
 router = APIRouter(
@@ -19,9 +25,14 @@ router = APIRouter(
 
 @router.get('/list', response_model=List[PurchaseModel])
 async def list_purchase(
+    response: Response,
     q: str = '',
+    dateFrom: Optional[datetime.date] = None,
+    dateTo: Optional[datetime.date] = None,
+    marketPlaceId: Optional[int] = None,
     limit: int = 20,
     offset: int = 0,
+    withTotal: bool = False,
     session: Session = Depends(get_session),
 ):
     if q:
@@ -38,6 +49,13 @@ async def list_purchase(
         ]
     else:
         conditions = []
+    # served by Idx_tpurchase_date, or Idx_tpurchase_marketPlaceId_date with a market place
+    if marketPlaceId is not None:
+        conditions.append(Purchase.marketPlaceId == marketPlaceId)
+    if dateFrom is not None:
+        conditions.append(Purchase.date >= dateFrom)
+    if dateTo is not None:
+        conditions.append(Purchase.date <= dateTo)
 
     result = session.execute(
         select(
@@ -48,9 +66,15 @@ async def list_purchase(
             and_(
                 *conditions
             )
+        ).order_by(
+            Purchase.date.desc(), Purchase.id.desc(),
         ).limit(limit).offset(offset)
     ).scalars().all()
 
+    if withTotal:
+        statement = select(Purchase.id).outerjoin(Purchase.marketPlace).where(and_(*conditions))
+        filters = (normalize_query(q), dateFrom, dateTo, marketPlaceId)
+        set_total_headers(response, *count_total(session, Purchase, statement, filters))
     return parse_obj_as(List[PurchaseModel], result)
 
 
@@ -77,7 +101,7 @@ async def save_purchase(
 ):
     if purchase.id is None:
         data = Purchase(
-            **purchase.dict(exclude={'id', 'details', 'marketPlace'})
+            **purchase.dict(exclude={'id', 'details', 'marketPlace', 'version'})
         )
         session.add(data)
 
@@ -89,15 +113,20 @@ async def save_purchase(
             for row in purchase.details
         ]
         session.add_all(details)
+        session.flush()
+        changed = journal.post_document(session, Purchase, data.id)
         session.commit()
     else:
-        session.execute(
-            update(Purchase).where(
-                Purchase.id == purchase.id
-            ).values(
-                **purchase.dict(exclude={'id', 'details', 'marketPlace'})
+        try:
+            versioned_update(
+                session, Purchase, purchase.id, purchase.version,
+                purchase.dict(exclude={'id', 'details', 'marketPlace', 'version'}),
             )
-        )
+        except ConflictError:
+            session.rollback()
+            raise
+
+        unposted = journal.unpost_document(session, Purchase, purchase.id)
 
         existing_id: List[int] = session.execute(
             select(PurchaseD.id).where(
@@ -130,6 +159,7 @@ async def save_purchase(
                     )
                 )
         # delete existing id not included
+        record_deleted(session, PurchaseD, existing_id)
         session.execute(
             delete(PurchaseD).where(
                 and_(
@@ -138,6 +168,7 @@ async def save_purchase(
                 )
             )
         )
+        changed = journal.post_document(session, Purchase, purchase.id, unposted)
 
         data: Purchase = session.execute(
             select(
@@ -154,6 +185,8 @@ async def save_purchase(
         ).scalar_one_or_none()
         session.commit()
 
+    broker.publish('purchase', data.id)
+    broker.publish_stock(session, changed)
     return SaveResponse(
         data=PurchaseModelWithDetails.from_orm(data)
     )
@@ -0,0 +1,69 @@
+import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from ..db.connection import get_session
+from ..model.report import AbcReportModel, ReorderReportModel
+from .. import analytics
+
+
+router = APIRouter(
+    prefix='/report',
+    tags=['report'],
+)
+
+
+@router.get('/reorder', response_model=ReorderReportModel)
+async def get_reorder_report(
+    asOf: Optional[datetime.date] = None,
+    days: int = Query(90, ge=1, le=730),
+    alpha: float = Query(0.3, gt=0, le=1),
+    leadTime: int = Query(7, ge=0),
+    reviewDays: int = Query(14, ge=0),
+    serviceLevel: float = Query(0.95, gt=0.5, lt=1),
+    all: bool = False,
+    limit: int = Query(100, ge=1, le=10000),
+    session: Session = Depends(get_session),
+):
+    return await run_in_threadpool(
+        analytics.cached_reorder_report,
+        session,
+        as_of=asOf,
+        days=days,
+        alpha=alpha,
+        lead_time=leadTime,
+        review_days=reviewDays,
+        service_level=serviceLevel,
+        include_all=all,
+        limit=limit,
+    )
+
+
+@router.get('/abc', response_model=AbcReportModel)
+async def get_abc_report(
+    dateFrom: Optional[datetime.date] = None,
+    dateTo: Optional[datetime.date] = None,
+    marketPlaceId: Optional[int] = None,
+    aShare: float = Query(0.8, gt=0, lt=1),
+    bShare: float = Query(0.95, gt=0, le=1),
+    session: Session = Depends(get_session),
+):
+    """Items ranked by revenue in a date window (default the last 90 days)."""
+    dateTo = dateTo or datetime.date.today()
+    dateFrom = dateFrom or dateTo - datetime.timedelta(days=89)
+    if dateFrom > dateTo:
+        raise HTTPException(status_code=400, detail='dateFrom must not be after dateTo')
+    if aShare > bShare:
+        raise HTTPException(status_code=400, detail='aShare must not be larger than bShare')
+
+    return await run_in_threadpool(
+        analytics.cached_abc_report,
+        session,
+        dateFrom,
+        dateTo,
+        market_place_id=marketPlaceId,
+        a_share=aShare,
+        b_share=bShare,
+    )
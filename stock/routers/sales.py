@@ -1,13 +1,28 @@
-from typing import Optional, List
-from fastapi import APIRouter, Depends, UploadFile
-from sqlalchemy import select, and_, or_, update
+from typing import Dict, Optional, List, Tuple
+import datetime
+from decimal import Decimal
+from functools import partial
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, and_, or_, update, insert, delete, func
 from sqlalchemy.orm import Session
 from pydantic import parse_obj_as, BaseModel
 
-from ..db.connection import get_session
-from ..db.schema import Sales, SalesD, MarketPlace
-from ..model.sales import SalesModel
+from stock.model.commons import SaveResponse
+
+from ..db.connection import get_session, shared_session
+from ..db.concurrency import ConflictError, versioned_update
+from ..db.changes import record_deleted
+from ..db.group_commit import write_queue
+from ..db.counts import count_total, normalize_query, set_total_headers
+from ..db.schema import Sales, SalesD, MarketPlace, ItemMapping
+from ..db.utils import chunked
+from ..events import broker
+from ..settings import get_settings
+from ..model.sales import SalesModel, SalesListModel, ItemMappingModel, SalesImportResultModel
 from ..model.market_place import MarketPlaceModel
+from ..matching import sku_key, name_key
+from .. import journal, sales_import
 
 
 router = APIRouter(
@@ -16,9 +31,252 @@ router = APIRouter(
 )
 
 
-@router.post('/import-tokopedia')
+@router.get('/list', response_model=List[SalesListModel])
+async def list_sales(
+    response: Response,
+    q: str = '',
+    dateFrom: Optional[datetime.date] = None,
+    dateTo: Optional[datetime.date] = None,
+    marketPlaceId: Optional[int] = None,
+    limit: int = 20,
+    offset: int = 0,
+    withTotal: bool = False,
+    session: Session = Depends(get_session),
+):
+    if q:
+        keywords = q.split(' ')
+        conditions = [
+            or_(
+                Sales.code.contains(keyword),
+                and_(
+                    Sales.marketPlaceId.isnot(None),
+                    MarketPlace.name.contains(keyword),
+                )
+            )
+            for keyword in keywords if len(keyword) > 0
+        ]
+    else:
+        conditions = []
+    # served by Idx_tsales_date, or Idx_tsales_marketPlaceId_date with a market place
+    if marketPlaceId is not None:
+        conditions.append(Sales.marketPlaceId == marketPlaceId)
+    if dateFrom is not None:
+        conditions.append(Sales.date >= dateFrom)
+    if dateTo is not None:
+        conditions.append(Sales.date <= dateTo)
+
+    sales_list = session.execute(
+        select(
+            Sales, MarketPlace,
+        ).outerjoin(
+            Sales.marketPlace
+        ).where(
+            and_(
+                *conditions
+            )
+        ).order_by(
+            Sales.date.desc(), Sales.id.desc(),
+        ).limit(limit).offset(offset)
+    ).scalars().all()
+
+    # totals of the page only, aggregated by the database
+    totals = {}
+    for chunk in chunked([sales.id for sales in sales_list]):
+        for sales_id, item_count, quantity, amount in session.execute(
+            select(
+                SalesD.salesId,
+                func.count(SalesD.id),
+                func.sum(SalesD.quantity),
+                func.sum(SalesD.quantity * func.coalesce(SalesD.unitPrice, 0)),
+            ).where(
+                SalesD.salesId.in_(chunk)
+            ).group_by(
+                SalesD.salesId
+            )
+        ):
+            totals[sales_id] = {'itemCount': item_count, 'totalQuantity': quantity, 'totalAmount': amount}
+
+    result = [
+        SalesListModel.parse_obj(dict(SalesListModel.from_orm(sales).dict(), **totals.get(sales.id, {})))
+        for sales in sales_list
+    ]
+
+    if withTotal:
+        statement = select(Sales.id).outerjoin(Sales.marketPlace).where(and_(*conditions))
+        filters = (normalize_query(q), dateFrom, dateTo, marketPlaceId)
+        set_total_headers(response, *count_total(session, Sales, statement, filters))
+    return result
+
+
+@router.get('/get/{sales_id}', response_model=SalesModel)
+async def get_sales_by_id(
+    sales_id: int,
+    session: Session = Depends(get_session),
+):
+    sales = session.execute(
+        select(
+            Sales
+        ).where(
+            Sales.id == sales_id
+        )
+    ).scalars().one_or_none()
+    if sales is None:
+        raise HTTPException(status_code=404, detail='Sales not found')
+    return SalesModel.from_orm(sales)
+
+
+def _write_sales(session: Session, sales: SalesModel) -> Tuple[int, Dict[int, Decimal]]:
+    """Insert or update a sales document and post it, without committing.
+
+    Returns the sales id and the stock change per item.
+    """
+    if sales.id is None:
+        data = Sales(
+            **sales.dict(exclude={'id', 'details', 'marketPlace', 'version'})
+        )
+        session.add(data)
+        session.add_all([
+            SalesD(
+                sales=data,
+                **row.dict(exclude={'id', 'item', 'salesId'})
+            )
+            for row in sales.details
+        ])
+        session.flush()
+        return data.id, journal.post_document(session, Sales, data.id)
+
+    versioned_update(
+        session, Sales, sales.id, sales.version,
+        sales.dict(exclude={'id', 'details', 'marketPlace', 'version'}),
+    )
+    unposted = journal.unpost_document(session, Sales, sales.id)
+
+    existing_id: List[int] = session.execute(
+        select(SalesD.id).where(
+            SalesD.salesId == sales.id
+        )
+    ).scalars().all()
+
+    for row in sales.details:
+        if row.id is not None:
+            if row.id not in existing_id:
+                raise Exception('SalesD.id {} not valid'.format(row.id))
+            existing_id.remove(row.id)
+            session.execute(
+                update(SalesD).where(
+                    and_(
+                        SalesD.id == row.id,
+                        SalesD.salesId == sales.id,
+                    )
+                ).values(
+                    **row.dict(exclude={'id', 'item', 'salesId'})
+                )
+            )
+        else:
+            session.execute(
+                insert(SalesD).values(
+                    salesId=sales.id,
+                    **row.dict(exclude={'id', 'item', 'salesId'})
+                )
+            )
+    record_deleted(session, SalesD, existing_id)
+    session.execute(
+        delete(SalesD).where(
+            and_(
+                SalesD.salesId == sales.id,
+                SalesD.id.in_(existing_id),
+            )
+        )
+    )
+    return sales.id, journal.post_document(session, Sales, sales.id, unposted)
+
+
+@router.post('/save', response_model=SaveResponse[SalesModel])
+async def save_sales(
+    sales: SalesModel,
+    session: Session = Depends(get_session),
+):
+    try:
+        # a batch session commits on its own, possibly as part of its transaction
+        if get_settings().group_commit and shared_session.get() is None:
+            # committed together with concurrent saves
+            sales_id, changed = await write_queue.submit(partial(_write_sales, sales=sales))
+        else:
+            sales_id, changed = _write_sales(session, sales)
+            session.commit()
+
+    except ConflictError:
+        session.rollback()
+        raise
+
+    except Exception as ex:
+        session.rollback()
+        return SaveResponse[SalesModel](success=False, error=str(ex))
+
+    broker.publish('sales', sales_id)
+    broker.publish_stock(session, changed)
+    session.expire_all()
+    return SaveResponse[SalesModel](
+        data=SalesModel.from_orm(session.get(Sales, sales_id))
+    )
+
+
+def _import_tokopedia(
+    session: Session, xlsx_file, market_place_id: Optional[int], on_duplicate: str,
+) -> SalesImportResultModel:
+    rows = sales_import.read_tokopedia_xlsx(xlsx_file)
+    if market_place_id is None:
+        market_place_id = sales_import.get_market_place_id(session)
+    return sales_import.import_sales(session, rows, market_place_id, on_duplicate)
+
+
+@router.post('/import-tokopedia', response_model=SalesImportResultModel)
 async def tokopedia_xlsx(
-    xlsx_file: UploadFile,
+    xlsx_file: UploadFile = File(...),
+    marketPlaceId: Optional[int] = None,
+    onDuplicate: str = 'skip',
+    session: Session = Depends(get_session),
+):
+    """Import a Tokopedia order export, invoices imported before are skipped unless
+    ``onDuplicate=update`` and their lines changed.
+    """
+    try:
+        return await run_in_threadpool(_import_tokopedia, session, xlsx_file.file, marketPlaceId, onDuplicate)
+    except ValueError as ex:
+        session.rollback()
+        raise HTTPException(status_code=400, detail=str(ex))
+
+
+@router.post('/item-mapping', response_model=SaveResponse[ItemMappingModel])
+async def save_item_mapping(
+    mapping: ItemMappingModel,
     session: Session = Depends(get_session),
 ):
-    pass
+    """Remember the item of an unmatched export row for the next imports."""
+    try:
+        if mapping.sku:
+            external_key = sku_key(mapping.sku)
+        elif mapping.productName:
+            external_key = name_key(mapping.productName)
+        else:
+            raise Exception('Either sku or productName is required')
+
+        item_mapping: ItemMapping = session.execute(
+            select(ItemMapping).where(
+                and_(
+                    ItemMapping.marketPlaceId == mapping.marketPlaceId,
+                    ItemMapping.externalKey == external_key,
+                )
+            )
+        ).scalar_one_or_none()
+
+        if item_mapping is None:
+            item_mapping = ItemMapping(marketPlaceId=mapping.marketPlaceId, externalKey=external_key)
+            session.add(item_mapping)
+        item_mapping.itemId = mapping.itemId
+        session.commit()
+
+        return SaveResponse[ItemMappingModel](data=mapping)
+    except Exception as ex:
+        session.rollback()
+        return SaveResponse[ItemMappingModel](success=False, error=str(ex))
@@ -0,0 +1,55 @@
+import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from ..db.connection import get_session
+from .. import snapshot
+
+
+router = APIRouter(
+    prefix='/snapshot',
+    tags=['snapshot'],
+)
+
+
+@router.post('/export', response_model=dict)
+async def export_snapshot(
+    session: Session = Depends(get_session),
+):
+    try:
+        result = await run_in_threadpool(snapshot.export_snapshot, session)
+    except snapshot.ExportBusy as ex:
+        raise HTTPException(status_code=409, detail=str(ex))
+    return {name: export._asdict() for name, export in result.items()}
+
+
+@router.get('/query', response_model=List[dict])
+async def query_snapshot(
+    dataset: str,
+    groupBy: List[str] = Query([]),
+    metric: List[str] = Query(['sum:quantity']),
+    dateFrom: Optional[datetime.date] = None,
+    dateTo: Optional[datetime.date] = None,
+    itemId: Optional[int] = None,
+    marketPlaceId: Optional[int] = None,
+    journalType: Optional[str] = None,
+):
+    """Aggregate the Parquet snapshot, the database is not queried.
+
+    ``metric`` is ``<sum|count|mean|min|max>:<column>``, e.g.
+    ``/snapshot/query?dataset=sales&groupBy=month&groupBy=itemId&metric=sum:amount``.
+    """
+    try:
+        return await run_in_threadpool(
+            snapshot.query_snapshot,
+            dataset,
+            groupBy,
+            metric,
+            date_from=dateFrom,
+            date_to=dateTo,
+            filters={'itemId': itemId, 'marketPlaceId': marketPlaceId, 'journalType': journalType},
+        )
+    except ValueError as ex:
+        raise HTTPException(status_code=400, detail=str(ex))
@@ -0,0 +1,77 @@
+from typing import List
+from fastapi import APIRouter, Depends
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..db.connection import get_session
+from ..db.changes import current_change_seq
+from ..db.schema import ItemCategory, Item, MarketPlace, Purchase, PurchaseD, Sales, SalesD, DeletedRow
+from ..model.sync import SyncResponse
+
+
+router = APIRouter(
+    prefix='/sync',
+    tags=['sync'],
+)
+
+
+# response field -> change tracked table
+SYNC_TABLES = {
+    'itemCategories': ItemCategory,
+    'items': Item,
+    'marketPlaces': MarketPlace,
+    'purchases': Purchase,
+    'purchaseDetails': PurchaseD,
+    'sales': Sales,
+    'salesDetails': SalesD,
+    'deleted': DeletedRow,
+}
+
+
+@router.get('', response_model=SyncResponse)
+async def get_changes(
+    since: int = 0,
+    limit: int = 1000,
+    session: Session = Depends(get_session),
+):
+    # rows are read as plain columns, relationships are synced as their own tables
+    seq = current_change_seq(session)
+    changes = {}
+    # per truncated table, the seq up to which all its rows were sent
+    complete: List[int] = []
+    for field, model in SYNC_TABLES.items():
+        rows = session.execute(
+            select(
+                *model.__table__.columns
+            ).where(
+                model.changeSeq > since
+            ).order_by(
+                model.changeSeq, model.id
+            ).limit(limit)
+        ).all()
+        if len(rows) == limit:
+            # a transaction gives all its rows one seq, so the page may end inside
+            # a seq group: drop that group, it is sent whole on the next call
+            boundary = rows[-1].changeSeq
+            rows = [row for row in rows if row.changeSeq < boundary]
+            if rows:
+                complete.append(boundary - 1)
+            else:
+                # one group fills the page, send all of it past the limit
+                rows = session.execute(
+                    select(
+                        *model.__table__.columns
+                    ).where(
+                        model.changeSeq == boundary
+                    ).order_by(
+                        model.id
+                    )
+                ).all()
+                complete.append(boundary)
+        changes[field] = rows
+
+    if complete:
+        # resume after the shortest table, rows already sent past it are just sent again
+        seq = min(complete)
+
+    return SyncResponse(seq=seq, more=bool(complete), **changes)
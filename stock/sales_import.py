@@ -0,0 +1,332 @@
+"""Import of marketplace sales exports (Tokopedia xlsx) as posted sales documents.
+
+Rows are grouped by invoice into one ``Sales`` per invoice. Items are resolved
+with an ``ItemMatcher`` loaded once per import; invoices with an unmatched row are
+skipped and reported with candidate items so they can be mapped and re-imported.
+
+Imports are idempotent: invoices already stored (looked up for the date range of
+the file, then by code for the rest) are skipped, or replaced when their lines changed and the
+import runs with ``on_duplicate='update'``.
+"""
+from typing import BinaryIO, Counter, Dict, List, NamedTuple, Optional, Tuple
+import collections
+import datetime
+import re
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.orm import Session
+
+from .db.changes import record_deleted
+from .db.schema import Item, MarketPlace, Sales, SalesD
+from .db.utils import chunked
+from .events import broker
+from .matching import ItemMatcher
+from .model.item import ItemSuggestionModel
+from .model.sales import SalesImportResultModel, UnmatchedRowModel
+from . import journal
+
+
+TOKOPEDIA = 'Tokopedia'
+
+# field -> accepted header names, first found wins
+COLUMNS = {
+    'code': ['Nomor Invoice', 'Invoice'],
+    'date': ['Tanggal Pembayaran', 'Tanggal Pesanan', 'Payment Date', 'Order Date'],
+    'sku': ['Nomor SKU', 'SKU'],
+    'productName': ['Nama Produk', 'Product Name'],
+    'quantity': ['Jumlah Produk Dibeli', 'Jumlah', 'Quantity'],
+    'unitPrice': ['Harga Jual (IDR)', 'Harga Satuan', 'Price'],
+}
+REQUIRED = ('code', 'date', 'quantity')
+ON_DUPLICATE = ('skip', 'update')
+DATE_FORMATS = ('%d-%m-%Y %H:%M:%S', '%d-%m-%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%d/%m/%Y')
+
+
+class ImportRow(NamedTuple):
+    code: str
+    date: datetime.date
+    sku: Optional[str]
+    productName: Optional[str]
+    quantity: Decimal
+    unitPrice: Optional[Decimal]
+
+
+def parse_date(value) -> datetime.date:
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    text = str(value).strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError('Invalid date {!r}'.format(value))
+
+
+def parse_number(value) -> Optional[Decimal]:
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value))
+    # 'Rp 12.500' style, dots are thousand separators
+    text = re.sub(r'[^0-9,-]', '', str(value)).replace(',', '.')
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        raise ValueError('Invalid number {!r}'.format(value))
+
+
+def _find_columns(values) -> Optional[Dict[str, int]]:
+    names = {str(value).strip().lower(): index for index, value in enumerate(values) if value is not None}
+    positions = {}
+    for field, aliases in COLUMNS.items():
+        for alias in aliases:
+            if alias.lower() in names:
+                positions[field] = names[alias.lower()]
+                break
+    if all(field in positions for field in REQUIRED) and ('sku' in positions or 'productName' in positions):
+        return positions
+    return None
+
+
+def read_tokopedia_xlsx(source: BinaryIO) -> List[ImportRow]:
+    """Rows of the first sheet below the header row, leading title rows are skipped."""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = []
+        positions = None
+        for line, values in enumerate(workbook.active.iter_rows(values_only=True), start=1):
+            if positions is None:
+                positions = _find_columns(values)
+                continue
+
+            def cell(field):
+                index = positions.get(field)
+                value = values[index] if index is not None and index < len(values) else None
+                return value.strip() if isinstance(value, str) else value
+
+            if not cell('code'):
+                continue
+            try:
+                rows.append(ImportRow(
+                    code=str(cell('code')),
+                    date=parse_date(cell('date')),
+                    sku=str(cell('sku')) if cell('sku') else None,
+                    productName=cell('productName') or None,
+                    quantity=parse_number(cell('quantity')) or Decimal(0),
+                    unitPrice=parse_number(cell('unitPrice')),
+                ))
+            except ValueError as ex:
+                raise ValueError('Row {}: {}'.format(line, ex))
+    finally:
+        workbook.close()
+
+    if positions is None:
+        raise ValueError('Header row not found, expected columns {}'.format(
+            ', '.join(aliases[0] for aliases in COLUMNS.values())
+        ))
+    return rows
+
+
+def get_market_place_id(session: Session, name: str = TOKOPEDIA) -> int:
+    market_place_id = session.execute(
+        select(MarketPlace.id).where(MarketPlace.name == name)
+    ).scalar()
+    if market_place_id is None:
+        market_place = MarketPlace(name=name)
+        session.add(market_place)
+        session.flush()
+        market_place_id = market_place.id
+    return market_place_id
+
+
+Lines = Counter[Tuple[int, Decimal, Optional[Decimal]]]
+
+
+def _lines(item_ids: List[int], rows: List[ImportRow]) -> Lines:
+    return collections.Counter(
+        (item_id, Decimal(row.quantity), None if row.unitPrice is None else Decimal(row.unitPrice))
+        for item_id, row in zip(item_ids, rows)
+    )
+
+
+def load_existing(
+    session: Session, codes: List[str], date_from: datetime.date, date_to: datetime.date,
+) -> Dict[str, Tuple[int, datetime.date]]:
+    """Invoice code -> (sales id, date) of the stored sales among ``codes``.
+
+    The sales of the file's date range are read with one range query, codes not
+    found there (stored with another date) are then looked up by code.
+    """
+    existing = {
+        code: (sales_id, date)
+        for code, sales_id, date in session.execute(
+            select(
+                Sales.code, Sales.id, Sales.date,
+            ).where(
+                Sales.date.between(date_from, date_to)
+            )
+        )
+    }
+    for chunk in chunked([code for code in codes if code not in existing]):
+        existing.update(
+            (code, (sales_id, date))
+            for code, sales_id, date in session.execute(
+                select(
+                    Sales.code, Sales.id, Sales.date,
+                ).where(
+                    Sales.code.in_(chunk)
+                )
+            )
+        )
+    return existing
+
+
+def load_lines(session: Session, sales_ids: List[int]) -> Dict[int, Lines]:
+    lines: Dict[int, Lines] = collections.defaultdict(collections.Counter)
+    for chunk in chunked(sales_ids):
+        for sales_id, item_id, quantity, unit_price in session.execute(
+            select(
+                SalesD.salesId, SalesD.itemId, SalesD.quantity, SalesD.unitPrice,
+            ).where(
+                SalesD.salesId.in_(chunk)
+            )
+        ):
+            lines[sales_id][(item_id, Decimal(quantity), None if unit_price is None else Decimal(unit_price))] += 1
+    return lines
+
+
+def _replace_documents(session: Session, changed: List[Tuple[int, datetime.date, List[int], List[ImportRow]]]) -> journal.Posted:
+    """Swap the lines of stored invoices for the imported ones, returns what was unposted."""
+    unposted: journal.Posted = {}
+    for sales_id, date, _, _ in changed:
+        for item_id, (quantity, since) in journal.unpost_document(session, Sales, sales_id).items():
+            previous_quantity, previous_date = unposted.get(item_id, (Decimal(0), since))
+            unposted[item_id] = (previous_quantity + quantity, min(previous_date, since))
+        session.execute(
+            update(Sales).where(
+                Sales.id == sales_id
+            ).values(
+                date=date,
+                version=Sales.version + 1,
+            )
+        )
+
+    sales_ids = [sales_id for sales_id, _, _, _ in changed]
+    for chunk in chunked(sales_ids):
+        detail_ids = session.execute(
+            select(SalesD.id).where(SalesD.salesId.in_(chunk))
+        ).scalars().all()
+        record_deleted(session, SalesD, detail_ids)
+        session.execute(
+            delete(SalesD).where(SalesD.salesId.in_(chunk)).execution_options(synchronize_session=False)
+        )
+    session.execute(insert(SalesD), [
+        {'salesId': sales_id, 'itemId': item_id, 'quantity': row.quantity, 'unitPrice': row.unitPrice}
+        for sales_id, _, item_ids, rows in changed
+        for item_id, row in zip(item_ids, rows)
+    ])
+    return unposted
+
+
+def import_sales(
+    session: Session,
+    rows: List[ImportRow],
+    market_place_id: int,
+    on_duplicate: str = 'skip',
+) -> SalesImportResultModel:
+    """Insert and post one sales document per new invoice, commits.
+
+    Invoices already stored are skipped when unchanged, with ``on_duplicate='update'``
+    changed ones get the imported lines and are reposted.
+    """
+    if on_duplicate not in ON_DUPLICATE:
+        raise ValueError('on_duplicate must be one of {}'.format(', '.join(ON_DUPLICATE)))
+
+    result = SalesImportResultModel(marketPlaceId=market_place_id, rows=len(rows))
+    if not rows:
+        return result
+    matcher = ItemMatcher.load(session, market_place_id)
+
+    invoices: Dict[str, List[ImportRow]] = {}
+    for row in rows:
+        invoices.setdefault(row.code, []).append(row)
+
+    existing = load_existing(
+        session, list(invoices), min(row.date for row in rows), max(row.date for row in rows),
+    )
+    stored_lines = load_lines(
+        session, [existing[code][0] for code in invoices if code in existing],
+    ) if on_duplicate == 'update' else {}
+
+    documents = []
+    changed = []
+    unmatched = []
+    for code, invoice_rows in invoices.items():
+        if code in existing and on_duplicate == 'skip':
+            result.skipped += 1
+            continue
+
+        item_ids = [matcher.match(row.sku, row.productName) for row in invoice_rows]
+        if None in item_ids:
+            unmatched.extend(
+                (row, [item_id for item_id, _ in matcher.candidates(row.productName)])
+                for row, item_id in zip(invoice_rows, item_ids) if item_id is None
+            )
+            continue
+
+        date = invoice_rows[0].date
+        if code in existing:
+            sales_id, stored_date = existing[code]
+            if stored_date == date and stored_lines.get(sales_id) == _lines(item_ids, invoice_rows):
+                result.skipped += 1
+            else:
+                changed.append((sales_id, date, item_ids, invoice_rows))
+            continue
+
+        documents.append(Sales(
+            code=code,
+            date=date,
+            marketPlaceId=market_place_id,
+            details=[
+                SalesD(itemId=item_id, quantity=row.quantity, unitPrice=row.unitPrice)
+                for row, item_id in zip(invoice_rows, item_ids)
+            ],
+        ))
+
+    if unmatched:
+        candidate_ids = {item_id for _, item_ids in unmatched for item_id in item_ids}
+        items = {
+            row.id: ItemSuggestionModel(id=row.id, code=row.code, name=row.name)
+            for row in session.execute(
+                select(Item.id, Item.code, Item.name).where(Item.id.in_(candidate_ids))
+            )
+        } if candidate_ids else {}
+        result.unmatched = [
+            UnmatchedRowModel(
+                code=row.code,
+                sku=row.sku,
+                productName=row.productName,
+                candidates=[items[item_id] for item_id in item_ids],
+            )
+            for row, item_ids in unmatched
+        ]
+
+    unposted = _replace_documents(session, changed) if changed else None
+    if documents:
+        session.add_all(documents)
+        session.flush()
+    sales_ids = [document.id for document in documents] + [sales_id for sales_id, _, _, _ in changed]
+    stock_changes = journal.post_documents(session, Sales, sales_ids, unposted) if sales_ids else {}
+    session.commit()
+
+    broker.publish_many([{'entity': 'sales', 'rowId': sales_id} for sales_id in sales_ids])
+    broker.publish_stock(session, stock_changes)
+
+    result.inserted = len(documents)
+    result.updated = len(changed)
+    return result
@@ -0,0 +1,124 @@
+"""In-memory prefix index over item code and name tokens for autocomplete.
+
+Each worker process keeps its own index: it is built at startup, updated by
+``save_item`` directly and caught up with saves from other workers by
+``refresh``, which reads only items whose changeSeq moved.
+"""
+from typing import Dict, Iterable, List, Set, Tuple
+import re
+import threading
+from bisect import bisect_left, insort
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from .db.connection import engine
+from .db.schema import Item
+
+
+TOKEN = re.compile(r'[0-9a-z]+')
+
+
+def tokenize(text: str) -> Set[str]:
+    return set(TOKEN.findall((text or '').lower()))
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # item id -> (code, name)
+        self.items: Dict[int, Tuple[str, str]] = {}
+        # sorted (token, item id) pairs, tokens sharing a prefix are adjacent
+        self.keys: List[Tuple[str, int]] = []
+        self.change_seq = 0
+
+    def _tokens(self, code: str, name: str) -> Set[str]:
+        return tokenize(code) | tokenize(name)
+
+    def _remove(self, item_id: int) -> None:
+        code, name = self.items.pop(item_id)
+        for token in self._tokens(code, name):
+            position = bisect_left(self.keys, (token, item_id))
+            if position < len(self.keys) and self.keys[position] == (token, item_id):
+                del self.keys[position]
+
+    def build(self, rows: Iterable[Tuple[int, str, str]], change_seq: int = 0) -> None:
+        items = {item_id: (code, name) for item_id, code, name in rows}
+        keys = sorted(
+            (token, item_id)
+            for item_id, (code, name) in items.items()
+            for token in self._tokens(code, name)
+        )
+        with self.lock:
+            self.items, self.keys, self.change_seq = items, keys, change_seq
+
+    def upsert(self, item_id: int, code: str, name: str, is_active: bool = True) -> None:
+        with self.lock:
+            if item_id in self.items:
+                self._remove(item_id)
+            if is_active:
+                self.items[item_id] = (code, name)
+                for token in self._tokens(code, name):
+                    insort(self.keys, (token, item_id))
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Tuple[int, str, str]]:
+        words = sorted(tokenize(prefix), key=len, reverse=True)
+        if not words:
+            return []
+
+        with self.lock:
+            candidates = None
+            # the longest word is the most selective, the others filter its matches
+            for word in words:
+                matches = set()
+                position = bisect_left(self.keys, (word, -1))
+                while position < len(self.keys) and self.keys[position][0].startswith(word):
+                    matches.add(self.keys[position][1])
+                    position += 1
+                candidates = matches if candidates is None else candidates & matches
+                if not candidates:
+                    return []
+            found = [(item_id, *self.items[item_id]) for item_id in candidates]
+
+        needle = prefix.strip().lower()
+        found.sort(key=lambda row: (
+            not (row[1] or '').lower().startswith(needle),
+            not (row[2] or '').lower().startswith(needle),
+            row[1],
+        ))
+        return found[:limit]
+
+    def load(self, session: Session) -> None:
+        change_seq = session.execute(select(func.coalesce(func.max(Item.changeSeq), 0))).scalar_one()
+        rows = session.execute(
+            select(Item.id, Item.code, Item.name).where(Item.isActive.is_(True))
+        ).all()
+        self.build(rows, change_seq)
+
+    def refresh(self, session: Session) -> int:
+        """Apply items changed since the last load or refresh, returns the number applied."""
+        rows = session.execute(
+            select(
+                Item.id, Item.code, Item.name, Item.isActive, Item.changeSeq,
+            ).where(
+                Item.changeSeq > self.change_seq
+            ).order_by(
+                Item.changeSeq
+            )
+        ).all()
+        for item_id, code, name, is_active, change_seq in rows:
+            self.upsert(item_id, code, name, is_active)
+            self.change_seq = max(self.change_seq, change_seq)
+        return len(rows)
+
+
+item_index = PrefixIndex()
+
+
+def load_item_index() -> None:
+    with Session(engine) as session:
+        item_index.load(session)
+
+
+def refresh_item_index() -> None:
+    with Session(engine) as session:
+        item_index.refresh(session)
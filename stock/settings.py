@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pathlib import Path
 from functools import lru_cache
 from pydantic import BaseSettings
@@ -14,6 +14,33 @@ class Settings(BaseSettings):
     db_database: str = 'test'
     db_user: str = 'user'
     db_password: Optional[str] = None
+    valuation_method: str = 'average'
+    gzip_minimum_size: int = 1024
+    image_max_size: int = 10_000_000
+    image_import_max_size: int = 1_000_000_000
+    image_dir: Optional[str] = None
+    snapshot_dir: Optional[str] = None
+    search_refresh_interval: float = 5.0
+    admission_limit: int = 16
+    admission_queue: int = 64
+    admission_heavy_limit: int = 2
+    admission_heavy_queue: int = 4
+    admission_queue_timeout: float = 10.0
+    admission_retry_after: int = 5
+    # comma separated client addresses allowed to request profiles
+    profile_allowed_clients: str = '127.0.0.1'
+    profile_sample_rate: float = 0.0
+    profile_interval: float = 0.005
+    graphql_max_depth: int = 6
+    graphql_max_tokens: int = 2000
+    graphql_max_aliases: int = 15
+    # every transaction writing a tracked table locks the change seq counter row
+    # until commit, so on MySQL such writers commit one at a time and throughput
+    # is bounded by commit latency; group commit shares one commit between writes
+    group_commit: bool = False
+    group_commit_delay: float = 0.005
+    group_commit_max_batch: int = 50
+    single_flight: bool = True
 
     class Config:
         env_file = Path(__file__).parent / '.env'
@@ -21,6 +48,8 @@ class Settings(BaseSettings):
     def save(self) -> None:
         with open(self.Config.env_file, 'wt') as out:
             for key, value in self.dict().items():
+                if value is None:
+                    continue
                 out.write('{}={!r}\n'.format(key.upper(), value))
 
     def generate_secret_key(self):
@@ -40,6 +69,27 @@ class Settings(BaseSettings):
         fernet = Fernet(self.secret_key.encode('utf-8'))
         self.db_password = fernet.encrypt(password.encode('utf-8')).decode('utf-8')
 
+    def get_profile_allowed_clients(self) -> List[str]:
+        return [client.strip() for client in self.profile_allowed_clients.split(',') if client.strip()]
+
+    def get_image_dir(self) -> Path:
+        if self.image_dir:
+            image_path = Path(self.image_dir)
+        else:
+            image_path = Path(__file__).parent.parent / 'storage' / 'images'
+        if not image_path.exists():
+            image_path.mkdir(parents=True)
+        return image_path
+
+    def get_snapshot_dir(self) -> Path:
+        if self.snapshot_dir:
+            snapshot_path = Path(self.snapshot_dir)
+        else:
+            snapshot_path = Path(__file__).parent.parent / 'storage' / 'snapshot'
+        if not snapshot_path.exists():
+            snapshot_path.mkdir(parents=True)
+        return snapshot_path
+
     def get_db_url(self) -> URL:
         if self.db_driver == 'mysql':
             password = self.get_password()
@@ -0,0 +1,389 @@
+"""Columnar snapshot of sales, purchases and the item journal for analytics.
+
+``export_snapshot`` writes Parquet files under ``Settings.get_snapshot_dir()``,
+one directory per dataset and month (``sales/month=2026-10/part-000042.parquet``).
+Each export reads one consistent database snapshot and only touches the months
+that changed since the last watermark (``state.json``):
+
+* documents whose header or details moved past the saved change sequence are
+  appended to their month as a new part, unless the month already holds rows of
+  those documents (an edit or a date change), then the month is rewritten
+* journal rows above the saved journal id are appended the same way, months
+  rewritten for documents are rewritten for the journal too, since reposting
+  deleted the journal rows those months held
+
+Closed periods are read from ``titemjournalarchive``, so a closed month holds
+both its rows and the 'Ending Balance' rows summing them up; filter by
+``journalType`` when summing across a close.
+
+``query_snapshot`` aggregates the files with Arrow's vectorized scans and never
+touches the database.
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+import datetime
+import json
+import os
+import threading
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import select, func, union_all
+from sqlalchemy.orm import Session
+
+from .db.changes import current_change_seq
+from .db.schema import ItemJournal, ItemJournalArchive, Purchase, PurchaseD, Sales, SalesD
+from .db.utils import chunked
+from .period_close import get_closed_date
+from .settings import get_settings
+
+
+STATE_FILE = 'state.json'
+UNDATED = 'undated'
+METRICS = ('sum', 'count', 'mean', 'min', 'max')
+
+# dataset -> (header, detail, detail header fk, header key in the files)
+DOCUMENTS = {
+    'sales': (Sales, SalesD, SalesD.salesId, 'salesId'),
+    'purchases': (Purchase, PurchaseD, PurchaseD.purchaseId, 'purchaseId'),
+}
+
+DOCUMENT_FIELDS = [
+    ('code', pa.string()),
+    ('date', pa.date32()),
+    ('marketPlaceId', pa.int64()),
+    ('itemId', pa.int64()),
+    ('quantity', pa.float64()),
+    ('unitPrice', pa.float64()),
+    ('amount', pa.float64()),
+]
+
+JOURNAL_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('itemId', pa.int64()),
+    ('date', pa.date32()),
+    ('quantity', pa.float64()),
+    ('value', pa.float64()),
+    ('journalType', pa.string()),
+    ('refCode', pa.string()),
+    ('salesDId', pa.int64()),
+    ('purchaseDId', pa.int64()),
+])
+
+PARTITIONING = ds.partitioning(pa.schema([('month', pa.string())]), flavor='hive')
+
+_export_lock = threading.Lock()
+
+
+class ExportBusy(Exception):
+    pass
+
+
+class DatasetExport(NamedTuple):
+    rewritten: List[str]
+    appended: List[str]
+    rows: int
+
+
+def document_schema(header_key: str) -> pa.Schema:
+    return pa.schema([('id', pa.int64()), (header_key, pa.int64())] + DOCUMENT_FIELDS)
+
+
+def month_key(date: Optional[datetime.date]) -> str:
+    return date.strftime('%Y-%m') if date is not None else UNDATED
+
+
+def month_range(month: str) -> Tuple[datetime.date, datetime.date]:
+    """[first day, first day of the next month) of a month key."""
+    start = datetime.date.fromisoformat(month + '-01')
+    return start, (start + datetime.timedelta(days=32)).replace(day=1)
+
+
+def to_table(rows: List[tuple], schema: pa.Schema) -> pa.Table:
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    arrays = []
+    for field, values in zip(schema, columns):
+        if pa.types.is_floating(field.type):
+            # Numeric columns come as Decimal, analytics work on doubles
+            values = [None if value is None else float(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def load_state(root: Path) -> dict:
+    path = root / STATE_FILE
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def save_state(root: Path, state: dict) -> None:
+    temp_name = root / (STATE_FILE + '.tmp')
+    temp_name.write_text(json.dumps(state, indent=2))
+    os.replace(temp_name, root / STATE_FILE)
+
+
+def partition_dir(root: Path, dataset: str, month: str) -> Path:
+    return root / dataset / 'month={}'.format(month)
+
+
+def existing_months(root: Path, dataset: str) -> Set[str]:
+    return {path.name[len('month='):] for path in (root / dataset).glob('month=*') if path.is_dir()}
+
+
+def write_part(directory: Path, table: pa.Table, part: str, replace: bool) -> None:
+    """Write ``table`` as a new part of a month, ``replace`` drops the older parts."""
+    old_parts = list(directory.glob('part-*.parquet')) if replace else []
+    if table.num_rows:
+        directory.mkdir(parents=True, exist_ok=True)
+        temp_name = directory / (part + '.tmp')
+        pq.write_table(table, temp_name)
+        os.replace(temp_name, directory / part)
+    for path in old_parts:
+        if path.name != part:
+            path.unlink()
+    if replace and directory.exists() and not any(directory.iterdir()):
+        directory.rmdir()
+
+
+def snapshot_months(root: Path, dataset: str, column: str, ids: Iterable[int]) -> Set[str]:
+    """Months of the snapshot holding rows with ``column`` in ``ids``."""
+    if not (root / dataset).exists():
+        return set()
+    source = ds.dataset(root / dataset, format='parquet', partitioning=PARTITIONING)
+    months: Set[str] = set()
+    for chunk in chunked(list(ids), 10_000):
+        table = source.to_table(columns=['month'], filter=ds.field(column).isin(chunk))
+        months.update(table.column('month').unique().to_pylist())
+    return months
+
+
+def month_condition(column, month: str):
+    if month == UNDATED:
+        return column.is_(None)
+    start, end = month_range(month)
+    return (column >= start) & (column < end)
+
+
+def document_rows(session: Session, dataset: str, month: str, header_ids: Optional[List[int]] = None) -> pa.Table:
+    header, detail, detail_fk, header_key = DOCUMENTS[dataset]
+    statement = select(
+        detail.id, header.id, header.code, header.date, header.marketPlaceId,
+        detail.itemId, detail.quantity, detail.unitPrice, detail.quantity * detail.unitPrice,
+    ).join(
+        header, detail_fk == header.id
+    ).where(
+        month_condition(header.date, month)
+    ).order_by(detail.id)
+
+    if header_ids is None:
+        rows = session.execute(statement).all()
+    else:
+        rows = []
+        for chunk in chunked(header_ids):
+            rows.extend(session.execute(statement.where(header.id.in_(chunk))).all())
+    return to_table(rows, document_schema(header_key))
+
+
+def changed_documents(session: Session, dataset: str, since: int) -> Dict[int, Optional[datetime.date]]:
+    """{header id: date} of documents whose header or details changed after ``since``."""
+    header, detail, detail_fk, _ = DOCUMENTS[dataset]
+    changed = dict(
+        session.execute(select(header.id, header.date).where(header.changeSeq > since)).all()
+    )
+    changed.update(
+        session.execute(
+            select(header.id, header.date).join(
+                detail, detail_fk == header.id
+            ).where(
+                detail.changeSeq > since
+            ).distinct()
+        ).all()
+    )
+    return changed
+
+
+def export_documents(session: Session, root: Path, dataset: str, since: int, part: str) -> Tuple[DatasetExport, Set[str]]:
+    """Export changed documents, returns the result and the rewritten months."""
+    header_key = DOCUMENTS[dataset][3]
+    changed = changed_documents(session, dataset, since)
+    if not changed:
+        return DatasetExport([], [], 0), set()
+
+    existing = existing_months(root, dataset)
+    old = snapshot_months(root, dataset, header_key, changed)
+    new: Dict[str, List[int]] = {}
+    for header_id, date in changed.items():
+        new.setdefault(month_key(date), []).append(header_id)
+
+    rewrite = sorted(old | (set(new) - existing))
+    append = sorted(set(new) & existing - old)
+    rows = 0
+    for month in rewrite:
+        table = document_rows(session, dataset, month)
+        write_part(partition_dir(root, dataset, month), table, part, replace=True)
+        rows += table.num_rows
+    for month in append:
+        table = document_rows(session, dataset, month, new[month])
+        write_part(partition_dir(root, dataset, month), table, part, replace=False)
+        rows += table.num_rows
+    return DatasetExport(rewrite, append, rows), set(rewrite)
+
+
+def journal_rows(session: Session, month: str, closed_date: Optional[datetime.date], after_id: int = 0, to_id: Optional[int] = None) -> pa.Table:
+    """Journal rows of a month, only ids in (``after_id``, ``to_id``] when ``to_id`` is given."""
+    statements = []
+    sources = [ItemJournal]
+    # archived rows are never new, only a whole month includes them
+    if to_id is None and closed_date is not None and month_range(month)[0] <= closed_date:
+        sources.append(ItemJournalArchive)
+    for source in sources:
+        statement = select(
+            source.id, source.itemId, source.date, source.quantity, source.value,
+            source.journalType, source.refCode, source.salesDId, source.purchaseDId,
+        ).where(
+            month_condition(source.date, month),
+            source.id > after_id,
+        )
+        if to_id is not None:
+            statement = statement.where(source.id <= to_id)
+        statements.append(statement)
+    statement = statements[0] if len(statements) == 1 else union_all(*statements)
+    rows = session.execute(statement).all()
+    return to_table(sorted(rows, key=lambda row: row[0]), JOURNAL_SCHEMA)
+
+
+def export_journal(
+    session: Session, root: Path, since_id: int, to_id: int, document_months: Set[str], part: str,
+) -> DatasetExport:
+    closed_date = get_closed_date(session)
+    new = {
+        month_key(date) for date in session.execute(
+            select(ItemJournal.date).where(ItemJournal.id > since_id, ItemJournal.id <= to_id).distinct()
+        ).scalars()
+    }
+    if since_id == 0:
+        # first export, months closed before it only exist in the archive
+        new.update(
+            month_key(date) for date in session.execute(select(ItemJournalArchive.date).distinct()).scalars()
+        )
+
+    existing = existing_months(root, 'journal')
+    # journal rows always have a date
+    document_months = document_months - {UNDATED}
+    rewrite = sorted(document_months | (new - existing))
+    append = sorted(new & existing - document_months)
+    rows = 0
+    for month in rewrite:
+        table = journal_rows(session, month, closed_date)
+        write_part(partition_dir(root, 'journal', month), table, part, replace=True)
+        rows += table.num_rows
+    for month in append:
+        table = journal_rows(session, month, closed_date, since_id, to_id)
+        write_part(partition_dir(root, 'journal', month), table, part, replace=False)
+        rows += table.num_rows
+    return DatasetExport(rewrite, append, rows)
+
+
+def export_snapshot(session: Session, root: Optional[Path] = None) -> Dict[str, DatasetExport]:
+    """Export rows changed since the last export, blocking, run it in a thread pool.
+
+    All reads happen in the transaction of ``session``, so the saved watermark
+    matches exactly what was written.
+    """
+    root = root or get_settings().get_snapshot_dir()
+    if not _export_lock.acquire(blocking=False):
+        raise ExportBusy('Snapshot export is already running')
+    try:
+        state = load_state(root)
+        since = state.get('changeSeq', 0)
+        since_journal_id = state.get('journalId', 0)
+        exports = state.get('exports', 0) + 1
+        part = 'part-{:06d}.parquet'.format(exports)
+
+        seq = current_change_seq(session)
+        journal_id = session.execute(select(func.max(ItemJournal.id))).scalar() or 0
+
+        result = {}
+        document_months: Set[str] = set()
+        for dataset in DOCUMENTS:
+            result[dataset], months = export_documents(session, root, dataset, since, part)
+            document_months |= months
+        result['journal'] = export_journal(session, root, since_journal_id, journal_id, document_months, part)
+
+        save_state(root, {
+            'changeSeq': seq,
+            'journalId': max(journal_id, since_journal_id),
+            'exports': exports,
+            'exportedAt': datetime.datetime.now().isoformat(timespec='seconds'),
+        })
+        session.rollback()
+        return result
+    finally:
+        _export_lock.release()
+
+
+def parse_metric(metric: str) -> Tuple[str, str]:
+    """'sum:quantity' -> ('quantity', 'sum'), a bare 'count' counts rows."""
+    function, _, column = metric.partition(':')
+    if function not in METRICS:
+        raise ValueError('Unknown metric {}, use one of {}'.format(function, ', '.join(METRICS)))
+    return column or 'id', function
+
+
+def query_snapshot(
+    dataset: str,
+    group_by: List[str],
+    metrics: List[str],
+    date_from: Optional[datetime.date] = None,
+    date_to: Optional[datetime.date] = None,
+    filters: Optional[Dict[str, object]] = None,
+    root: Optional[Path] = None,
+) -> List[dict]:
+    """Aggregate a dataset of the snapshot, one dict per group, sorted by the group columns.
+
+    ``filters`` are equality filters ({column: value}), None values are ignored.
+    """
+    if dataset not in list(DOCUMENTS) + ['journal']:
+        raise ValueError('Unknown dataset {}'.format(dataset))
+    directory = (root or get_settings().get_snapshot_dir()) / dataset
+    if not directory.exists():
+        return []
+
+    source = ds.dataset(directory, format='parquet', partitioning=PARTITIONING)
+    names = set(source.schema.names)
+    aggregations = [parse_metric(metric) for metric in metrics]
+    filters = {column: value for column, value in (filters or {}).items() if value is not None}
+    for column in list(group_by) + [column for column, _ in aggregations] + list(filters):
+        if column not in names:
+            raise ValueError('Unknown column {} in {}'.format(column, dataset))
+
+    condition = None
+    conditions = [ds.field(column) == value for column, value in filters.items()]
+    if date_from is not None:
+        # the month condition prunes whole partitions before any file is read
+        conditions += [ds.field('month') >= month_key(date_from), ds.field('date') >= date_from]
+    if date_to is not None:
+        conditions += [ds.field('month') <= month_key(date_to), ds.field('date') <= date_to]
+    for expression in conditions:
+        condition = expression if condition is None else condition & expression
+
+    columns = sorted(set(group_by) | {column for column, _ in aggregations})
+    table = source.to_table(columns=columns, filter=condition)
+    result = table.group_by(group_by).aggregate(aggregations)
+    if group_by and result.num_rows:
+        result = result.sort_by([(column, 'ascending') for column in group_by])
+    return result.to_pylist()
+
+
+if __name__ == '__main__':
+    import argparse
+    from .db.connection import engine
+
+    parser = argparse.ArgumentParser(description='Export sales, purchases and journal to the Parquet snapshot')
+    parser.add_argument('--root', type=Path, help='snapshot directory, default Settings.snapshot_dir')
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        for name, export in export_snapshot(session, args.root).items():
+            print('{}: {} rows, {} months rewritten, {} appended'.format(
+                name, export.rows, len(export.rewritten), len(export.appended),
+            ))
@@ -0,0 +1,76 @@
+"""Static asset serving with build time precompressed files and cache headers."""
+import os
+import re
+from mimetypes import guess_type
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+
+# preferred first, written next to the original by stock.compress_assets
+ENCODINGS = [
+    ('br', '.br'),
+    ('gzip', '.gz'),
+]
+
+# CRA build output names: main.3f1a2b4c.js, 787.5d1e0c9a.chunk.js, logo.6ce24c58.svg
+HASHED_NAME = re.compile(r'\.[0-9a-f]{8,}\.')
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+
+def accepted_encodings(scope: Scope) -> set:
+    accept = Headers(scope=scope).get('accept-encoding', '')
+    return {
+        part.split(';')[0].strip().lower()
+        for part in accept.split(',')
+        if part.strip() and not part.strip().endswith(';q=0')
+    }
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        full_path = str(full_path)
+        response = None
+
+        if status_code == 200:
+            accepted = accepted_encodings(scope)
+            for encoding, suffix in ENCODINGS:
+                if encoding not in accepted:
+                    continue
+                try:
+                    compressed_stat = os.stat(full_path + suffix)
+                except OSError:
+                    continue
+                response = FileResponse(
+                    full_path + suffix,
+                    stat_result=compressed_stat,
+                    method=scope['method'],
+                    media_type=guess_type(full_path)[0] or 'application/octet-stream',
+                )
+                response.headers['content-encoding'] = encoding
+                break
+
+        if response is None:
+            response = FileResponse(
+                full_path, status_code=status_code, stat_result=stat_result, method=scope['method'],
+            )
+
+        response.headers['vary'] = 'Accept-Encoding'
+        if HASHED_NAME.search(os.path.basename(full_path)):
+            response.headers['cache-control'] = IMMUTABLE
+        else:
+            # etag revalidation, mainly for index.html which points at the hashed files
+            response.headers['cache-control'] = REVALIDATE
+
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,340 @@
+"""Inventory valuation (cost of goods) over the item journal.
+
+Journal quantities are signed: inbound rows (Initial Stock, Buy, positive
+Correction) are positive and carry their cost in ``value``, outbound rows
+(Sell, negative Correction) are negative and get their cost computed here.
+An 'Ending Balance' row resets the item state to its quantity and value.
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import datetime
+from collections import deque
+from decimal import Decimal
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import select, update, func, and_, or_, bindparam
+from sqlalchemy.orm import Session
+
+from .db.connection import engine
+from .db.schema import ItemJournal
+from .db.utils import chunked
+from .settings import get_settings
+
+
+METHODS = [
+    'average',
+    'fifo',
+]
+
+ENDING_BALANCE = 'Ending Balance'
+
+CENT = Decimal('0.01')
+ZERO = Decimal(0)
+
+
+def _money(value: Decimal) -> Decimal:
+    return value.quantize(CENT)
+
+
+class AverageCost:
+    def __init__(self, quantity: Decimal = ZERO, value: Decimal = ZERO):
+        self.quantity = quantity
+        self.value = value
+
+    @property
+    def unit_cost(self) -> Decimal:
+        if self.quantity > 0:
+            return self.value / self.quantity
+        return ZERO
+
+    def reset(self, quantity: Decimal, value: Decimal) -> None:
+        self.quantity = quantity
+        self.value = value
+
+    def receive(self, quantity: Decimal, value: Decimal) -> None:
+        self.quantity += quantity
+        self.value += value
+
+    def issue(self, quantity: Decimal) -> Decimal:
+        """Take ``quantity`` out of stock and return its (positive) cost."""
+        cost = _money(quantity * self.unit_cost)
+        self.quantity -= quantity
+        self.value -= cost
+        if self.quantity <= 0:
+            self.value = ZERO
+        return cost
+
+
+class FifoCost:
+    def __init__(self, layers: Iterable[Tuple[Decimal, Decimal]] = ()):
+        # each layer is [quantity, unit cost], oldest first
+        self.layers = deque([list(layer) for layer in layers])
+        # quantity issued while out of stock, covered by the next receipts
+        self.deficit = ZERO
+        self.last_unit_cost = self.layers[-1][1] if self.layers else ZERO
+
+    @property
+    def quantity(self) -> Decimal:
+        return sum((layer[0] for layer in self.layers), ZERO) - self.deficit
+
+    @property
+    def value(self) -> Decimal:
+        return _money(sum((layer[0] * layer[1] for layer in self.layers), ZERO))
+
+    @property
+    def unit_cost(self) -> Decimal:
+        return self.layers[0][1] if self.layers else self.last_unit_cost
+
+    def reset(self, quantity: Decimal, value: Decimal) -> None:
+        self.layers.clear()
+        self.deficit = ZERO
+        if quantity > 0:
+            self.receive(quantity, value)
+        elif quantity < 0:
+            self.deficit = -quantity
+
+    def receive(self, quantity: Decimal, value: Decimal) -> None:
+        unit_cost = value / quantity
+        self.last_unit_cost = unit_cost
+        covered = min(quantity, self.deficit)
+        self.deficit -= covered
+        quantity -= covered
+        if quantity > 0:
+            self.layers.append([quantity, unit_cost])
+
+    def issue(self, quantity: Decimal) -> Decimal:
+        """Take ``quantity`` out of the oldest layers and return its (positive) cost."""
+        cost = ZERO
+        while quantity > 0 and self.layers:
+            layer = self.layers[0]
+            taken = min(quantity, layer[0])
+            cost += taken * layer[1]
+            self.last_unit_cost = layer[1]
+            layer[0] -= taken
+            quantity -= taken
+            if layer[0] <= 0:
+                self.layers.popleft()
+        if quantity > 0:
+            # out of stock, cost the shortfall at the last known price
+            cost += quantity * self.last_unit_cost
+            self.deficit += quantity
+        return _money(cost)
+
+
+def _ordered(rows: Sequence[ItemJournal]) -> Iterator[ItemJournal]:
+    # rows come ordered by (itemId, date, id), an ending balance closes its day
+    for _, day_rows in groupby(rows, key=lambda row: row.date):
+        day_rows = list(day_rows)
+        yield from (row for row in day_rows if row.journalType != ENDING_BALANCE)
+        yield from (row for row in day_rows if row.journalType == ENDING_BALANCE)
+
+
+def apply_rows(state, rows: Iterable[ItemJournal]) -> Dict[int, Decimal]:
+    """Replay journal rows on ``state``, return {journal id: value} for rows whose value changed."""
+    changed: Dict[int, Decimal] = {}
+    for row in _ordered(rows):
+        quantity = Decimal(row.quantity)
+        if row.journalType == ENDING_BALANCE:
+            state.reset(quantity, Decimal(row.value or 0))
+            continue
+        if quantity > 0:
+            if row.value is None:
+                value = _money(quantity * state.unit_cost)
+            else:
+                value = Decimal(row.value)
+            state.receive(quantity, value)
+        else:
+            value = -state.issue(-quantity)
+        if row.value is None or Decimal(row.value) != value:
+            changed[row.id] = value
+    return changed
+
+
+def _snapshot_condition(item_id: int, since: datetime.date):
+    # latest ending balance dated before ``since`` for the item
+    return select(
+        ItemJournal.id, ItemJournal.date
+    ).where(
+        and_(
+            ItemJournal.itemId == item_id,
+            ItemJournal.journalType == ENDING_BALANCE,
+            ItemJournal.date < since,
+        )
+    ).order_by(
+        ItemJournal.date.desc(), ItemJournal.id.desc()
+    ).limit(1)
+
+
+def _opening_rows_condition(session: Session, item_id: int, since: datetime.date):
+    snapshot = session.execute(_snapshot_condition(item_id, since)).one_or_none()
+    conditions = [
+        ItemJournal.itemId == item_id,
+        ItemJournal.date < since,
+    ]
+    if snapshot is not None:
+        conditions.append(
+            or_(
+                ItemJournal.id == snapshot.id,
+                ItemJournal.date > snapshot.date,
+            )
+        )
+    return and_(*conditions)
+
+
+def opening_state(session: Session, item_id: int, since: datetime.date, method: str):
+    """Cost state of an item at the start of ``since``, from already valued rows."""
+    condition = _opening_rows_condition(session, item_id, since)
+    quantity, value = session.execute(
+        select(
+            func.coalesce(func.sum(ItemJournal.quantity), 0),
+            func.coalesce(func.sum(ItemJournal.value), 0),
+        ).where(condition)
+    ).one()
+    quantity, value = Decimal(quantity), Decimal(value)
+
+    if method == 'average':
+        return AverageCost(quantity, value if quantity > 0 else ZERO)
+
+    # the remaining fifo layers are the latest receipts covering the quantity on hand
+    layers: List[Tuple[Decimal, Decimal]] = []
+    last_unit_cost = None
+    remaining = quantity
+    receipts = session.execute(
+        select(
+            ItemJournal.quantity, ItemJournal.value,
+        ).where(
+            and_(
+                condition,
+                ItemJournal.quantity > 0,
+            )
+        ).order_by(
+            ItemJournal.date.desc(), ItemJournal.id.desc()
+        ).execution_options(yield_per=500)
+    )
+    for row_quantity, row_value in receipts:
+        row_quantity = Decimal(row_quantity)
+        unit_cost = Decimal(row_value or 0) / row_quantity
+        if last_unit_cost is None:
+            last_unit_cost = unit_cost
+        if remaining <= 0:
+            break
+        taken = min(row_quantity, remaining)
+        layers.append((taken, unit_cost))
+        remaining -= taken
+    receipts.close()
+    layers.reverse()
+
+    state = FifoCost(layers)
+    if quantity < 0:
+        state.deficit = -quantity
+    if last_unit_cost is not None:
+        state.last_unit_cost = last_unit_cost
+    return state
+
+
+def new_state(method: str):
+    if method == 'average':
+        return AverageCost()
+    return FifoCost()
+
+
+def _write_values(session: Session, changed: Dict[int, Decimal]) -> None:
+    if not changed:
+        return
+    session.execute(
+        update(ItemJournal.__table__).where(
+            ItemJournal.__table__.c.id == bindparam('_id')
+        ).values(
+            value=bindparam('_value')
+        ),
+        [{'_id': id, '_value': value} for id, value in changed.items()],
+    )
+
+
+def revalue(
+    session: Session,
+    changes: Dict[int, Optional[datetime.date]],
+    method: Optional[str] = None,
+) -> int:
+    """Revalue items from their earliest changed date, ``changes`` maps item id to that date
+    (None = whole history). Returns the number of journal rows updated, caller commits.
+    """
+    method = method or get_settings().valuation_method
+    if method not in METHODS:
+        raise Exception('Unknown valuation method {}, supported method: {}'.format(method, ', '.join(METHODS)))
+    updated = 0
+
+    # items valued from the start are streamed together in (itemId, date) index order
+    full = sorted(item_id for item_id, since in changes.items() if since is None)
+    for item_ids in chunked(full):
+        rows = session.execute(
+            select(ItemJournal).where(
+                ItemJournal.itemId.in_(item_ids)
+            ).order_by(
+                ItemJournal.itemId, ItemJournal.date, ItemJournal.id
+            ).execution_options(yield_per=1000)
+        ).scalars()
+        changed: Dict[int, Decimal] = {}
+        for _, item_rows in groupby(rows, key=lambda row: row.itemId):
+            changed.update(apply_rows(new_state(method), item_rows))
+        _write_values(session, changed)
+        updated += len(changed)
+
+    for item_id, since in sorted(changes.items()):
+        if since is None:
+            continue
+        state = opening_state(session, item_id, since, method)
+        rows = session.execute(
+            select(ItemJournal).where(
+                and_(
+                    ItemJournal.itemId == item_id,
+                    ItemJournal.date >= since,
+                )
+            ).order_by(
+                ItemJournal.date, ItemJournal.id
+            )
+        ).scalars().all()
+        changed = apply_rows(state, rows)
+        _write_values(session, changed)
+        updated += len(changed)
+
+    return updated
+
+
+def _init_worker() -> None:
+    # connections inherited from the parent process must not be reused
+    engine.dispose(close=False)
+
+
+def _rebuild_chunk(item_ids: List[int], method: str) -> int:
+    with Session(engine) as session:
+        updated = revalue(session, {item_id: None for item_id in item_ids}, method)
+        session.commit()
+    return updated
+
+
+def rebuild(method: Optional[str] = None, workers: Optional[int] = None, chunk_size: int = 200) -> int:
+    """Revalue the whole journal, items are split into chunks valued across a process pool."""
+    method = method or get_settings().valuation_method
+    if method not in METHODS:
+        raise Exception('Unknown valuation method {}, supported method: {}'.format(method, ', '.join(METHODS)))
+    with Session(engine) as session:
+        item_ids: List[int] = session.execute(
+            select(ItemJournal.itemId).distinct().order_by(ItemJournal.itemId)
+        ).scalars().all()
+
+    chunks = list(chunked(item_ids, chunk_size))
+    if workers == 1 or len(chunks) <= 1:
+        return sum(_rebuild_chunk(chunk, method) for chunk in chunks)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        return sum(executor.map(_rebuild_chunk, chunks, [method] * len(chunks)))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Rebuild item journal valuation')
+    parser.add_argument('--method', choices=METHODS, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    print('Journal rows updated:', rebuild(args.method, args.workers))
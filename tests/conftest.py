@@ -0,0 +1,60 @@
+import io
+import openpyxl
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.engine import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from stock.db import schema
+from stock.db.connection import get_session, shared_session
+
+
+@pytest.fixture(scope='session')
+def engine():
+    engine = create_engine(
+        'sqlite://',
+        future=True,
+        connect_args={'check_same_thread': False},
+        poolclass=StaticPool,
+    )
+    schema.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(schema.Item(id=1, code='T001', name='Test 1'))
+        session.commit()
+    return engine
+
+
+@pytest.fixture(scope='session')
+def client(engine):
+    from stock.main import app
+
+    def get_test_session():
+        session = shared_session.get()
+        if session is not None:
+            yield session
+            return
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_test_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+TOKOPEDIA_HEADER = ['Nomor Invoice', 'Tanggal Pembayaran', 'Nama Produk', 'Nomor SKU', 'Jumlah Produk Dibeli', 'Harga Jual (IDR)']
+
+
+@pytest.fixture
+def make_xlsx():
+    """Build a Tokopedia order export workbook from rows."""
+    def make(rows) -> bytes:
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(['Laporan Penjualan'])
+        sheet.append(TOKOPEDIA_HEADER)
+        for row in rows:
+            sheet.append(row)
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        return buffer.getvalue()
+    return make
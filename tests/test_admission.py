@@ -0,0 +1,48 @@
+import asyncio
+from stock.middleware.admission import AdmissionMiddleware
+
+
+def test_admission_sheds_load():
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        if scope['path'] == '/slow':
+            await release.wait()
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    middleware = AdmissionMiddleware(
+        app,
+        limits={'default': (1, 1)},
+        rules=[('GET', '/item/suggest', None)],
+        queue_timeout=5,
+        retry_after=3,
+    )
+
+    async def request(path):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await middleware({'type': 'http', 'method': 'GET', 'path': path}, None, send)
+        return messages[0]
+
+    async def run():
+        running = asyncio.create_task(request('/slow'))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(request('/slow'))
+        await asyncio.sleep(0)
+
+        rejected = await request('/slow')
+        assert rejected['status'] == 503
+        assert (b'retry-after', b'3') in rejected['headers']
+        # bypass routes are not limited
+        assert (await request('/item/suggest'))['status'] == 200
+
+        release.set()
+        assert (await running)['status'] == 200
+        assert (await queued)['status'] == 200
+        assert middleware.limiters['default'].running == 0
+
+    asyncio.run(run())
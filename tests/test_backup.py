@@ -0,0 +1,59 @@
+import io
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL
+from sqlalchemy.orm import Session
+from stock.db import schema
+from stock.settings import Settings, get_settings
+from stock import backup, images
+
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x01' * 100
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    path = tmp_path / 'live.db'
+    engine = create_engine('sqlite:///{}'.format(path), future=True)
+    schema.metadata.create_all(engine)
+
+    settings = get_settings()
+    monkeypatch.setattr(settings, 'db_driver', 'sqlite')
+    monkeypatch.setattr(settings, 'image_dir', str(tmp_path / 'images'))
+    monkeypatch.setattr(Settings, 'get_db_url', lambda self: URL.create('sqlite', database=str(path)))
+
+    stored = images.store_image(io.BytesIO(PNG))
+    with Session(engine) as session:
+        session.add(schema.Item(id=1, code='B001', name='Backup'))
+        session.add(schema.ItemImg(itemId=1, contentHash=stored.contentHash, contentType=stored.contentType))
+        session.commit()
+    yield engine, stored.contentHash
+    engine.dispose()
+
+
+def test_backup_verify_restore(database, tmp_path):
+    engine, content_hash = database
+    root = tmp_path / 'backups'
+
+    first = backup.create_backup(root, pages=1, sleep=0)
+    assert backup.verify_backup(first, deep=True) == []
+    manifest = (first / backup.MANIFEST).read_text()
+    assert '"imagesCopied": 1' in manifest
+
+    # images already in the backup root are not copied again
+    assert backup.copy_images(get_settings().get_image_dir(), root / 'images') == (0, 1)
+
+    image = root / 'images' / content_hash[:2] / content_hash
+    image.unlink()
+    assert backup.verify_backup(first) == ['image {} is missing'.format(content_hash)]
+    with pytest.raises(Exception):
+        backup.restore_backup(first)
+
+    backup.copy_images(get_settings().get_image_dir(), root / 'images')
+    with engine.begin() as connection:
+        connection.exec_driver_sql('DELETE FROM mitemimg')
+        connection.exec_driver_sql('DELETE FROM mitem')
+    engine.dispose()
+    backup.restore_backup(first)
+    with Session(engine) as session:
+        assert session.get(schema.Item, 1).code == 'B001'
@@ -0,0 +1,90 @@
+import asyncio
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from stock.db import schema
+from stock.model.batch import BatchResultModel
+from stock.routers import batch
+from stock.settings import get_settings
+
+
+def market_place_names(engine, prefix):
+    with Session(engine) as session:
+        return session.execute(
+            select(schema.MarketPlace.name).where(schema.MarketPlace.name.startswith(prefix))
+        ).scalars().all()
+
+
+def test_batch(engine, client):
+    response = client.post('/batch', json={'operations': [
+        {'method': 'POST', 'path': '/market-place/save', 'body': {'name': 'Batch 1'}},
+        {'path': '/market-place/list?q=Batch', 'params': {'limit': 5}},
+        {'path': '/hello'},
+        {'path': '/no-such-route'},
+        {'path': '/events'},
+    ]})
+    results = response.json()['results']
+    assert [result['status'] for result in results] == [200, 200, 200, 404, 400]
+    assert results[0]['body']['success']
+    assert [row['name'] for row in results[1]['body']] == ['Batch 1']
+    assert results[2]['body'] == 'Hello World'
+    assert market_place_names(engine, 'Batch') == ['Batch 1']
+
+
+def test_batch_reads_run_concurrently(client, monkeypatch):
+    running = []
+    concurrent = []
+
+    async def dispatch(request, operation):
+        running.append(operation.path)
+        concurrent.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(operation.path)
+        return BatchResultModel(status=200, body=operation.path)
+
+    monkeypatch.setattr(batch, 'dispatch', dispatch)
+    response = client.post('/batch', json={'operations': [{'path': '/a'}, {'path': '/b'}, {'path': '/c'}]})
+    assert [result['body'] for result in response.json()['results']] == ['/a', '/b', '/c']
+    assert max(concurrent) == 3
+
+
+def test_batch_transaction_rolls_back(engine, client):
+    response = client.post('/batch', json={'transaction': True, 'operations': [
+        {'method': 'POST', 'path': '/market-place/save', 'body': {'name': 'Batch TX'}},
+        {'path': '/market-place/list', 'params': {'q': 'Batch TX'}},
+        {'method': 'POST', 'path': '/sales/save', 'body': {'id': 999999, 'code': 'BX', 'version': 1, 'details': []}},
+        {'path': '/hello'},
+    ]})
+    result = response.json()
+    assert not result['committed']
+    statuses = [operation['status'] for operation in result['results']]
+    assert statuses[:2] == [200, 200] and statuses[3] == 424
+    # the batch reads its own uncommitted writes
+    assert [row['name'] for row in result['results'][1]['body']] == ['Batch TX']
+    assert market_place_names(engine, 'Batch TX') == []
+
+    response = client.post('/batch', json={'transaction': True, 'operations': [
+        {'method': 'POST', 'path': '/market-place/save', 'body': {'name': 'Batch TX 2'}},
+    ]})
+    assert response.json()['committed']
+    assert market_place_names(engine, 'Batch TX') == ['Batch TX 2']
+
+
+def test_batch_transaction_bypasses_group_commit(engine, client, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'group_commit', True)
+    with Session(engine) as session:
+        item = schema.Item(code='BT-001', name='Batch group commit')
+        session.add(item)
+        session.commit()
+        item_id = item.id
+
+    response = client.post('/batch', json={'transaction': True, 'operations': [
+        {'method': 'POST', 'path': '/sales/save', 'body': {
+            'code': 'BT-GC', 'date': '2026-10-19', 'details': [{'itemId': item_id, 'quantity': 1, 'unitPrice': 100}],
+        }},
+        {'path': '/no-such-route'},
+    ]})
+    result = response.json()
+    assert result['results'][0]['body']['success']
+    assert not result['committed']
+    with Session(engine) as session:
+        assert session.execute(select(schema.Sales).where(schema.Sales.code == 'BT-GC')).first() is None
@@ -0,0 +1,56 @@
+from sqlalchemy import select, func
+from sqlalchemy.engine import create_engine
+from sqlalchemy.orm import Session
+from stock.db import counts, schema
+from stock.db.changes import table_change_seq
+
+
+def test_list_total(engine, client, monkeypatch):
+    response = client.get('/item/list', params={'q': 'T001', 'withTotal': True})
+    assert response.headers['x-total-count'] == '1'
+    assert 'x-total-approximate' not in response.headers
+    assert 'x-total-count' not in client.get('/item/list').headers
+
+    # served from the cache until the item table changes
+    key = ('mitem', counts.normalize_query('T001'))
+    with Session(engine) as session:
+        seq = table_change_seq(session, schema.Item)
+    assert counts.count_cache.get(key, seq) == 1
+    counts.count_cache.put(key, seq, 42)
+    assert client.get('/item/list', params={'q': 't001', 'withTotal': True}).headers['x-total-count'] == '42'
+    client.post('/item/category/save', json={'name': 'Counted'})
+    assert client.get('/item/list', params={'q': 't001', 'withTotal': True}).headers['x-total-count'] == '42'
+    item = client.post('/item/get/1').json()
+    assert client.post('/item/save', json=item).json()['success']
+    assert client.get('/item/list', params={'q': 'T001', 'withTotal': True}).headers['x-total-count'] == '1'
+
+    # large unfiltered tables are estimated from the statistics
+    with engine.begin() as connection:
+        connection.exec_driver_sql('ANALYZE')
+    monkeypatch.setattr(counts, 'ESTIMATE_THRESHOLD', 0)
+    response = client.get('/item/list', params={'withTotal': True})
+    assert response.headers['x-total-approximate'] == 'true'
+
+
+def test_table_change_seq_moves_on_delete():
+    engine = create_engine('sqlite://', future=True)
+    schema.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(schema.ItemCategory(name='Kept'))
+        session.commit()
+        seq = table_change_seq(session, schema.ItemCategory)
+        session.add(schema.DeletedRow(tableName='mitemcategory', rowId=2))
+        session.commit()
+        assert table_change_seq(session, schema.ItemCategory) > seq
+        assert table_change_seq(session, schema.Item) == 0
+
+
+def test_estimate_rows_keeps_transaction():
+    engine = create_engine('sqlite://', future=True)
+    schema.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(schema.ItemCategory(name='Pending'))
+        session.flush()
+        # no sqlite_stat1 before ANALYZE, the failed lookup is rolled back alone
+        assert counts.estimate_rows(session, 'mitemcategory') is None
+        assert session.execute(select(func.count(schema.ItemCategory.id))).scalar_one() == 1
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+from stock.events import EventBroker, RESYNC, broker
+from stock.routers.events import format_event
+
+
+def test_broker_fan_out_and_resync():
+    async def run():
+        broker = EventBroker(queue_size=2, history_size=3)
+        fast = broker.subscribe()
+        slow = broker.subscribe()
+
+        # publishing from a worker thread is handed over to the loop
+        thread = threading.Thread(target=broker.publish, args=('item', 1))
+        thread.start()
+        thread.join()
+        await asyncio.sleep(0)
+        assert (await fast.queue.get())['rowId'] == 1
+
+        broker.publish('item', 2)
+        broker.publish('item', 3)
+        assert [fast.queue.get_nowait()['rowId'] for _ in range(2)] == [2, 3]
+        # the slow subscriber overflowed and only gets a resync
+        assert slow.queue.get_nowait() is RESYNC
+        assert slow.queue.empty()
+
+        # reconnecting within the history replays, too far back resyncs
+        replay = broker.subscribe(last_event_id=2)
+        assert replay.queue.get_nowait()['rowId'] == 3
+        broker.publish('item', 4)
+        assert broker.subscribe(last_event_id=0).queue.get_nowait() is RESYNC
+
+        broker.unsubscribe(fast)
+        assert fast not in broker.subscribers
+
+    asyncio.run(run())
+
+
+def test_reconnect_replays_events_saved_while_disconnected(client):
+    async def connect(last_event_id=None):
+        return broker.subscribe(last_event_id)
+
+    subscriber = asyncio.run(connect())
+    broker.unsubscribe(subscriber)
+    last_event_id = broker.history[-1]['id'] if broker.history else 0
+
+    # saved while no client is connected
+    item = client.post('/item/get/1').json()
+    assert client.post('/item/save', json=item).json()['success']
+
+    replay = asyncio.run(connect(last_event_id))
+    event = replay.queue.get_nowait()
+    assert (event['entity'], event['rowId']) == ('item', 1)
+    assert event['id'] > last_event_id
+    broker.unsubscribe(replay)
+
+
+def test_format_event():
+    assert format_event({'id': 7, 'entity': 'stock', 'rowId': 1, 'stock': '3.00'}) == \
+        'id: 7\nevent: change\ndata: {"entity":"stock","rowId":1,"stock":"3.00"}\n\n'
+    assert format_event(RESYNC) == 'event: resync\ndata: {}\n\n'
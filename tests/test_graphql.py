@@ -0,0 +1,66 @@
+import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from stock.db import schema
+
+
+QUERY = '''
+{
+  purchases(limit: 50) {
+    code
+    marketPlace { name }
+    details {
+      quantity
+      item { code category { name } stock }
+    }
+  }
+}
+'''
+
+
+def test_graphql_batches_relationships(engine, client):
+    with Session(engine) as session:
+        item = schema.Item(code='GQ-ITEM', name='GraphQL item')
+        session.add(item)
+        session.commit()
+        item_id = item.id
+
+    for index in range(5):
+        client.post('/purchase/save', json={
+            'code': 'GQ{}'.format(index),
+            'date': datetime.date(2022, 6, 1).isoformat(),
+            'details': [
+                {'itemId': item_id, 'quantity': 1, 'unitPrice': 100},
+                {'itemId': item_id, 'quantity': 2, 'unitPrice': 100},
+            ],
+        })
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = client.post('/graphql', json={'query': QUERY})
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    data = response.json()['data']['purchases']
+    assert {'GQ0', 'GQ4'} <= {purchase['code'] for purchase in data}
+    assert all(detail['item']['code'] == 'GQ-ITEM' for purchase in data for detail in purchase['details'])
+    # purchases, details, items, stock; no categories or marketplaces to load
+    assert len(statements) == 4
+
+
+def test_graphql_depth_limit(client):
+    query = '{ purchases { details { purchase { details { purchase { details { item { code } } } } } } } }'
+    response = client.post('/graphql', json={'query': query})
+    assert 'exceeds maximum operation depth' in response.json()['errors'][0]['message']
+
+
+def test_graphql_extensions_per_request():
+    from stock.gql import graphql_schema
+
+    first, second = graphql_schema.get_extensions(), graphql_schema.get_extensions()
+    assert first and all(a is not b for a, b in zip(first, second))
@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import Session
+from stock.db import schema
+from stock.db.group_commit import WriteQueue
+from stock.db.schema import MarketPlace
+
+
+def add_market_place(name):
+    def write(session):
+        if name is None:
+            raise Exception('name is required')
+        market_place = MarketPlace(name=name)
+        session.add(market_place)
+        session.flush()
+        return market_place.id
+    return write
+
+
+def test_group_commit(engine):
+    queue = WriteQueue(bind=engine, delay=0.05)
+
+    async def submit_all():
+        return await asyncio.gather(
+            *[queue.submit(add_market_place(name)) for name in ['GC 1', None, 'GC 2']],
+            return_exceptions=True,
+        )
+
+    first, failed, second = asyncio.run(submit_all())
+    assert isinstance(first, int) and isinstance(second, int)
+    assert str(failed) == 'name is required'
+
+    with Session(engine) as session:
+        names = session.execute(
+            select(MarketPlace.name).where(MarketPlace.id.in_([first, second]))
+        ).scalars().all()
+    assert sorted(names) == ['GC 1', 'GC 2']
+
+    metrics = queue.metrics.snapshot()
+    assert metrics['batches'] == 1
+    assert metrics['writes'] == 3
+    assert metrics['failed'] == 1
+    assert metrics['maxBatchSize'] == 3
+
+
+def test_metrics_admin_is_restricted(client):
+    assert client.get('/admin/metrics').status_code == 403
+
+
+@pytest.fixture
+def file_engine(tmp_path):
+    engine = create_engine('sqlite:///{}'.format(tmp_path / 'group_commit.db'), future=True)
+    schema.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def count_market_places(engine, name):
+    with engine.connect() as connection:
+        return connection.execute(
+            select(func.count()).select_from(MarketPlace).where(MarketPlace.name == name)
+        ).scalar_one()
+
+
+def test_batch_is_one_transaction(file_engine):
+    queue = WriteQueue(bind=file_engine, delay=0.05)
+
+    def check_visible(session):
+        # another connection must not see the first write before the batch commits
+        return count_market_places(file_engine, 'GC visible')
+
+    async def submit_all():
+        return await asyncio.gather(
+            queue.submit(add_market_place('GC visible')),
+            queue.submit(check_visible),
+        )
+
+    _, visible = asyncio.run(submit_all())
+    assert visible == 0
+    assert count_market_places(file_engine, 'GC visible') == 1
+
+
+def test_failed_commit_falls_back_to_one_transaction_per_write(file_engine):
+    queue = WriteQueue(bind=file_engine, delay=0.05)
+
+    def fail_commit(session):
+        def fail(session):
+            # savepoint releases fire before_commit too, fail the batch commit only
+            if not session.in_nested_transaction():
+                raise Exception('commit failed')
+        event.listen(session, 'before_commit', fail)
+
+    async def submit_all():
+        return await asyncio.gather(
+            queue.submit(add_market_place('GC retry 1')),
+            queue.submit(fail_commit),
+            queue.submit(add_market_place('GC retry 2')),
+            return_exceptions=True,
+        )
+
+    first, failed, second = asyncio.run(submit_all())
+    assert isinstance(first, int) and isinstance(second, int)
+    # retried alone, it fails its own commit
+    assert str(failed) == 'commit failed'
+    assert count_market_places(file_engine, 'GC retry 1') == 1
+    assert count_market_places(file_engine, 'GC retry 2') == 1
+    assert queue.metrics.snapshot()['fallbacks'] == 1
+
+
+def test_failed_write_does_not_reuse_change_seq(file_engine):
+    queue = WriteQueue(bind=file_engine)
+
+    def failing(session):
+        session.add(MarketPlace(name='GC rolled back'))
+        session.flush()
+        raise Exception('failed after writing')
+
+    queue.apply([failing, add_market_place('GC seq 1')])
+    queue.apply([add_market_place('GC seq 2')])
+    with file_engine.connect() as connection:
+        seqs = connection.execute(
+            select(MarketPlace.changeSeq).where(MarketPlace.name.in_(['GC seq 1', 'GC seq 2'])).order_by(MarketPlace.id)
+        ).scalars().all()
+        counter = connection.execute(select(schema.ChangeSeq.seq)).scalar_one()
+    assert seqs[0] < seqs[1] == counter
@@ -0,0 +1,129 @@
+import asyncio
+import io
+import time
+import zipfile
+import pytest
+from sqlalchemy.orm import Session
+from stock.settings import get_settings
+from stock import images, image_import
+from stock.middleware.body_size import BodySizeLimitMiddleware
+
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 1000
+
+
+@pytest.fixture(autouse=True)
+def image_dir(tmp_path):
+    settings = get_settings()
+    previous = settings.image_dir, settings.image_max_size
+    settings.image_dir = str(tmp_path)
+    yield tmp_path
+    settings.image_dir, settings.image_max_size = previous
+
+
+def test_save_item_image(client):
+    response = client.post('/item/save-image/1', files={'image': ('a.png', PNG, 'image/png')})
+    assert response.status_code == 200
+    assert response.json()['data']['fileSize'] == len(PNG)
+
+    response = client.get('/item/image/1')
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'image/png'
+    assert response.content == PNG
+
+
+def test_save_item_image_rejected(client):
+    response = client.post('/item/save-image/1', files={'image': ('a.txt', b'hello', 'image/png')})
+    assert response.status_code == 415
+
+    get_settings().image_max_size = 100
+    response = client.post('/item/save-image/1', files={'image': ('a.png', PNG, 'image/png')})
+    assert response.status_code == 413
+
+
+def test_store_image_dedup(image_dir):
+    first = images.store_image(io.BytesIO(PNG))
+    second = images.store_image(io.BytesIO(PNG))
+    assert first == second
+    assert images.image_path(first.contentHash).read_bytes() == PNG
+    assert not list(image_dir.glob('*.upload'))
+
+
+def test_body_size_limit():
+    called = []
+
+    async def app(scope, receive, send):
+        called.append(scope['path'])
+        while (await receive()).get('more_body'):
+            pass
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    middleware = BodySizeLimitMiddleware(app, rules=[('POST', '/upload', lambda: 100)])
+
+    async def request(path, headers, chunks):
+        messages = []
+        chunks = list(chunks)
+
+        async def receive():
+            return {'type': 'http.request', 'body': chunks.pop(0), 'more_body': bool(chunks)}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': 'POST', 'path': path, 'headers': headers}
+        await middleware(scope, receive, send)
+        return messages[0]['status']
+
+    # declared too large, rejected before the app reads anything
+    assert asyncio.run(request('/upload', [(b'content-length', b'1000')], [])) == 413
+    assert called == []
+    # streamed without a length, cut off at the limit
+    assert asyncio.run(request('/upload', [], [b'x' * 60] * 10)) == 413
+    assert asyncio.run(request('/other', [], [b'x' * 60] * 3)) == 200
+
+
+def test_release_keeps_pinned_image(engine):
+    content = PNG + b'pinned'
+    stored = images.store_image(io.BytesIO(content), pin=True)
+    with Session(engine) as session:
+        # an upload of the same content has not committed its reference yet
+        images.release_image(session, stored.contentHash)
+        assert images.image_path(stored.contentHash).exists()
+
+        images.unpin_image(stored.contentHash)
+        images.release_image(session, stored.contentHash)
+        assert not images.image_path(stored.contentHash).exists()
+    assert not images.pin_image(stored.contentHash)
+
+
+def test_import_zip(engine, tmp_path):
+    zip_path = tmp_path / 'images.zip'
+    with zipfile.ZipFile(zip_path, 'w') as archive:
+        archive.writestr('photos/T001.png', PNG)
+        archive.writestr('photos/UNKNOWN.png', PNG)
+        archive.writestr('photos/', b'')
+
+    job = image_import.create_job()
+    image_import.run_import(job, str(zip_path), workers=2, bind=engine)
+    assert job.status == 'done', job.errors
+    assert (job.total, job.processed, job.imported) == (2, 2, 1)
+    assert job.unmatched == ['UNKNOWN']
+    assert not zip_path.exists()
+
+
+def test_finished_import_jobs_expire(tmp_path):
+    zip_path = tmp_path / 'empty.zip'
+    with zipfile.ZipFile(zip_path, 'w'):
+        pass
+    job = image_import.create_job()
+    running = image_import.create_job()
+    image_import.run_import(job, str(zip_path))
+    assert job.status == 'done'
+
+    image_import.evict_finished_jobs(time.monotonic() + image_import.JOB_TTL - 1)
+    assert job.id in image_import.jobs
+    image_import.evict_finished_jobs(time.monotonic() + image_import.JOB_TTL + 1)
+    assert job.id not in image_import.jobs
+    assert running.id in image_import.jobs
+    del image_import.jobs[running.id]
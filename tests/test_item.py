@@ -0,0 +1,24 @@
+from stock.db.concurrency import unversioned_updates
+
+
+def test_save_item_conflict(client):
+    item = client.post('/item/get/1').json()
+    response = client.post('/item/save', json=dict(item, name='Test One'))
+    assert response.json()['data']['version'] == item['version'] + 1
+    response = client.post('/item/save', json=dict(item, name='Test Uno'))
+    assert response.status_code == 409
+
+
+def test_save_item_without_version(client):
+    before = unversioned_updates.snapshot().get('Item', 0)
+    item = client.post('/item/get/1').json()
+    response = client.post('/item/save', json=dict(item, version=None))
+    assert response.json()['data']['version'] == item['version'] + 1
+    assert unversioned_updates.snapshot()['Item'] == before + 1
+
+
+def test_get_many(client):
+    response = client.post('/item/get-many', json=[1, 1, 999])
+    assert response.status_code == 200
+    assert list(response.json()) == ['1']
+    assert response.json()['1']['code'] == 'T001'
@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.orm import Session
+from stock.db import migration, schema
+from stock.settings import get_settings
+from stock import images
+
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x02' * 100
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    engine = create_engine('sqlite:///{}'.format(tmp_path / 'migration.db'), future=True)
+    schema.metadata.create_all(engine)
+    monkeypatch.setattr(get_settings(), 'image_dir', str(tmp_path / 'images'))
+    with Session(engine) as session:
+        session.add(schema.Item(id=1, code='M001', name='Migration'))
+        session.add_all([
+            schema.ItemImg(itemId=1, content=PNG if i % 3 else b'not an image', contentType='image/png')
+            for i in range(10)
+        ])
+        session.commit()
+    yield engine
+    engine.dispose()
+
+
+def test_move_item_images(database):
+    reports = []
+    progress = migration.run(database, 'item-image-files', chunk_size=4, sleep=0, report=reports.append)
+    assert progress.finished and progress.rows == 10 and progress.lastId == 10
+    assert reports == [progress]
+
+    with Session(database) as session:
+        moved = session.execute(
+            select(schema.ItemImg.contentHash).where(schema.ItemImg.content.is_(None))
+        ).scalars().all()
+    assert len(moved) == 6
+    assert images.image_path(moved[0]).read_bytes() == PNG
+
+    # finished migrations are not run again
+    assert migration.run(database, 'item-image-files', sleep=0, report=reports.append).rows == 10
+
+
+def test_resume_after_failure(database):
+    item_img = schema.ItemImg.__table__
+    processed = []
+    interrupt = [True]
+
+    @migration.data_migration('test-rename', item_img, [item_img.c.originalFileName])
+    def rename(connection, rows):
+        if processed and interrupt:
+            interrupt.pop()
+            raise Exception('interrupted')
+        processed.append([row.id for row in rows])
+        connection.execute(
+            update(item_img).where(item_img.c.id.in_([row.id for row in rows])).values(originalFileName='renamed')
+        )
+
+    try:
+        with pytest.raises(Exception, match='interrupted'):
+            migration.run(database, 'test-rename', chunk_size=6, sleep=0, report=lambda progress: None)
+        state, = migration.status(database)
+        assert (state.lastId, state.rows, state.finishedAt) == (6, 6, None)
+
+        progress = migration.run(database, 'test-rename', chunk_size=6, sleep=0, report=lambda progress: None)
+        assert processed == [[1, 2, 3, 4, 5, 6], [7, 8, 9, 10]]
+        assert progress.rows == 10 and progress.finished
+    finally:
+        migration.MIGRATIONS.pop('test-rename')
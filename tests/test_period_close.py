@@ -0,0 +1,89 @@
+import datetime
+from decimal import Decimal
+import pytest
+from sqlalchemy import select, delete, func
+from sqlalchemy.engine import create_engine
+from sqlalchemy.orm import Session
+from stock.db import schema
+from stock import period_close, valuation
+
+
+def create_session() -> Session:
+    engine = create_engine('sqlite://', future=True)
+    schema.metadata.create_all(engine, tables=[
+        schema.ChangeSeq.__table__,
+        schema.ItemCategory.__table__,
+        schema.Item.__table__,
+        schema.ItemJournal.__table__,
+        schema.ItemJournalArchive.__table__,
+        schema.PeriodClose.__table__,
+    ])
+    session = Session(engine)
+    session.add(schema.Item(id=1, code='T001', name='Test 1'))
+    session.add_all([
+        schema.ItemJournal(itemId=1, date=datetime.date(2022, 1, 1), quantity=10, value=1000, journalType='Buy'),
+        schema.ItemJournal(itemId=1, date=datetime.date(2022, 1, 20), quantity=-4, journalType='Sell'),
+        schema.ItemJournal(itemId=1, date=datetime.date(2022, 2, 1), quantity=-2, journalType='Sell'),
+    ])
+    session.commit()
+    return session
+
+
+def test_close_period():
+    session = create_session()
+    assert period_close.close_period(session, datetime.date(2022, 1, 31), 'average') == 1
+    session.commit()
+
+    journal = session.execute(
+        select(schema.ItemJournal).order_by(schema.ItemJournal.date)
+    ).scalars().all()
+    assert [row.journalType for row in journal] == ['Ending Balance', 'Sell']
+    assert journal[0].quantity == 6 and journal[0].value == 600
+    assert session.execute(select(func.count(schema.ItemJournalArchive.id))).scalar_one() == 2
+
+    valuation.revalue(session, {1: None}, 'average')
+    assert journal[1].value == Decimal(-200)
+
+    assert period_close.get_stock_balance(session) == {1: (Decimal(4), Decimal(400))}
+    assert period_close.get_stock_balance(session, as_of=datetime.date(2022, 1, 10)) == {1: (Decimal(10), Decimal(1000))}
+
+    with pytest.raises(period_close.PeriodClosedError, match='is closed'):
+        period_close.close_period(session, datetime.date(2022, 1, 15))
+
+
+def test_close_two_periods():
+    session = create_session()
+    # every row is in the first period, the ending balance must not take a freed id
+    session.execute(delete(schema.ItemJournal).where(schema.ItemJournal.date > datetime.date(2022, 1, 1)))
+    session.commit()
+    period_close.close_period(session, datetime.date(2022, 1, 31), 'average')
+    session.commit()
+    ending = session.execute(select(schema.ItemJournal)).scalar_one()
+    assert ending.id > 3
+
+    session.add(schema.ItemJournal(itemId=1, date=datetime.date(2022, 2, 10), quantity=-3, journalType='Sell'))
+    session.commit()
+    assert period_close.close_period(session, datetime.date(2022, 2, 28), 'average') == 1
+    session.commit()
+    assert session.execute(select(func.count(schema.ItemJournalArchive.id))).scalar_one() == 3
+    assert period_close.get_stock_balance(session) == {1: (Decimal(7), Decimal(700))}
+
+
+def test_save_in_closed_period(engine, client):
+    with Session(engine) as session:
+        session.add(schema.PeriodClose(date=datetime.date(2000, 1, 31), closedAt=datetime.datetime.now()))
+        session.commit()
+    try:
+        response = client.post('/purchase/save', json={
+            'code': 'P-CLOSED',
+            'date': '2000-01-15',
+            'details': [{'itemId': 1, 'quantity': 1, 'unitPrice': 100}],
+        })
+        assert response.status_code == 422
+        assert 'is closed' in response.json()['detail']
+    finally:
+        with Session(engine) as session:
+            session.execute(delete(schema.PeriodClose).where(schema.PeriodClose.date == datetime.date(2000, 1, 31)))
+            session.commit()
+    with Session(engine) as session:
+        assert session.execute(select(schema.Purchase).where(schema.Purchase.code == 'P-CLOSED')).first() is None
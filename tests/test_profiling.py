@@ -0,0 +1,38 @@
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from stock.middleware.profiling import ProfilingMiddleware
+from stock.profiling import profile_store
+
+
+def test_profile_request(engine):
+    app = FastAPI()
+
+    @app.get('/slow')
+    def slow():
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        time.sleep(0.05)
+        return 'done'
+
+    app.add_middleware(ProfilingMiddleware, allowed_clients=['testclient'], interval=0.001)
+    client = TestClient(app)
+
+    assert 'x-profile-id' not in client.get('/slow').headers
+
+    response = client.get('/slow', headers={'X-Profile': '1'})
+    profile = profile_store.get(response.headers['x-profile-id'])
+    assert profile.status == 200
+    assert [statement for statement, _, _ in profile.spans] == ['SELECT 1']
+    assert profile.samples
+    assert any('slow' in line for line in profile.collapsed().splitlines())
+
+    speedscope = profile.speedscope()
+    sampled, evented = speedscope['profiles']
+    assert len(sampled['samples']) == len(sampled['weights'])
+    assert [event['type'] for event in evented['events']] == ['O', 'C']
+
+
+def test_profiles_admin_is_restricted(client):
+    assert client.get('/admin/profiles').status_code == 403
@@ -0,0 +1,34 @@
+import datetime
+from decimal import Decimal
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from stock.db import schema
+
+
+def get_stock(engine, item_id: int) -> Decimal:
+    with Session(engine) as session:
+        return session.execute(
+            select(schema.ItemStock.quantity).where(schema.ItemStock.itemId == item_id)
+        ).scalar_one()
+
+
+def test_save_purchase_posts_stock(engine, client):
+    response = client.post('/purchase/save', json={
+        'code': 'P001',
+        'date': datetime.date(2022, 3, 1).isoformat(),
+        'details': [{'itemId': 1, 'quantity': 5, 'unitPrice': 100}],
+    })
+    assert response.status_code == 200
+    purchase = response.json()['data']
+    assert purchase['version'] == 1
+    assert get_stock(engine, 1) == 5
+
+    purchase['details'][0]['quantity'] = 3
+    response = client.post('/purchase/save', json=purchase)
+    assert response.status_code == 200
+    assert get_stock(engine, 1) == 3
+
+    # saving again with the version read before the previous save is a conflict
+    response = client.post('/purchase/save', json=purchase)
+    assert response.status_code == 409
+    assert get_stock(engine, 1) == 3
@@ -0,0 +1,107 @@
+import datetime
+import numpy as np
+from sqlalchemy.engine import create_engine
+from sqlalchemy.orm import Session
+from stock import analytics, period_close
+from stock.db import schema
+from stock.model.report import ReorderModel, ReorderReportModel
+
+
+def test_forecast():
+    quantities = np.array([
+        [2.0, 2.0, 2.0, 2.0],
+        [0.0, 4.0, 0.0, 4.0],
+    ])
+    result = analytics.forecast(quantities, alpha=0.5, lead_time=4, service_level=0.95)
+    assert result.average.tolist() == [2.0, 2.0]
+    # steady demand needs no safety stock
+    assert result.safety_stock[0] == 0
+    assert result.reorder_point[0] == 8
+    assert result.safety_stock[1] > 0
+    assert result.reorder_point[1] > result.smoothed[1] * 4
+
+
+def test_classify():
+    order, cumulative, classes = analytics.classify(np.array([10.0, 70.0, 5.0, 15.0]))
+    assert order.tolist() == [1, 3, 0, 2]
+    assert cumulative.tolist() == [0.7, 0.85, 0.95, 1.0]
+    assert classes.tolist() == ['A', 'A', 'B', 'C']
+
+
+def test_daily_sales_of_closed_period():
+    engine = create_engine('sqlite://', future=True)
+    schema.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(schema.Item(id=1, code='T001', name='Test 1'))
+        session.add(schema.Sales(code='INV/1', date=datetime.date(2022, 1, 20), details=[
+            schema.SalesD(itemId=1, quantity=3),
+        ]))
+        session.add_all([
+            schema.ItemJournal(itemId=1, date=datetime.date(2022, 1, 1), quantity=10, value=1000, journalType='Buy'),
+            schema.ItemJournal(itemId=1, date=datetime.date(2022, 1, 20), quantity=-3, journalType='Sell'),
+        ])
+        session.commit()
+        period_close.close_period(session, datetime.date(2022, 1, 31), 'average')
+        session.commit()
+
+        sales = analytics.load_daily_sales(session, datetime.date(2022, 1, 1), datetime.date(2022, 1, 31))
+        assert sales.item_ids.tolist() == [1]
+        assert sales.quantities[0].sum() == 3 and sales.quantities[0][19] == 3
+
+
+def test_reorder_report(client, make_xlsx, monkeypatch):
+    analytics.report_cache.clear()
+    client.post('/sales/import-tokopedia', files={'xlsx_file': ('orders.xlsx', _orders(make_xlsx))})
+    params = {'asOf': '2022-05-31', 'days': 30, 'all': True}
+    report = client.get('/report/reorder', params=params).json()
+    assert report['dateFrom'] == '2022-05-02'
+    assert [row['code'] for row in report['items']] == ['T001']
+    assert report['items'][0]['averageDemand'] == round(6 / 30, 4)
+
+    # cached until something changes
+    computed = []
+    reorder_report = analytics.reorder_report
+
+    def counted_reorder_report(*args, **kwargs):
+        computed.append(args)
+        return reorder_report(*args, **kwargs)
+
+    monkeypatch.setattr(analytics, 'reorder_report', counted_reorder_report)
+    assert client.get('/report/reorder', params=params).json() == report
+    assert computed == []
+    client.post('/sales/import-tokopedia', files={'xlsx_file': ('orders.xlsx', _orders(make_xlsx, 'INV/203'))})
+    report = client.get('/report/reorder', params=params).json()
+    assert report['items'][0]['averageDemand'] == round(7 / 30, 4)
+    assert len(computed) == 1
+
+
+def test_report_cache_returns_copies(engine):
+    cache = analytics.ReportCache()
+    with Session(engine) as session:
+        report = cache.get(session, ('key',), lambda: ReorderReportModel(
+            dateFrom='2022-05-01', dateTo='2022-05-31', seq=0, items=[ReorderModel(
+                itemId=1, code='T001', name='Test 1', stock=0, averageDemand=1, forecastDemand=1,
+                safetyStock=0, reorderPoint=7, suggestedQuantity=21,
+            )],
+        ))
+        report.items.clear()
+        assert len(cache.get(session, ('key',), lambda: None).items) == 1
+
+
+def test_abc_report(client, make_xlsx):
+    # already imported when the reorder report test ran, imports skip stored invoices
+    client.post('/sales/import-tokopedia', files={'xlsx_file': ('orders.xlsx', _orders(make_xlsx))})
+    report = client.get('/report/abc', params={'dateFrom': '2022-05-01', 'dateTo': '2022-05-31'}).json()
+    assert report['items']
+    assert report['items'][0]['revenueClass'] == 'A'
+    assert abs(report['items'][-1]['cumulativeShare'] - 1) < 1e-6
+    assert client.get('/report/abc', params={'dateFrom': '2022-05-01', 'dateTo': '2022-04-01'}).status_code == 400
+
+
+def _orders(make_xlsx, *codes):
+    rows = [
+        ['INV/201', '10-05-2022 10:00:00', 'Kaos', 'T001', 2, 10000],
+        ['INV/202', '20-05-2022 10:00:00', 'Kaos', 'T001', 4, 10000],
+    ]
+    rows += [[code, '21-05-2022 10:00:00', 'Kaos', 'T001', 1, 10000] for code in codes]
+    return make_xlsx(rows)
@@ -0,0 +1,56 @@
+import datetime
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from stock.db import schema
+
+
+def test_sales_save_list_get(engine, client):
+    with Session(engine) as session:
+        market_place = schema.MarketPlace(name='Shopee')
+        item = schema.Item(code='SL-001', name='Sales list item')
+        session.add_all([market_place, item])
+        session.commit()
+        market_place_id, item_id = market_place.id, item.id
+
+    for day, quantity in [(1, 2), (15, 3), (28, 1)]:
+        response = client.post('/sales/save', json={
+            'code': 'SL{}'.format(day),
+            'date': datetime.date(2023, 1, day).isoformat(),
+            'marketPlaceId': market_place_id,
+            'details': [
+                {'itemId': item_id, 'quantity': quantity, 'unitPrice': 1000},
+                {'itemId': item_id, 'quantity': 1, 'unitPrice': 500},
+            ],
+        })
+        assert response.json()['success']
+
+    response = client.get('/sales/list', params={
+        'dateFrom': '2023-01-10',
+        'dateTo': '2023-01-31',
+        'marketPlaceId': market_place_id,
+        'withTotal': True,
+    })
+    rows = response.json()
+    assert [row['code'] for row in rows] == ['SL28', 'SL15']
+    assert rows[1]['itemCount'] == 2
+    assert float(rows[1]['totalQuantity']) == 4
+    assert float(rows[1]['totalAmount']) == 3500
+    assert rows[1]['marketPlace']['name'] == 'Shopee'
+    assert response.headers['x-total-count'] == '2'
+
+    sales = client.get('/sales/get/{}'.format(rows[1]['id'])).json()
+    sales['details'] = sales['details'][:1]
+    saved = client.post('/sales/save', json=sales).json()['data']
+    assert saved['version'] == sales['version'] + 1
+    assert len(saved['details']) == 1
+    with Session(engine) as session:
+        stock = session.execute(
+            select(schema.ItemStock.quantity).where(schema.ItemStock.itemId == item_id)
+        ).scalar_one()
+    assert stock == -(2 + 1) - 3 - (1 + 1)
+
+    assert client.post('/sales/save', json=sales).status_code == 409
+    assert client.get('/sales/get/0').status_code == 404
+
+    purchases = client.get('/purchase/list', params={'dateFrom': '2030-01-01'}).json()
+    assert purchases == []
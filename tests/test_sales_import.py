@@ -0,0 +1,117 @@
+import datetime
+import io
+import openpyxl
+from sqlalchemy.orm import Session
+from stock.db import schema
+from stock.matching import ItemMatcher
+
+
+def test_matcher():
+    matcher = ItemMatcher(
+        codes={'TS-100': 1, 'TS-200': 2},
+        names={1: 'Kaos Polos Hitam L', 2: 'Kaos Polos Putih L'},
+        mappings={'sku:OLD-1': 2},
+    )
+    assert matcher.match('ts-100 ', None) == 1
+    assert matcher.match('old-1', None) == 2
+    assert matcher.match(None, 'KAOS POLOS HITAM - L') == 1
+    # both items share most tokens with a bare name, no clear winner
+    assert matcher.match(None, 'Kaos Polos') is None
+    assert {item_id for item_id, _ in matcher.candidates('Kaos Polos')} == {1, 2}
+
+
+def test_import_tokopedia(engine, client, make_xlsx):
+    with Session(engine) as session:
+        session.add(schema.Item(code='TS-100', name='Kaos Polos Hitam'))
+        session.add(schema.Item(code='SP-001', name='Sepatu Lari Merah'))
+        session.commit()
+
+    content = make_xlsx([
+        ['INV/001', '01-04-2022 10:00:00', 'Kaos Hitam', 'TS-100', 2, 'Rp 50.000'],
+        ['INV/002', '02-04-2022 11:30:00', 'Kaos Polos Hitam', None, 1, 50000],
+        ['INV/003', '02-04-2022 12:00:00', 'Sepatu Running', None, 1, 250000],
+    ])
+    response = client.post('/sales/import-tokopedia', files={'xlsx_file': ('orders.xlsx', content)})
+    assert response.status_code == 200
+    result = response.json()
+    assert result['rows'] == 3
+    assert result['inserted'] == 2
+    assert [row['code'] for row in result['unmatched']] == ['INV/003']
+
+    with Session(engine) as session:
+        sales = session.query(schema.Sales).filter(schema.Sales.code == 'INV/001').one()
+        assert sales.date == datetime.date(2022, 4, 1)
+        assert sales.details[0].unitPrice == 50000
+        item_id = session.query(schema.Item.id).filter(schema.Item.code == 'SP-001').scalar()
+
+    response = client.post('/sales/item-mapping', json={
+        'marketPlaceId': result['marketPlaceId'],
+        'productName': 'Sepatu Running',
+        'itemId': item_id,
+    })
+    assert response.json()['success']
+
+    content = make_xlsx([['INV/003', '02-04-2022 12:00:00', 'Sepatu Running', None, 1, 250000]])
+    result = client.post('/sales/import-tokopedia', files={'xlsx_file': ('orders.xlsx', content)}).json()
+    assert result['inserted'] == 1
+    assert result['unmatched'] == []
+
+
+def test_import_without_header(client):
+    workbook = openpyxl.Workbook()
+    workbook.active.append(['a', 'b'])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    response = client.post('/sales/import-tokopedia', files={'xlsx_file': ('orders.xlsx', buffer.getvalue())})
+    assert response.status_code == 400
+
+
+def test_reimport_is_idempotent(engine, client, make_xlsx):
+    rows = [
+        ['INV/101', '05-04-2022 10:00:00', 'Kaos', 'T001', 1, 10000],
+        ['INV/102', '05-04-2022 11:00:00', 'Kaos', 'T001', 2, 10000],
+    ]
+    result = client.post('/sales/import-tokopedia', files={'xlsx_file': ('orders.xlsx', make_xlsx(rows))}).json()
+    assert (result['inserted'], result['updated'], result['skipped']) == (2, 0, 0)
+    with Session(engine) as session:
+        stock = session.get(schema.ItemStock, 1).quantity
+
+    # overlapping export, one order changed and one new
+    rows[1][4] = 3
+    rows.append(['INV/103', '06-04-2022 09:00:00', 'Kaos', 'T001', 1, 10000])
+    result = client.post('/sales/import-tokopedia', files={'xlsx_file': ('orders.xlsx', make_xlsx(rows))}).json()
+    assert (result['inserted'], result['updated'], result['skipped']) == (1, 0, 2)
+
+    result = client.post(
+        '/sales/import-tokopedia',
+        params={'onDuplicate': 'update'},
+        files={'xlsx_file': ('orders.xlsx', make_xlsx(rows))},
+    ).json()
+    assert (result['inserted'], result['updated'], result['skipped']) == (0, 1, 2)
+
+    with Session(engine) as session:
+        assert session.get(schema.ItemStock, 1).quantity == stock - 2
+        sales = session.query(schema.Sales).filter(schema.Sales.code == 'INV/102').one()
+        assert sales.version == 2
+        assert [row.quantity for row in sales.details] == [3]
+
+
+def test_reimport_finds_invoice_stored_with_another_date(engine, client, make_xlsx):
+    rows = [['INV/111', '07-04-2022 10:00:00', 'Kaos', 'T001', 1, 10000]]
+    result = client.post('/sales/import-tokopedia', files={'xlsx_file': ('orders.xlsx', make_xlsx(rows))}).json()
+    assert result['inserted'] == 1
+
+    # paid date moved, outside the date range of the new file
+    rows[0][1] = '09-04-2022 10:00:00'
+    result = client.post('/sales/import-tokopedia', files={'xlsx_file': ('orders.xlsx', make_xlsx(rows))}).json()
+    assert (result['inserted'], result['updated'], result['skipped']) == (0, 0, 1)
+
+    result = client.post(
+        '/sales/import-tokopedia',
+        params={'onDuplicate': 'update'},
+        files={'xlsx_file': ('orders.xlsx', make_xlsx(rows))},
+    ).json()
+    assert (result['inserted'], result['updated'], result['skipped']) == (0, 1, 0)
+    with Session(engine) as session:
+        sales = session.query(schema.Sales).filter(schema.Sales.code == 'INV/111').one()
+        assert sales.date == datetime.date(2022, 4, 9)
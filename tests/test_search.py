@@ -0,0 +1,36 @@
+from fastapi.testclient import TestClient
+from stock.main import app
+from stock.search import PrefixIndex
+
+
+def test_prefix_index():
+    index = PrefixIndex()
+    index.build([
+        (1, 'BB-001', 'Baby Oil 100ml'),
+        (2, 'BB-002', 'Baby Powder'),
+        (3, 'CR-001', 'Car Shampoo'),
+    ])
+    assert [row[0] for row in index.suggest('bab')] == [1, 2]
+    assert [row[0] for row in index.suggest('baby pow')] == [2]
+    assert [row[0] for row in index.suggest('cr-0')] == [3]
+    assert index.suggest('xyz') == []
+    assert index.suggest('') == []
+
+    index.upsert(2, 'BB-002', 'Talc Powder')
+    assert [row[0] for row in index.suggest('baby')] == [1]
+    index.upsert(1, 'BB-001', 'Baby Oil 100ml', is_active=False)
+    assert index.suggest('baby') == []
+    assert [row[0] for row in index.suggest('bb', limit=1)] == [2]
+
+
+def test_suggest_endpoint(client):
+    client.post('/item/save', json={'code': 'SG-001', 'name': 'Suggested Soap'})
+    response = client.get('/item/suggest', params={'prefix': 'sugg'})
+    assert [row['code'] for row in response.json()] == ['SG-001']
+
+
+def test_search_refresh_task_is_kept_and_cancelled():
+    with TestClient(app):
+        task = app.state.search_refresh
+        assert not task.done()
+    assert task.cancelled()
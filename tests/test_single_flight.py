@@ -0,0 +1,76 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from stock.db.schema import ItemCategory
+from stock.db.versions import table_versions
+from stock.middleware.single_flight import SingleFlightMetrics, SingleFlightMiddleware
+
+
+def test_identical_requests_share_one_execution():
+    app = FastAPI()
+    calls = []
+
+    @app.get('/item/list')
+    async def item_list(q: str = ''):
+        calls.append(q)
+        await asyncio.sleep(0.05)
+        return {'q': q, 'call': len(calls)}
+
+    metrics = SingleFlightMetrics()
+    app.add_middleware(SingleFlightMiddleware, metrics=metrics)
+
+    async def request_all():
+        async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+            return await asyncio.gather(
+                *[client.get('/item/list', params={'q': q}) for q in ['a b', 'B  a', 'a b', 'c']]
+            )
+
+    responses = asyncio.run(request_all())
+    assert len(calls) == 2
+    assert [response.json()['q'] for response in responses] == ['a b', 'a b', 'a b', 'c']
+    assert metrics.snapshot() == {'item-list': {'executed': 2, 'coalesced': 2}}
+
+
+@pytest.mark.parametrize('max_body_size, executions', [(1000, 1), (250, 3)])
+def test_streamed_response_is_kept_up_to_limit(max_body_size, executions):
+    app = FastAPI()
+    calls = []
+
+    @app.get('/item/image/{item_id}')
+    async def item_image(item_id: int):
+        calls.append(item_id)
+        await asyncio.sleep(0.05)
+
+        async def chunks():
+            for _ in range(4):
+                yield b'x' * 100
+        return StreamingResponse(chunks(), media_type='image/png')
+
+    app.add_middleware(SingleFlightMiddleware, metrics=SingleFlightMetrics(), max_body_size=max_body_size)
+
+    async def request_all():
+        async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+            return await asyncio.gather(*[client.get('/item/image/1') for _ in range(3)])
+
+    responses = asyncio.run(request_all())
+    # over the limit the followers run their own execution
+    assert [len(response.content) for response in responses] == [400] * 3
+    assert len(calls) == executions
+
+
+def test_commit_bumps_table_versions(engine):
+    before, = table_versions.get(['mitemcategory'])
+    with Session(engine) as session:
+        category = ItemCategory(name='Single flight')
+        session.add(category)
+        session.commit()
+        assert table_versions.get(['mitemcategory']) == (before + 1,)
+
+        session.execute(update(ItemCategory).where(ItemCategory.id == category.id).values(description='changed'))
+        assert table_versions.get(['mitemcategory']) == (before + 1,)
+        session.commit()
+    assert table_versions.get(['mitemcategory']) == (before + 2,)
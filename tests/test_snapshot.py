@@ -0,0 +1,90 @@
+import datetime
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from stock.db import schema
+from stock import journal, snapshot
+
+
+@pytest.fixture
+def database(tmp_path):
+    engine = create_engine('sqlite:///{}'.format(tmp_path / 'snapshot.db'), future=True)
+    schema.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([
+            schema.Item(id=1, code='S001', name='Snapshot 1'),
+            schema.Item(id=2, code='S002', name='Snapshot 2'),
+        ])
+        session.commit()
+    yield engine
+    engine.dispose()
+
+
+def add_sales(session, code, date, *details):
+    sales = schema.Sales(code=code, date=date)
+    session.add(sales)
+    session.add_all([
+        schema.SalesD(sales=sales, itemId=item_id, quantity=quantity, unitPrice=1000)
+        for item_id, quantity in details
+    ])
+    session.flush()
+    journal.post_document(session, schema.Sales, sales.id)
+    session.commit()
+    return sales
+
+
+def parts(root, dataset, month):
+    return sorted(path.name for path in snapshot.partition_dir(root, dataset, month).glob('*.parquet'))
+
+
+def test_incremental_export_and_query(database, tmp_path):
+    root = tmp_path / 'snapshot'
+    root.mkdir()
+    with Session(database) as session:
+        first = add_sales(session, 'INV-1', datetime.date(2026, 9, 5), (1, 2), (2, 1))
+        add_sales(session, 'INV-2', datetime.date(2026, 10, 1), (1, 3))
+
+        result = snapshot.export_snapshot(session, root)
+        assert result['sales'] == snapshot.DatasetExport(['2026-09', '2026-10'], [], 3)
+        assert result['journal'].rows == 3
+
+        # nothing changed, nothing written
+        result = snapshot.export_snapshot(session, root)
+        assert result['sales'].rows == 0 and result['journal'].rows == 0
+
+        add_sales(session, 'INV-3', datetime.date(2026, 10, 20), (2, 4))
+        result = snapshot.export_snapshot(session, root)
+        assert result['sales'] == snapshot.DatasetExport([], ['2026-10'], 1)
+        assert result['journal'] == snapshot.DatasetExport([], ['2026-10'], 1)
+        assert parts(root, 'sales', '2026-10') == ['part-000001.parquet', 'part-000003.parquet']
+
+        # moving a document to another month rewrites the month it left
+        unposted = journal.unpost_document(session, schema.Sales, first.id)
+        first.date = datetime.date(2026, 10, 2)
+        session.flush()
+        journal.post_document(session, schema.Sales, first.id, unposted)
+        session.commit()
+        result = snapshot.export_snapshot(session, root)
+        assert result['sales'] == snapshot.DatasetExport(['2026-09'], ['2026-10'], 2)
+        assert result['journal'] == snapshot.DatasetExport(['2026-09'], ['2026-10'], 2)
+        assert not snapshot.partition_dir(root, 'sales', '2026-09').exists()
+        assert not snapshot.partition_dir(root, 'journal', '2026-09').exists()
+
+    rows = snapshot.query_snapshot(
+        'sales', ['month', 'itemId'], ['sum:quantity', 'sum:amount', 'count'], root=root,
+    )
+    assert rows == [
+        {'month': '2026-10', 'itemId': 1, 'quantity_sum': 5.0, 'amount_sum': 5000.0, 'id_count': 2},
+        {'month': '2026-10', 'itemId': 2, 'quantity_sum': 5.0, 'amount_sum': 5000.0, 'id_count': 2},
+    ]
+    rows = snapshot.query_snapshot(
+        'journal', ['itemId'], ['sum:quantity'], date_from=datetime.date(2026, 10, 2), filters={'itemId': 2}, root=root,
+    )
+    assert rows == [{'itemId': 2, 'quantity_sum': -5.0}]
+
+    with pytest.raises(ValueError):
+        snapshot.query_snapshot('sales', ['journalType'], ['sum:quantity'], root=root)
+
+
+def test_query_unknown_dataset(client):
+    assert client.get('/snapshot/query', params={'dataset': 'items'}).status_code == 400
@@ -0,0 +1,40 @@
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+from fastapi.testclient import TestClient
+from stock.compress_assets import compress_assets
+from stock.middleware.compression import JSONGZipMiddleware
+from stock.static import PrecompressedStaticFiles
+
+
+def test_precompressed_assets(tmp_path):
+    (tmp_path / 'main.3f1a2b4c.js').write_text('var x = 1;\n' * 500)
+    (tmp_path / 'index.html').write_text('<html>' + ' ' * 2000 + '</html>')
+    assert compress_assets(tmp_path) == 2
+
+    client = TestClient(Starlette(routes=[Mount('/assets', PrecompressedStaticFiles(directory=tmp_path))]))
+    response = client.get('/assets/main.3f1a2b4c.js', headers={'accept-encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.headers['cache-control'] == 'public, max-age=31536000, immutable'
+    assert response.text == 'var x = 1;\n' * 500
+
+    response = client.get('/assets/index.html', headers={'accept-encoding': 'identity'})
+    assert 'content-encoding' not in response.headers
+    assert response.headers['cache-control'] == 'no-cache'
+    response = client.get('/assets/index.html', headers={'if-none-match': response.headers['etag'], 'accept-encoding': 'identity'})
+    assert response.status_code == 304
+
+
+def test_json_gzip():
+    async def large(request):
+        return JSONResponse(['x' * 10] * 200)
+
+    async def small(request):
+        return JSONResponse(['x'])
+
+    app = Starlette(routes=[Route('/large', large), Route('/small', small)])
+    app.add_middleware(JSONGZipMiddleware, minimum_size=1024)
+    client = TestClient(app)
+    assert client.get('/large').headers['content-encoding'] == 'gzip'
+    assert client.get('/large').json() == ['x' * 10] * 200
+    assert 'content-encoding' not in client.get('/small').headers
@@ -0,0 +1,46 @@
+import datetime
+from sqlalchemy.orm import Session
+from stock.db import schema
+
+
+def test_sync(client):
+    seq = client.get('/sync').json()['seq']
+    response = client.post('/purchase/save', json={
+        'code': 'P002',
+        'date': datetime.date(2022, 3, 2).isoformat(),
+        'details': [
+            {'itemId': 1, 'quantity': 1, 'unitPrice': 100},
+            {'itemId': 1, 'quantity': 2, 'unitPrice': 100},
+        ],
+    })
+    purchase = response.json()['data']
+
+    changes = client.get('/sync', params={'since': seq}).json()
+    assert [row['code'] for row in changes['purchases']] == ['P002']
+    assert len(changes['purchaseDetails']) == 2
+    assert changes['items'] == []
+
+    purchase['details'] = purchase['details'][:1]
+    client.post('/purchase/save', json=purchase)
+    changes = client.get('/sync', params={'since': changes['seq']}).json()
+    assert [row['code'] for row in changes['purchases']] == ['P002']
+    assert changes['deleted'] == [{'tableName': 'tpurchased', 'rowId': purchase['details'][0]['id'] + 1}]
+
+
+def test_sync_pages_through_seq_group(engine, client):
+    seq = client.get('/sync').json()['seq']
+    with Session(engine) as session:
+        # one transaction, all rows share one seq
+        session.add_all([schema.ItemCategory(name='Sync {}'.format(i)) for i in range(5)])
+        session.commit()
+    with Session(engine) as session:
+        session.add(schema.ItemCategory(name='Sync 5'))
+        session.commit()
+
+    names = []
+    more = True
+    while more:
+        changes = client.get('/sync', params={'since': seq, 'limit': 2}).json()
+        names += [row['name'] for row in changes['itemCategories']]
+        seq, more = changes['seq'], changes['more']
+    assert sorted(set(names)) == ['Sync {}'.format(i) for i in range(6)]
@@ -0,0 +1,60 @@
+import datetime
+from decimal import Decimal
+from sqlalchemy import select
+from sqlalchemy.engine import create_engine
+from sqlalchemy.orm import Session
+from stock.db import schema
+from stock import valuation
+
+
+def create_session() -> Session:
+    engine = create_engine('sqlite://', future=True)
+    schema.metadata.create_all(engine, tables=[
+        schema.ChangeSeq.__table__,
+        schema.ItemCategory.__table__,
+        schema.Item.__table__,
+        schema.ItemJournal.__table__,
+    ])
+    session = Session(engine)
+    session.add(schema.Item(id=1, code='T001', name='Test 1'))
+    session.add_all([
+        schema.ItemJournal(itemId=1, date=datetime.date(2022, 1, 1), quantity=10, value=1000, journalType='Buy'),
+        schema.ItemJournal(itemId=1, date=datetime.date(2022, 1, 2), quantity=10, value=2000, journalType='Buy'),
+        schema.ItemJournal(itemId=1, date=datetime.date(2022, 1, 3), quantity=-15, journalType='Sell'),
+        schema.ItemJournal(itemId=1, date=datetime.date(2022, 1, 4), quantity=-5, journalType='Sell'),
+    ])
+    session.commit()
+    return session
+
+
+def journal_values(session: Session):
+    return session.execute(
+        select(schema.ItemJournal.value).order_by(schema.ItemJournal.id)
+    ).scalars().all()
+
+
+def test_average():
+    session = create_session()
+    assert valuation.revalue(session, {1: None}, 'average') == 2
+    assert journal_values(session) == [Decimal(1000), Decimal(2000), Decimal(-2250), Decimal(-750)]
+
+
+def test_fifo():
+    session = create_session()
+    assert valuation.revalue(session, {1: None}, 'fifo') == 2
+    assert journal_values(session) == [Decimal(1000), Decimal(2000), Decimal(-2000), Decimal(-1000)]
+
+
+def test_incremental():
+    session = create_session()
+    valuation.revalue(session, {1: None}, 'fifo')
+    session.add(
+        schema.ItemJournal(itemId=1, date=datetime.date(2022, 1, 2), quantity=-5, journalType='Sell')
+    )
+    session.flush()
+    # the last sale runs out of stock and stays costed at the last price
+    assert valuation.revalue(session, {1: datetime.date(2022, 1, 2)}, 'fifo') == 2
+    assert journal_values(session) == [
+        Decimal(1000), Decimal(2000), Decimal(-2500), Decimal(-1000), Decimal(-500),
+    ]
+    assert valuation.revalue(session, {1: datetime.date(2022, 1, 4)}, 'fifo') == 0